@@ -0,0 +1,364 @@
+"""
+End-to-end latency benchmark for the native host.
+
+Starts dh_native_host.py the way the browser does and talks to it over
+stdio with real Native Messaging framing, but with the local fake Copilot
+SDK in benchmarks/fake_sdk, so it runs offline and the model's latency is
+under control. The host gets a throwaway home directory: its config, cache,
+history and Downloads never touch yours.
+
+Each scenario is driven closed-loop at several concurrency levels (that
+many requests in flight at all times) and reports p50/p95/p99 latency and
+throughput. Results are saved as JSON; pass an earlier file to --compare to
+see the change.
+
+    python benchmarks/bench_e2e.py
+    python benchmarks/bench_e2e.py --latency-ms 500 --concurrency 1 8 32
+    python benchmarks/bench_e2e.py --compare benchmarks/results/e2e-old.json
+"""
+
+import argparse
+import asyncio
+import datetime
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+HOST_DIR = os.path.join(BENCH_DIR, "..", "host")
+HOST_SCRIPT = os.path.join(HOST_DIR, "dh_native_host.py")
+FAKE_SDK_DIR = os.path.join(BENCH_DIR, "fake_sdk")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+sys.path.append(HOST_DIR)
+
+import framing
+
+ERROR_TEXT = (
+    "Plugin Microsoft.Crm.Sales.UpdateOpportunity failed: 0x80040216. "
+    "User john.doe@contoso.com, org {guid}, request from 10.1.2.3."
+)
+
+
+def scenarios():
+    """name -> function(n) building the nth request (action, payload)."""
+    models = itertools.cycle(("gpt-5", "gpt-4.1"))
+    return {
+        "ping": lambda n: ("ping", {}),
+        "health_check": lambda n: ("health_check", {}),
+        "analyze_error": lambda n: (
+            "analyze_error",
+            {
+                "text": ERROR_TEXT.format(guid=f"{n:08d}-0000-0000-0000-000000000000"),
+                "context": "Benchmark",
+                "no_cache": True,
+            },
+        ),
+        "analyze_error_stream": lambda n: (
+            "analyze_error",
+            {
+                "text": ERROR_TEXT.format(guid=f"{n:08d}-0000-0000-0000-000000000000"),
+                "context": "Benchmark",
+                "no_cache": True,
+                "stream": True,
+            },
+        ),
+        # Alternating models, so every save really rebuilds the sessions
+        "update_config": lambda n: ("update_config", {"config": {"model": next(models)}}),
+    }
+
+
+class HostProcess:
+    """A host under test, spoken to over its stdio pipes."""
+
+    def __init__(self, env):
+        self.env = env
+        self.proc = None
+        self.reader_task = None
+        self.pending = {}
+        self.first_partial = {}
+        self.ids = itertools.count()
+
+    async def start(self):
+        self.proc = await asyncio.create_subprocess_exec(
+            sys.executable,
+            "-u",
+            HOST_SCRIPT,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            env=self.env,
+        )
+        self.reader_task = asyncio.create_task(self._read())
+
+    async def _read(self):
+        assembler = framing.ChunkAssembler()
+        while True:
+            message = await framing.read_frame(self.proc.stdout)
+            if message is None:
+                break
+            message = assembler.add(message)
+            if message is None:
+                continue
+            request_id = message.get("requestId")
+            if message.get("type") in ("partial", "progress"):
+                self.first_partial.setdefault(request_id, time.perf_counter())
+                continue
+            future = self.pending.pop(request_id, None)
+            if future and not future.done():
+                future.set_result(message)
+        for future in self.pending.values():
+            future.set_exception(EOFError("Host exited"))
+
+    async def request(self, action, payload):
+        request_id = f"bench-{next(self.ids)}"
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        self.proc.stdin.write(
+            framing.encode_frame(
+                {"action": action, "requestId": request_id, "payload": payload}
+            )
+        )
+        await self.proc.stdin.drain()
+        return request_id, await future
+
+    async def wait_ready(self, timeout=30.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            _, reply = await self.request("health_check", {})
+            if reply["data"]["status"] != "initializing":
+                return reply["data"]
+            await asyncio.sleep(0.05)
+        raise TimeoutError("Host did not finish initializing")
+
+    async def stop(self):
+        self.proc.stdin.close()
+        try:
+            await asyncio.wait_for(self.proc.wait(), 10)
+        except asyncio.TimeoutError:
+            self.proc.kill()
+            await self.proc.wait()
+        await self.reader_task
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies, errors, elapsed, first_partials=None):
+    summary = {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+    }
+    for p in (50, 95, 99):
+        summary[f"p{p}_ms"] = round(percentile(latencies, p), 2)
+    summary["mean_ms"] = round(statistics.fmean(latencies), 2)
+    if first_partials:
+        summary["first_partial_p50_ms"] = round(percentile(first_partials, 50), 2)
+    return summary
+
+
+async def run_load(host, build, concurrency, count):
+    """Keeps `concurrency` requests in flight until `count` have completed."""
+    latencies, first_partials = [], []
+    errors = 0
+    numbers = iter(range(count))
+
+    async def worker():
+        nonlocal errors
+        for n in numbers:
+            action, payload = build(n)
+            sent = time.perf_counter()
+            request_id, reply = await host.request(action, payload)
+            latencies.append((time.perf_counter() - sent) * 1000)
+            partial_at = host.first_partial.pop(request_id, None)
+            if partial_at:
+                first_partials.append((partial_at - sent) * 1000)
+            data = reply.get("data")
+            if reply.get("status") != "success" or (
+                isinstance(data, dict) and "error" in data
+            ):
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started, first_partials)
+
+
+def host_env(home, args):
+    env = dict(os.environ)
+    env["HOME"] = home
+    env["APPDATA"] = home
+    env["USERPROFILE"] = home
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, (FAKE_SDK_DIR, env.get("PYTHONPATH")))
+    )
+    env.update(
+        {
+            "FAKE_COPILOT_START_MS": str(args.start_ms),
+            "FAKE_COPILOT_LATENCY_MS": str(args.latency_ms),
+            "FAKE_COPILOT_JITTER_MS": str(args.jitter_ms),
+            "FAKE_COPILOT_DELTAS": str(args.deltas),
+            "FAKE_COPILOT_ANSWER_CHARS": str(args.answer_chars),
+            "FAKE_COPILOT_FAILURE_RATE": str(args.failure_rate),
+            "FAKE_COPILOT_MODE": args.mode,
+        }
+    )
+    return env
+
+
+def write_host_config(home, args):
+    """Host settings for the run, in the throwaway user data directory."""
+    if os.name == "nt":
+        data_dir = os.path.join(home, "DynamicsHelper")
+    else:
+        data_dir = os.path.join(home, ".config", "dynamics_helper")
+    os.makedirs(data_dir, exist_ok=True)
+    os.makedirs(os.path.join(home, "Downloads"), exist_ok=True)
+    with open(os.path.join(data_dir, "config.json"), "w") as f:
+        json.dump(
+            {
+                "model": "gpt-5",
+                "host": {
+                    "max_concurrency": args.max_concurrency,
+                    "session_pool_size": args.pool_size,
+                    "hedge_requests": args.hedge,
+                    "config_poll_seconds": 0,
+                },
+            },
+            f,
+        )
+
+
+async def run(args):
+    results = {}
+    with tempfile.TemporaryDirectory() as home:
+        write_host_config(home, args)
+        host = HostProcess(host_env(home, args))
+        await host.start()
+        try:
+            startup = await host.wait_ready()
+            if startup["status"] != "healthy":
+                raise RuntimeError(f"Host is not healthy: {startup}")
+
+            builders = scenarios()
+            for name in args.scenarios:
+                results[name] = {}
+                for concurrency in args.concurrency:
+                    count = max(args.requests, concurrency)
+                    if name == "update_config":
+                        count = max(args.config_requests, concurrency)
+                    summary = await run_load(host, builders[name], concurrency, count)
+                    results[name][str(concurrency)] = summary
+                    print_row(name, concurrency, summary)
+        finally:
+            await host.stop()
+    return results
+
+
+def print_row(name, concurrency, summary):
+    print(
+        f"{name:<22}{concurrency:>5}{summary['requests']:>7}{summary['errors']:>6}"
+        f"{summary['p50_ms']:>10.1f}{summary['p95_ms']:>10.1f}{summary['p99_ms']:>10.1f}"
+        f"{summary['throughput_rps']:>10.1f}"
+    )
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    print(f"\nChange vs. {baseline_path} (p50 / p95 / throughput):")
+    for name, levels in results.items():
+        for concurrency, summary in levels.items():
+            old = baseline.get(name, {}).get(concurrency)
+            if not old:
+                continue
+
+            def change(key):
+                return (summary[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+
+            print(
+                f"{name:<22}{concurrency:>5}{change('p50_ms'):>+9.1f}%"
+                f"{change('p95_ms'):>+9.1f}%{change('throughput_rps'):>+9.1f}%"
+            )
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BENCH_DIR,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scenarios", nargs="+", default=list(scenarios()))
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=200, help="per scenario and level")
+    parser.add_argument("--config-requests", type=int, default=20)
+    parser.add_argument("--max-concurrency", type=int, default=16, help="host setting")
+    parser.add_argument("--pool-size", type=int, default=4, help="host setting")
+    parser.add_argument("--hedge", action="store_true", help="host hedge_requests")
+    parser.add_argument("--start-ms", type=float, default=300)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--jitter-ms", type=float, default=50)
+    parser.add_argument("--deltas", type=int, default=20)
+    parser.add_argument("--answer-chars", type=int, default=2000)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--mode", default="ok", choices=("ok", "error", "auth_required", "no_content")
+    )
+    parser.add_argument("--output", help="results file (default: benchmarks/results/)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    unknown = set(args.scenarios) - set(scenarios())
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    print(
+        f"{'scenario':<22}{'conc':>5}{'reqs':>7}{'errs':>6}"
+        f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}"
+    )
+    results = asyncio.run(run(args))
+
+    report = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("output", "compare")
+        },
+        "results": results,
+    }
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"e2e-{stamp}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Inbound framing microbenchmarks: frames per second for small (200 B) and
+large (1 MB) messages.
+
+1. Decoding only: the old blocking read(4) + read(n) loop, FrameDecoder fed
+   64 KB reads, and read_frame on an asyncio StreamReader.
+2. Through a real pipe, as the host reads stdin: the event loop reader
+   (connect_read_pipe + readexactly) and the thread fallback (os.read +
+   FrameDecoder + call_soon_threadsafe).
+
+Run it from the repository root:
+
+    python benchmarks/bench_framing.py
+"""
+
+import asyncio
+import io
+import json
+import os
+import struct
+import sys
+import threading
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "host"))
+
+import framing
+
+CASES = (
+    ("200 B", 200, 50_000),
+    ("1 MB", 1024 * 1024, 100),
+)
+
+
+def make_stream(size, count):
+    message = {"action": "analyze_error", "requestId": "r", "payload": {"text": "x" * size}}
+    return framing.encode_frame(message) * count
+
+
+def blocking_reads(data, count):
+    # What _read_stdin_loop did: one read for the length, one for the body
+    stream = io.BytesIO(data)
+    for _ in range(count):
+        (length,) = struct.unpack("@I", stream.read(4))
+        json.loads(stream.read(length).decode("utf-8"))
+
+
+def frame_decoder(data, count):
+    decoder = framing.FrameDecoder()
+    decoded = 0
+    for offset in range(0, len(data), framing.READ_CHUNK_BYTES):
+        decoded += len(decoder.feed(data[offset : offset + framing.READ_CHUNK_BYTES]))
+    assert decoded == count
+
+
+def stream_reader(data, count):
+    async def run():
+        reader = asyncio.StreamReader(limit=framing.READ_CHUNK_BYTES)
+        for offset in range(0, len(data), framing.READ_CHUNK_BYTES):
+            reader.feed_data(data[offset : offset + framing.READ_CHUNK_BYTES])
+        reader.feed_eof()
+        while await framing.read_frame(reader) is not None:
+            pass
+
+    asyncio.run(run())
+
+
+def pipe_writer(data):
+    read_fd, write_fd = os.pipe()
+
+    def write():
+        with os.fdopen(write_fd, "wb") as f:
+            f.write(data)
+
+    thread = threading.Thread(target=write)
+    thread.start()
+    return read_fd, thread
+
+
+def pipe_event_loop(data, count):
+    read_fd, thread = pipe_writer(data)
+
+    async def run():
+        with os.fdopen(read_fd, "rb", buffering=0) as pipe:
+            reader = await framing.connect_stdin(pipe)
+            received = 0
+            while await framing.read_frame(reader) is not None:
+                received += 1
+            assert received == count
+
+    asyncio.run(run())
+    thread.join()
+
+
+def pipe_thread(data, count):
+    read_fd, thread = pipe_writer(data)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        done = asyncio.Event()
+        received = []
+
+        def read_loop():
+            decoder = framing.FrameDecoder()
+            while True:
+                chunk = os.read(read_fd, framing.READ_CHUNK_BYTES)
+                if not chunk:
+                    break
+                for message in decoder.feed(chunk):
+                    loop.call_soon_threadsafe(received.append, message)
+            loop.call_soon_threadsafe(done.set)
+
+        threading.Thread(target=read_loop).start()
+        await done.wait()
+        assert len(received) == count
+
+    asyncio.run(run())
+    os.close(read_fd)
+    thread.join()
+
+
+def measure(func, data, count):
+    start = time.perf_counter()
+    func(data, count)
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    decoders = [
+        ("blocking read(4)+read(n)", blocking_reads),
+        ("FrameDecoder", frame_decoder),
+        ("read_frame (StreamReader)", stream_reader),
+    ]
+    if os.name != "nt":
+        decoders.append(("pipe: event loop reader", pipe_event_loop))
+    decoders.append(("pipe: thread + FrameDecoder", pipe_thread))
+
+    for label, size, count in CASES:
+        data = make_stream(size, count)
+        print(f"\n{label} messages ({count} frames, {len(data) / 1e6:.1f} MB)")
+        for name, func in decoders:
+            rate = measure(func, data, count)
+            print(f"  {name:<30}{rate:>12,.0f} frames/s{rate * len(data) / count / 1e6:>10.0f} MB/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Analysis history benchmark.
+
+Fills a HistoryStore with synthetic analyses, then times inserts, full-text
+searches (FTS5) and the unindexed LIKE fallback, to show that looking up a
+past answer stays in the millisecond range on a large history. Run it from
+the repository root:
+
+    python benchmarks/bench_history.py [entries]
+"""
+
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "host"))
+
+from history_store import HistoryStore
+
+ERRORS = (
+    "Plugin Microsoft.Crm.Sales.UpdateOpportunity failed with 0x80040216",
+    "SQL Server timeout while retrieving account [GUID_{n}]",
+    "Request from [IP_{n}] was throttled (429). Retry-After: 30",
+    "Dependency calculation failed for solution 'SalesPatch_{n}'",
+    "Workflow {n} suspended: the user [EMAIL_1] has no license",
+    "Principal user is missing prvReadIncident privilege",
+)
+
+ANSWERS = (
+    "The plugin step threw an unhandled exception. Re-register the step and "
+    "check the trace log for the inner exception.",
+    "The query exceeded the SQL timeout. Add an index on the filtered "
+    "columns or narrow the FetchXML.",
+    "The service protection limits were hit. Back off and honour Retry-After.",
+    "A component is missing from the target environment. Import the base "
+    "solution first.",
+)
+
+QUERIES = ("0x80040216", "timeout index", "throttled", "Microsoft.Crm", "solut", "nothing-matches")
+
+
+def fill(store, count):
+    rng = random.Random(0)
+    start = time.perf_counter()
+    for n in range(count):
+        prompt = rng.choice(ERRORS).format(n=n) + "\n" + "stack frame\n" * rng.randint(1, 40)
+        store.add(prompt, rng.choice(ANSWERS) * rng.randint(1, 4), context="Case")
+    return time.perf_counter() - start
+
+
+def time_search(store, query, runs=20):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        store.search(query)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = HistoryStore(os.path.join(tmp, "history.db"), max_bytes=2**40)
+        elapsed = fill(store, count)
+        size_mb = os.path.getsize(store.path) / (1024 * 1024)
+        print(f"{count} analyses stored in {elapsed:.1f}s "
+              f"({elapsed / count * 1000:.2f} ms each), database {size_mb:.1f} MB")
+        print(f"FTS5 available: {store.fts}")
+
+        print(f"\n{'query':<18}{'fts ms':>10}{'like ms':>10}{'hits':>7}")
+        for query in QUERIES:
+            store.fts = True
+            hits = len(store.search(query))
+            fts_ms = time_search(store, query)
+            store.fts = False
+            like_ms = time_search(store, query, runs=5)
+            print(f"{query:<18}{fts_ms:>10.2f}{like_ms:>10.2f}{hits:>7}")
+
+        store.fts = True
+        print(f"\nlatest 20: {time_search(store, ''):.2f} ms")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
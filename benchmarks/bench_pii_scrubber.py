@@ -0,0 +1,191 @@
+"""
+PiiScrubber benchmarks.
+
+1. Single-pass engine vs. the original four-pass scrub on Dynamics/Azure style
+   log text with a sprinkling of PII (1 KB, 100 KB and 10 MB).
+2. Prefilter on vs. off on typical error messages as users paste them, most
+   of which contain no PII at all.
+3. Whole-text scrub vs. chunked scrub_stream (inline and on a process pool)
+   on a 10 MB log, with peak memory.
+
+Run it from the repository root:
+
+    python benchmarks/bench_pii_scrubber.py
+"""
+
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "host"))
+
+from pii_scrubber import PiiScrubber
+
+SIZES = (("1 KB", 1024), ("100 KB", 100 * 1024), ("10 MB", 10 * 1024 * 1024))
+
+TEMPLATES = (
+    "{ts} ERROR Plugin Microsoft.Crm.Sales.UpdateOpportunity failed: "
+    "An unexpected error occurred. Error code: 0x80040216",
+    "{ts} INFO  Sandbox worker {num} picked up request for organization "
+    "contoso.crm.dynamics.com",
+    "{ts} WARN  Dependency calculation failed for solution 'SalesPatch_1_0_0_0'. "
+    "Missing dependency: 'Entity: account' (Id: {guid})",
+    "{ts} ERROR Request from {ip} was throttled (429). Retry-After: 30",
+    "{ts} INFO  Case 2601220030001652 assigned to {email}",
+    "{ts} DEBUG at Microsoft.Xrm.Sdk.OrganizationServiceProxy.Execute(OrganizationRequest request)",
+    "{ts} INFO  Customer callback requested at {phone}",
+    "{ts} ERROR System.TimeoutException: The operation did not complete within 00:02:00",
+)
+
+# Error texts as they reach analyze_error: no PII, but full of dots, dashes,
+# digits and timestamps
+ERROR_SAMPLES = (
+    "Plugin Microsoft.Crm.Sales.UpdateOpportunity failed: An unexpected error "
+    "occurred. Error code: 0x80040216",
+    "System.ServiceModel.FaultException`1[Microsoft.Xrm.Sdk.OrganizationServiceFault]: "
+    "Principal user is missing prvReadAccount privilege. Detail: ErrorCode 0x80042f09",
+    "Import of solution 'SalesPatch_1_0_0_0' failed at 2026-01-05T10:00:00Z. "
+    "Missing dependency: Entity account, Version 9.2.24014.00198",
+    "Exception Message: Sql error: Generic SQL error. CRM ErrorCode: -2147204784 "
+    "Sql ErrorCode: -2146232060 Sql Number: 1205\n"
+    "   at Microsoft.Crm.CrmDbConnection.InternalExecuteReader(IDbCommand command)\n"
+    "   at Microsoft.Crm.Platform.Server.DataEngine.SqlExecutor.Execute(...)",
+    "Flow run failed. The request failed with status 429: Rate limit is exceeded. "
+    "Try again in 25 seconds. Correlation: see run history",
+)
+
+
+def make_corpus(size, seed=7):
+    rnd = random.Random(seed)
+    lines = []
+    total = 0
+    while total < size:
+        line = rnd.choice(TEMPLATES).format(
+            ts=f"2026-01-{rnd.randint(1, 28):02d}T{rnd.randint(0, 23):02d}:"
+            f"{rnd.randint(0, 59):02d}:{rnd.randint(0, 59):02d}Z",
+            num=rnd.randint(1, 64),
+            guid="%08x-%04x-%04x-%04x-%012x"
+            % tuple(rnd.getrandbits(b) for b in (32, 16, 16, 16, 48)),
+            ip=".".join(str(rnd.randint(1, 254)) for _ in range(4)),
+            email=f"user{rnd.randint(1, 999)}@contoso.com",
+            phone=f"({rnd.randint(200, 999)}) {rnd.randint(100, 999)}-{rnd.randint(0, 9999):04d}",
+        )
+        lines.append(line)
+        total += len(line) + 1
+    return "\n".join(lines)[:size]
+
+
+def best_of(func, text, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+class NoPrefilterScrubber(PiiScrubber):
+    def active_detectors(self, text):
+        return tuple(self.placeholders)
+
+
+def bench_engines(scrubber):
+    print(f"{'input':>8} {'four-pass':>12} {'single-pass':>12} {'speedup':>8}")
+    for label, size in SIZES:
+        text = make_corpus(size)
+        assert scrubber.scrub(text) == scrubber.scrub_multipass(text)
+        repeat = 50 if size < 1024 * 1024 else 3
+        multi = best_of(scrubber.scrub_multipass, text, repeat)
+        single = best_of(scrubber.scrub, text, repeat)
+        print(
+            f"{label:>8} {multi * 1000:>10.2f}ms {single * 1000:>10.2f}ms "
+            f"{multi / single:>7.2f}x"
+        )
+
+
+def bench_prefilter(scrubber):
+    unfiltered = NoPrefilterScrubber()
+    print(f"\n{'error text':>10} {'no prefilter':>13} {'prefilter':>11} {'speedup':>8}")
+    for index, text in enumerate(ERROR_SAMPLES, 1):
+        assert scrubber.scrub(text) == unfiltered.scrub(text) == text
+        repeat = 2000
+        off = best_of(unfiltered.scrub, text, repeat)
+        on = best_of(scrubber.scrub, text, repeat)
+        print(
+            f"{index:>10} {off * 1e6:>11.1f}us {on * 1e6:>9.1f}us {off / on:>7.2f}x"
+        )
+
+    corpus = "\n".join(ERROR_SAMPLES * 200)
+    assert scrubber.scrub(corpus) == corpus
+    off = best_of(unfiltered.scrub, corpus, 20)
+    on = best_of(scrubber.scrub, corpus, 20)
+    label = f"{len(corpus) // 1024} KB"
+    print(f"{label:>10} {off * 1000:>11.2f}ms {on * 1000:>9.2f}ms {off / on:>7.2f}x")
+
+
+class NullSink:
+    def write(self, text):
+        pass
+
+
+def measure(func):
+    """Returns (seconds, peak traced MB) of one call. Tracing slows it down."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / (1024 * 1024)
+
+
+def bench_stream(scrubber):
+    text = make_corpus(10 * 1024 * 1024)
+    expected = scrubber.scrub(text)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "trace.log")
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            f.write(text)
+        del text
+
+        def whole(executor=None):
+            with open(path, encoding="utf-8", newline="") as f:
+                return scrubber.scrub(f.read())
+
+        def streamed(executor=None):
+            with open(path, encoding="utf-8", newline="") as f:
+                scrubber.scrub_stream(f, NullSink(), executor=executor)
+
+        sink = io.StringIO()
+        with open(path, encoding="utf-8", newline="") as f:
+            scrubber.scrub_stream(f, sink)
+        assert sink.getvalue() == expected
+        del sink, expected
+
+        print(f"\n{'10 MB log file':>24} {'time':>9} {'peak mem':>10}")
+        workers = os.cpu_count() or 1
+        with ProcessPoolExecutor(workers) as executor:
+            list(executor.map(str, range(workers)))  # start the workers
+            for label, func, pool in (
+                ("scrub(read())", whole, None),
+                ("scrub_stream()", streamed, None),
+                (f"scrub_stream() x{workers} proc", streamed, executor),
+            ):
+                elapsed, peak = measure(lambda: func(pool))
+                print(f"{label:>24} {elapsed * 1000:>7.0f}ms {peak:>8.1f}MB")
+
+
+def main():
+    scrubber = PiiScrubber()
+    bench_engines(scrubber)
+    bench_prefilter(scrubber)
+    bench_stream(scrubber)
+
+
+if __name__ == "__main__":
+    main()
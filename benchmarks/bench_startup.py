@@ -0,0 +1,83 @@
+"""
+Startup latency benchmark for the native host.
+
+Spawns dh_native_host.py the way the browser does, then measures how long it
+takes to answer the first ping and how long until health_check stops
+reporting "initializing". Run it from the repository root:
+
+    python benchmarks/bench_startup.py [runs]
+"""
+
+import json
+import os
+import statistics
+import struct
+import subprocess
+import sys
+import time
+
+HOST_SCRIPT = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "host", "dh_native_host.py"
+)
+
+
+def send_message(proc, message):
+    body = json.dumps(message).encode("utf-8")
+    proc.stdin.write(struct.pack("@I", len(body)) + body)
+    proc.stdin.flush()
+
+
+def read_message(proc):
+    raw_length = proc.stdout.read(4)
+    if len(raw_length) < 4:
+        return None
+    (length,) = struct.unpack("@I", raw_length)
+    return json.loads(proc.stdout.read(length).decode("utf-8"))
+
+
+def measure_once():
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-u", HOST_SCRIPT],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+    )
+    try:
+        send_message(proc, {"action": "ping", "requestId": "startup-ping"})
+        read_message(proc)
+        first_ping = time.perf_counter() - start
+
+        health = None
+        while True:
+            send_message(proc, {"action": "health_check", "requestId": "startup-hc"})
+            health = read_message(proc)
+            if not health or health["data"]["status"] != "initializing":
+                break
+            time.sleep(0.05)
+        sdk_settled = time.perf_counter() - start
+
+        startup = (health or {}).get("data", {}).get("startup", {})
+        return first_ping, sdk_settled, startup
+    finally:
+        proc.kill()
+        proc.wait()
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    pings, settles = [], []
+    startup = {}
+
+    for _ in range(runs):
+        first_ping, sdk_settled, startup = measure_once()
+        pings.append(first_ping * 1000)
+        settles.append(sdk_settled * 1000)
+
+    print(f"Runs: {runs}")
+    print(f"First ping answered: median {statistics.median(pings):.1f} ms")
+    print(f"SDK settled (ready or error): median {statistics.median(settles):.1f} ms")
+    print(f"Host-reported milestones (last run): {json.dumps(startup)}")
+
+
+if __name__ == "__main__":
+    main()
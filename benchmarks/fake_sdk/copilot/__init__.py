@@ -0,0 +1,138 @@
+"""
+Local stand-in for the GitHub Copilot SDK, for benchmarks.
+
+Put benchmarks/fake_sdk on PYTHONPATH and the host imports this package
+instead of the real `copilot`: no CLI, no network, no login. It implements
+the part of the API the host uses (CopilotClient.start/stop/
+get_auth_status/create_session, CopilotSession.on/send_and_wait/abort/
+destroy) and is tuned through environment variables:
+
+    FAKE_COPILOT_START_MS        client.start() time (default 300)
+    FAKE_COPILOT_LATENCY_MS      time to answer a prompt (default 200)
+    FAKE_COPILOT_JITTER_MS       +/- random spread on that (default 50)
+    FAKE_COPILOT_DELTAS          streamed message_delta events per answer (default 20)
+    FAKE_COPILOT_ANSWER_CHARS    length of the answer (default 2000)
+    FAKE_COPILOT_FAILURE_RATE    share of prompts that raise (default 0)
+    FAKE_COPILOT_MODE            ok | error | auth_required | no_content
+    FAKE_COPILOT_AUTHENTICATED   1 or 0 (default 1)
+"""
+
+import asyncio
+import os
+import random
+from types import SimpleNamespace
+
+
+def _setting(name, default):
+    return type(default)(os.environ.get(f"FAKE_COPILOT_{name}", default))
+
+
+START_MS = _setting("START_MS", 300.0)
+LATENCY_MS = _setting("LATENCY_MS", 200.0)
+JITTER_MS = _setting("JITTER_MS", 50.0)
+DELTAS = _setting("DELTAS", 20)
+ANSWER_CHARS = _setting("ANSWER_CHARS", 2000)
+FAILURE_RATE = _setting("FAILURE_RATE", 0.0)
+MODE = _setting("MODE", "ok")
+AUTHENTICATED = _setting("AUTHENTICATED", 1)
+
+ANSWER_LINE = "Re-register the plugin step and check the trace log for the inner exception. "
+
+
+def _event(event_type, **data):
+    return SimpleNamespace(type=event_type, data=SimpleNamespace(**data))
+
+
+class CopilotSession:
+    def __init__(self, config):
+        self.config = config
+        self.handlers = []
+        self.aborted = None
+
+    def on(self, handler):
+        self.handlers.append(handler)
+
+        def unsubscribe():
+            if handler in self.handlers:
+                self.handlers.remove(handler)
+
+        return unsubscribe
+
+    def _dispatch(self, event):
+        for handler in list(self.handlers):
+            handler(event)
+
+    async def send_and_wait(self, options, timeout=None):
+        self.aborted = asyncio.Event()
+        latency = max(0.0, LATENCY_MS + random.uniform(-JITTER_MS, JITTER_MS)) / 1000
+        answer = (ANSWER_LINE * (ANSWER_CHARS // len(ANSWER_LINE) + 1))[:ANSWER_CHARS]
+
+        async def answer_prompt():
+            self._dispatch(_event("assistant.turn_start"))
+            pieces = max(1, DELTAS)
+            step = -(-len(answer) // pieces)
+            for offset in range(0, len(answer), step):
+                await asyncio.sleep(latency / pieces)
+                self._dispatch(
+                    _event(
+                        "assistant.message_delta",
+                        delta_content=answer[offset : offset + step],
+                    )
+                )
+
+            if MODE == "error" or random.random() < FAILURE_RATE:
+                raise RuntimeError("Fake Copilot failure")
+            if MODE == "auth_required":
+                return _event("auth_required")
+            if MODE == "no_content":
+                return _event("assistant.message", content="")
+            return _event("assistant.message", content=answer)
+
+        turn = asyncio.ensure_future(answer_prompt())
+        aborted = asyncio.ensure_future(self.aborted.wait())
+        try:
+            done, _ = await asyncio.wait(
+                {turn, aborted}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            aborted.cancel()
+        if turn not in done:
+            turn.cancel()
+            if not done:
+                raise asyncio.TimeoutError()
+            return _event("abort")
+        return turn.result()
+
+    async def abort(self):
+        if self.aborted:
+            self.aborted.set()
+
+    async def destroy(self):
+        self.handlers.clear()
+
+
+class CopilotClient:
+    def __init__(self, options=None):
+        self.options = options or {}
+        self.sessions = []
+
+    async def start(self):
+        await asyncio.sleep(START_MS / 1000)
+
+    async def stop(self):
+        self.sessions.clear()
+        return []
+
+    async def get_auth_status(self):
+        await asyncio.sleep(0.005)
+        return {
+            "isAuthenticated": bool(AUTHENTICATED),
+            "login": "benchmark",
+            "statusMessage": "Fake SDK",
+        }
+
+    async def create_session(self, config=None):
+        await asyncio.sleep(0.01)
+        session = CopilotSession(config)
+        self.sessions.append(session)
+        return session
@@ -0,0 +1,95 @@
+"""
+Cached Copilot authentication status.
+
+Asking the CLI whether the user is logged in is an IPC round trip. The
+answer rarely changes, so a background task keeps it fresh and analyses
+read the cached value instead of paying for the call each time. Only a
+positive answer is cached: an unauthenticated user is re-checked on every
+request, so logging in takes effect immediately and the fast-fail error
+stays accurate.
+"""
+
+import asyncio
+import logging
+import time
+
+DEFAULT_TTL_SECONDS = 300.0
+
+
+class AuthCache:
+    def __init__(self, fetch, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        """
+        Args:
+            fetch: Coroutine function returning the auth status dict
+                (client.get_auth_status).
+            ttl_seconds: How long a positive answer is trusted.
+        """
+        self.fetch = fetch
+        self.ttl_seconds = ttl_seconds
+        self.status = None
+        self.checked_at = 0.0
+        self.generation = 0  # bumped by invalidate()
+        self.inflight = None
+        self.refresh_task = None
+
+    @property
+    def fresh(self) -> bool:
+        return (
+            self.status is not None
+            and time.monotonic() - self.checked_at < self.ttl_seconds
+        )
+
+    async def get(self):
+        """
+        Returns the auth status, from the cache when it is fresh.
+        Returns None if the status could not be determined.
+        """
+        if self.fresh:
+            return self.status
+        return await self.refresh()
+
+    async def refresh(self):
+        """Checks the status now. Concurrent callers share one call."""
+        if self.inflight is None:
+            self.inflight = asyncio.ensure_future(self._fetch())
+        # Shielded: one cancelled caller must not cancel the shared check
+        return await asyncio.shield(self.inflight)
+
+    async def _fetch(self):
+        generation = self.generation
+        try:
+            status = await self.fetch()
+        except Exception as e:
+            logging.error(f"Failed to check auth status: {e}")
+            status = None
+        finally:
+            self.inflight = None
+
+        # An invalidation while the call was running wins over its answer
+        if generation == self.generation:
+            if status and status.get("isAuthenticated", False):
+                self.status = status
+                self.checked_at = time.monotonic()
+            else:
+                self.status = None
+        return status
+
+    def invalidate(self):
+        """Forgets the cached status, e.g. after a failed request."""
+        self.status = None
+        self.generation += 1
+
+    def start_refresh(self):
+        """Starts refreshing the status in the background every half TTL."""
+        if self.refresh_task is None:
+            self.refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def _refresh_loop(self):
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.ttl_seconds / 2)
+
+    def stop(self):
+        if self.refresh_task:
+            self.refresh_task.cancel()
+            self.refresh_task = None
@@ -0,0 +1,114 @@
+"""
+Cached session config.
+
+Building the session config means reading and parsing config.json and
+copilot-instructions.md (user copy first, bundled copy as fallback) and
+resolving skill directories. The result only changes when one of those
+files does, so it is cached against a (path, mtime, size) signature of every
+candidate file. The same signature lets a cheap poll notice edits made
+outside the Options page.
+
+Files are written through a temp file and an atomic rename, so a host that
+dies mid-save never leaves a torn config behind.
+"""
+
+import asyncio
+import logging
+import os
+import tempfile
+
+DEFAULT_POLL_SECONDS = 2.0
+
+
+def file_signature(path: str) -> tuple:
+    """(path, mtime, size), or (path, None, None) if the file does not exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return (path, None, None)
+    return (path, stat.st_mtime_ns, stat.st_size)
+
+
+def write_atomic(path: str, text: str, encoding: str = "utf-8"):
+    """
+    Writes `text` to a temp file beside `path` and renames it into place, so
+    readers see either the old or the new file, never a torn one.
+    """
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path) or ".", prefix=".", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "w", encoding=encoding) as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def write_if_changed(path: str, text: str, encoding: str = "utf-8") -> bool:
+    """Atomically writes `text` unless the file already holds it. True if written."""
+    try:
+        with open(path, "r", encoding=encoding) as f:
+            if f.read() == text:
+                return False
+    except (OSError, UnicodeDecodeError):
+        pass
+    write_atomic(path, text, encoding)
+    return True
+
+
+class ConfigStore:
+    def __init__(self, load, paths):
+        """
+        Args:
+            load: Function that builds the config from disk.
+            paths: Every file `load` may read, including ones that do not
+                exist yet (creating a user override must count as a change).
+        """
+        self.load = load
+        self.paths = tuple(paths)
+        self.signature = None
+        self.config = None
+        # Set when get() picks up an edit, so the watcher still reports it
+        self.edited = False
+
+    def current_signature(self) -> tuple:
+        return tuple(file_signature(path) for path in self.paths)
+
+    def changed(self) -> bool:
+        """True if any file differs from what the cached config was built from."""
+        return self.current_signature() != self.signature
+
+    def get(self) -> dict:
+        """
+        Returns the config, rebuilding it only if a file changed.
+        Callers get their own shallow copy and may add keys to it.
+        """
+        signature = self.current_signature()
+        if self.config is None or signature != self.signature:
+            if self.config is not None:
+                self.edited = True
+            self.config = self.load()
+            self.signature = signature
+        return dict(self.config)
+
+    async def watch(self, on_change, interval: float = DEFAULT_POLL_SECONDS):
+        """
+        Polls the files every `interval` seconds and awaits `on_change()` on
+        edits, including ones a get() on the request path has already read.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if self.changed() or self.edited:
+                    self.edited = False
+                    logging.info("Configuration files changed on disk.")
+                    await on_change()
+            except Exception as e:
+                logging.error(f"Config reload failed: {e}")
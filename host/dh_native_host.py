@@ -1,24 +1,47 @@
+from __future__ import annotations
+
+import time
+
+# Startup latency is measured from here, before any other import
+PROCESS_START = time.perf_counter()
+
 import asyncio
+import importlib
 import threading
 import sys
-import struct
 import json
 import logging
 import os
 import datetime
 import shutil
-
-# Import the SDK from the correct package name we discovered: 'copilot'
-from copilot import CopilotClient
-from copilot.types import (
-    CopilotClientOptions,
-    MessageOptions,
-    SessionConfig,
-    PermissionRequestResult,
-)
+from typing import TYPE_CHECKING
+
+# The SDK ('copilot' package) is imported lazily in initialize_sdk so that the
+# frame reader can start, and ping can be answered, before it has loaded.
+if TYPE_CHECKING:
+    from copilot.types import (
+        CopilotClientOptions,
+        MessageOptions,
+        SessionConfig,
+        PermissionRequestResult,
+    )
 
 # Import PII Scrubber
-from pii_scrubber import PiiScrubber
+from pii_scrubber import PiiScrubber, PiiVault
+
+import framing
+import resident
+from session_pool import SessionPool, SessionPoolError
+import result_cache
+import auth_cache
+import config_store
+import host_logging
+import lanes
+import latency
+import metrics
+import outbound
+import pipeline
+from streaming import StreamRelay
 
 
 # Setup User Data Directory (Cross-platform)
@@ -32,24 +55,258 @@ else:
 # Ensure user data dir exists
 os.makedirs(USER_DATA_DIR, exist_ok=True)
 
-# Setup logging to User Data Directory (avoiding permission issues in Program Files)
+# Logs live in the User Data Directory (avoiding permission issues in Program Files)
 LOG_FILE = os.path.join(USER_DATA_DIR, "native_host.log")
-logging.basicConfig(
-    filename=LOG_FILE,
-    level=logging.DEBUG,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-)
+
+# Metrics snapshot for the node-exporter textfile collector
+METRICS_FILE = os.path.join(USER_DATA_DIR, "dynamics_helper.prom")
+
+# Finished analyses are also saved here, one Markdown file each
+if os.name == "nt":
+    DOWNLOADS_DIR = os.path.join(
+        os.environ.get("USERPROFILE", os.path.expanduser("~")), "Downloads"
+    )
+else:
+    DOWNLOADS_DIR = os.path.join(os.path.expanduser("~"), "Downloads")
+
+# Host tuning defaults. These can be overridden from the optional "host"
+# section of config.json, which is consumed here and never sent to the SDK.
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_MAX_QUEUED_ANALYSES = 32
+DEFAULT_IDLE_TIMEOUT_SECONDS = 900
+DEFAULT_SESSION_POOL_SIZE = 2
+DEFAULT_CACHE_TTL_SECONDS = result_cache.DEFAULT_TTL_SECONDS
+DEFAULT_CACHE_MAX_DISK_MB = 50
+DEFAULT_AUTH_TTL_SECONDS = auth_cache.DEFAULT_TTL_SECONDS
+DEFAULT_CONFIG_POLL_SECONDS = config_store.DEFAULT_POLL_SECONDS
+DEFAULT_SCRUB_PROCESSES = 0
+DEFAULT_PSEUDONYMIZE = True
+DEFAULT_HISTORY_MAX_AGE_DAYS = 90
+DEFAULT_HISTORY_MAX_MB = 100
+DEFAULT_LOG_MAX_MB = host_logging.DEFAULT_MAX_BYTES / (1024 * 1024)
+DEFAULT_METRICS_EXPORT_SECONDS = metrics.DEFAULT_EXPORT_SECONDS
+DEFAULT_MIN_TURN_TIMEOUT_SECONDS = latency.DEFAULT_MIN_TIMEOUT_SECONDS
+
+# Control messages get their own dispatch lane, so they never wait behind
+# analyses. They are cheap; the limit only stops a flood of them.
+CONTROL_CONCURRENCY = 8
+
+# Actions that run in the bounded work lane; everything else is control
+WORK_ACTIONS = frozenset({"analyze_error"})
+
+# An analysis is answered within this long of arriving, time spent queued and
+# waiting for the SDK included. The FAB gives up on it after 310 seconds.
+ANALYSIS_BUDGET_SECONDS = latency.MAX_TIMEOUT_SECONDS
+
+# How long cancel waits for the target request to unwind before replying
+CANCEL_WAIT_SECONDS = 10.0
+
+# Options page saves arriving within this window share one session rebuild
+REBUILD_DEBOUNCE_SECONDS = 0.25
+
+# Texts at least this long are scrubbed chunk by chunk off the event loop
+LARGE_TEXT_CHARS = 256 * 1024
+
+
+def resolve_config_path():
+    """Returns the config.json to use (User overrides Default)."""
+    # 1. User-specific config (APPDATA/DynamicsHelper/config.json)
+    user_config_path = os.path.join(USER_DATA_DIR, "config.json")
+
+    # 2. Default/bundled config (beside the executable/script)
+    install_dir = os.path.dirname(os.path.abspath(__file__))
+    default_config_path = os.path.join(install_dir, "config.json")
+
+    return (
+        user_config_path if os.path.exists(user_config_path) else default_config_path
+    )
+
+
+def load_host_settings() -> dict:
+    """Reads the optional "host" section of config.json."""
+    config_path = resolve_config_path()
+    if not os.path.exists(config_path):
+        return {}
+    try:
+        with open(config_path, "r") as f:
+            return json.load(f).get("host", {}) or {}
+    except Exception as e:
+        logging.error(f"Failed to load host settings: {e}")
+        return {}
+
+
+def setup_logging():
+    """Starts the queued, rotating JSON-lines log configured in the host section."""
+    settings = load_host_settings()
+    host_logging.configure(
+        LOG_FILE,
+        level=settings.get("log_level", host_logging.DEFAULT_LEVEL),
+        max_bytes=int(float(settings.get("log_max_mb", DEFAULT_LOG_MAX_MB)) * 1024 * 1024),
+        backup_count=int(
+            settings.get("log_backup_count", host_logging.DEFAULT_BACKUP_COUNT)
+        ),
+    )
+
+
+setup_logging()
 
 
 class NativeHost:
     def __init__(self):
-        self.input_queue = asyncio.Queue()
         self.client = None
-        self.session = None
+        self.pool = None
         self.running = True
         self.loop = None
         self.scrubber = PiiScrubber()
 
+        # SDK initialization runs in the background: "initializing" -> "ready" | "error"
+        self.init_task = None
+        self.sdk_state = "initializing"
+        self.startup_timings = {}
+
+        # Stdout frames go through one writer thread (started on first send)
+        self.writer = None
+
+        # Requests whose client can reassemble chunked responses
+        self.chunked_requests = set()
+
+        # Concurrent dispatch: every request runs as its own task, in one of
+        # two lanes. Analyses share a bounded work lane (max_concurrency
+        # running, max_queued_analyses waiting); control messages have
+        # their own lane and are never held up by them.
+        host_settings = load_host_settings()
+        self.max_concurrency = max(
+            1, int(host_settings.get("max_concurrency", DEFAULT_MAX_CONCURRENCY))
+        )
+        self.max_queued_analyses = max(
+            0,
+            int(
+                host_settings.get(
+                    "max_queued_analyses", DEFAULT_MAX_QUEUED_ANALYSES
+                )
+            ),
+        )
+        self.control_lane = None
+        self.work_lane = None
+        self.tasks = set()
+
+        # Running requests by requestId, for the cancel action
+        self.requests = {}
+        self.cancel_requested = set()
+
+        # Warm sessions lent out one per analysis
+        self.session_pool_size = max(
+            1, int(host_settings.get("session_pool_size", DEFAULT_SESSION_POOL_SIZE))
+        )
+
+        # Analysis result cache (a TTL of 0 disables it)
+        self.cache = None
+        self.config_fingerprint = None
+        cache_ttl = float(
+            host_settings.get("cache_ttl_seconds", DEFAULT_CACHE_TTL_SECONDS)
+        )
+        if cache_ttl > 0:
+            self.cache = result_cache.ResultCache(
+                os.path.join(USER_DATA_DIR, "cache"),
+                ttl_seconds=cache_ttl,
+                max_disk_bytes=int(
+                    float(
+                        host_settings.get(
+                            "cache_max_disk_mb", DEFAULT_CACHE_MAX_DISK_MB
+                        )
+                    )
+                    * 1024
+                    * 1024
+                ),
+            )
+
+        # Session config, cached until config.json or the instructions change.
+        # A background poll picks up edits made outside the Options page.
+        install_dir = os.path.dirname(os.path.abspath(__file__))
+        self.config_store = config_store.ConfigStore(
+            self._load_session_config,
+            [
+                os.path.join(USER_DATA_DIR, "config.json"),
+                os.path.join(install_dir, "config.json"),
+                os.path.join(USER_DATA_DIR, "copilot-instructions.md"),
+                os.path.join(install_dir, "copilot-instructions.md"),
+            ],
+        )
+        self.config_poll_seconds = float(
+            host_settings.get("config_poll_seconds", DEFAULT_CONFIG_POLL_SECONDS)
+        )
+        self.config_watch_task = None
+        self.refresh_lock = None
+        self.pending_rebuild = None
+        self.rebuild_debounce = REBUILD_DEBOUNCE_SECONDS
+
+        # Auth status, kept fresh in the background once the client is up
+        self.auth = auth_cache.AuthCache(
+            lambda: self.client.get_auth_status(),
+            ttl_seconds=float(
+                host_settings.get("auth_ttl_seconds", DEFAULT_AUTH_TTL_SECONDS)
+            ),
+        )
+
+        # Searchable history of analyses (a max age of 0 disables it). The
+        # database is opened on first use, off the event loop.
+        self.history = None
+        self.history_lock = threading.Lock()
+        self.history_max_age_days = float(
+            host_settings.get("history_max_age_days", DEFAULT_HISTORY_MAX_AGE_DAYS)
+        )
+        self.history_max_mb = float(
+            host_settings.get("history_max_mb", DEFAULT_HISTORY_MAX_MB)
+        )
+        self.history_export_markdown = bool(
+            host_settings.get("history_export_markdown", False)
+        )
+
+        # Stable per-request tokens ([GUID_1]...) instead of [REDACTED_*]
+        self.pseudonymize = bool(
+            host_settings.get("pseudonymize", DEFAULT_PSEUDONYMIZE)
+        )
+
+        # Optional process pool for scrubbing very large texts (0 = off)
+        self.scrub_processes = max(
+            0, int(host_settings.get("scrub_processes", DEFAULT_SCRUB_PROCESSES))
+        )
+        self.scrub_executor = None
+
+        # Runtime metrics, served by "stats" and exported to METRICS_FILE
+        self.metrics = metrics.Metrics()
+        self.in_flight = 0
+        self.metrics_export_seconds = float(
+            host_settings.get("metrics_export_seconds", DEFAULT_METRICS_EXPORT_SECONDS)
+        )
+        self.metrics_task = None
+
+        # analyze_error runs as named, timed stages
+        self.analysis_pipeline = self._build_analysis_pipeline()
+
+        # Model calls in flight, by prompt and config, so identical
+        # analyses arriving meanwhile share one call
+        self.flights = {}
+
+        # Turn timeouts follow observed Copilot latency; slow turns can be
+        # hedged on a second session
+        self.turn_latency = latency.LatencyTracker(
+            min_timeout=float(
+                host_settings.get(
+                    "min_turn_timeout_seconds", DEFAULT_MIN_TURN_TIMEOUT_SECONDS
+                )
+            )
+        )
+        self.adaptive_timeouts = bool(host_settings.get("adaptive_timeouts", True))
+        self.hedge_requests = bool(host_settings.get("hedge_requests", False))
+
+        # Resident (daemon) mode bookkeeping
+        self.idle_timeout = float(
+            host_settings.get("idle_timeout_seconds", DEFAULT_IDLE_TIMEOUT_SECONDS)
+        )
+        self.connections = 0
+        self.last_activity = time.monotonic()
+
         # Log startup location
         logging.info(
             f"Host started. Installation Dir: {os.path.dirname(os.path.abspath(__file__))}"
@@ -79,52 +336,80 @@ class NativeHost:
 
         return None
 
+    def _mark_startup(self, milestone):
+        """Records the time since process start at which a milestone was reached."""
+        elapsed_ms = round((time.perf_counter() - PROCESS_START) * 1000, 1)
+        self.startup_timings[milestone] = elapsed_ms
+        logging.info(f"Startup: {milestone} after {elapsed_ms} ms")
+
     async def initialize_sdk(self):
         """Initializes the Copilot Client and Session."""
         try:
             logging.info("Initializing Copilot Client...")
 
+            # Importing the SDK takes a noticeable amount of time; keep it off the loop
+            copilot = await asyncio.to_thread(importlib.import_module, "copilot")
+            self._mark_startup("sdk_imported_ms")
+
             cli_path = self.find_copilot_cli()
             options: CopilotClientOptions = {}
             if cli_path:
                 options["cli_path"] = cli_path
 
-            self.client = CopilotClient(options if options else None)
+            self.client = copilot.CopilotClient(options if options else None)
 
             # Explicitly start the client to ensure connection before session creation
             logging.info("Starting Copilot Client...")
             await self.client.start()
             logging.info("Copilot Client started.")
 
+            # Warm the auth status while the sessions are being created
+            self.auth.start_refresh()
+
             await self._refresh_session()
 
+            if self.config_poll_seconds > 0:
+                self.config_watch_task = asyncio.create_task(
+                    self.config_store.watch(
+                        self._reload_config, self.config_poll_seconds
+                    )
+                )
+
         except Exception as e:
             logging.error(f"Failed to initialize SDK: {e}")
-            self.session = None  # Ensure it's None on failure
+            self.pool = None  # Ensure it's None on failure
+
+        self.sdk_state = "ready" if self.pool else "error"
+        self._mark_startup("sdk_ready_ms")
+
+    def start_sdk_init(self):
+        """Starts SDK initialization as a background task."""
+        self.init_task = asyncio.create_task(self.initialize_sdk())
+
+    async def wait_for_sdk(self):
+        """Waits for background SDK initialization, if it is still running."""
+        if self.init_task:
+            # Shielded: a cancelled request must not cancel initialization
+            await asyncio.shield(self.init_task)
 
     def _get_session_config(self) -> SessionConfig:
+        """Returns the session configuration, re-read only if the files changed."""
+        return self.config_store.get()
+
+    def _load_session_config(self) -> SessionConfig:
         """Constructs the session configuration from disk."""
         session_config: SessionConfig = {}
-
-        # 1. User-specific config (APPDATA/DynamicsHelper/config.json)
-        user_config_path = os.path.join(USER_DATA_DIR, "config.json")
-
-        # 2. Default/bundled config (beside the executable/script)
         install_dir = os.path.dirname(os.path.abspath(__file__))
-        default_config_path = os.path.join(install_dir, "config.json")
-
-        # Determine which config to use (User overrides Default)
-        config_path = (
-            user_config_path
-            if os.path.exists(user_config_path)
-            else default_config_path
-        )
+        config_path = resolve_config_path()
 
         if os.path.exists(config_path):
             try:
                 with open(config_path, "r") as f:
                     config_data = json.load(f)
 
+                # Host tuning knobs are not part of the SDK session config
+                config_data.pop("host", None)
+
                 # Handle skill_directories (resolve relative paths)
                 if "skill_directories" in config_data:
                     resolved_skills = []
@@ -172,6 +457,20 @@ class NativeHost:
             except Exception as e:
                 logging.error(f"Failed to load instructions from {instr_path}: {e}")
 
+        # Tokens are only rehydrated if the model copies them verbatim. This is
+        # added here so a user's own instructions file cannot leave it out.
+        if self.pseudonymize:
+            system_message = dict(
+                session_config.get("system_message") or {"mode": "append"}
+            )
+            content = system_message.get("content", "")
+            system_message["content"] = (
+                f"{content}\n\n{PiiVault.INSTRUCTIONS}"
+                if content.strip()
+                else PiiVault.INSTRUCTIONS
+            )
+            session_config["system_message"] = system_message
+
         return session_config
 
     def _permission_handler(self, request, context) -> PermissionRequestResult:
@@ -185,34 +484,103 @@ class NativeHost:
         return {"kind": "approved"}
 
     async def _refresh_session(self):
-        """Re-creates the Copilot session with current config."""
+        """Re-creates the Copilot session pool with current config."""
         if not self.client:
             logging.error("Cannot refresh session: Client not initialized.")
             return False
 
+        pool = None
         try:
             config = self._get_session_config()
+            fingerprint = result_cache.config_fingerprint(config)
 
             # Register our permission handler to avoid hangs
             config["on_permission_request"] = self._permission_handler
 
-            self.session = await self.client.create_session(config)
-            logging.info("Copilot Session created/refreshed successfully.")
+            # Emit message deltas so streaming clients get text as it arrives
+            config["streaming"] = True
+
+            client = self.client
+            pool = SessionPool(
+                lambda: client.create_session(config), self.session_pool_size
+            )
+            if not await pool.start():
+                raise RuntimeError("No session could be created.")
+
+            # Swap in the new pool; in-flight analyses finish on the old one
+            old_pool, self.pool = self.pool, pool
+            self.config_fingerprint = fingerprint
+            if old_pool:
+                await old_pool.close()
+
+            logging.info("Copilot Session pool created/refreshed successfully.")
             return True
         except Exception as e:
             logging.error(f"Failed to create/refresh session: {e}")
-            self.session = None
+            # Stop the half-built pool's background replacements. A failed
+            # rebuild keeps the sessions that were already working.
+            if pool is not None and pool is not self.pool:
+                await pool.close()
             return False
 
+    async def _reload_config(self):
+        """Rebuilds the sessions after the config files were edited on disk."""
+        await self._request_rebuild()
+
+    async def _request_rebuild(self):
+        """
+        Schedules a session rebuild and waits for its outcome. Requests made
+        before the rebuild starts reading the config share it.
+        """
+        if self.pending_rebuild is None:
+            self.pending_rebuild = asyncio.ensure_future(self._debounced_rebuild())
+        # Shielded: one cancelled caller must not cancel the shared rebuild
+        return await asyncio.shield(self.pending_rebuild)
+
+    async def _debounced_rebuild(self):
+        await asyncio.sleep(self.rebuild_debounce)
+        async with self.refresh_lock:
+            # Saves from here on need a rebuild of their own
+            self.pending_rebuild = None
+            return await self._rebuild_if_changed()
+
+    async def _rebuild_if_changed(self):
+        """Returns "unchanged", "rebuilt" or "failed"."""
+        config = self._get_session_config()
+        if self.pool and (
+            result_cache.config_fingerprint(config) == self.config_fingerprint
+        ):
+            logging.info("Session config unchanged. Keeping current sessions.")
+            return "unchanged"
+
+        # Instructions and model are session settings: the client keeps
+        # running and only the session pool is replaced
+        logging.info("Session config changed. Rebuilding sessions.")
+        if not await self._refresh_session():
+            return "failed"
+        # A fixed config file also recovers from a failed start
+        self.sdk_state = "ready"
+        return "rebuilt"
+
     async def handle_update_config(self, payload):
-        """Updates configuration files and refreshes the session."""
+        """
+        Saves configuration files and rebuilds the sessions if the effective
+        session config changed.
+        """
+        # Don't race the initial session creation
+        await self.wait_for_sdk()
+
         try:
+            written = []
+
             # 1. Update System Instructions
             if "system_instructions" in payload:
                 instr_path = os.path.join(USER_DATA_DIR, "copilot-instructions.md")
-                with open(instr_path, "w", encoding="utf-8") as f:
-                    f.write(payload["system_instructions"])
-                logging.info("Updated copilot-instructions.md")
+                if config_store.write_if_changed(
+                    instr_path, payload["system_instructions"]
+                ):
+                    written.append("copilot-instructions.md")
+                    logging.info("Updated copilot-instructions.md")
 
             # 2. Update Config (Model, etc)
             if "config" in payload:
@@ -227,301 +595,1108 @@ class NativeHost:
                         pass  # Start fresh if corrupt
 
                 # Merge new config
-                current_data.update(payload["config"])
-
-                with open(user_config_path, "w") as f:
-                    json.dump(current_data, f, indent=2)
-                logging.info("Updated config.json")
-
-            # 3. Refresh Session
-            success = await self._refresh_session()
-            if success:
+                new_data = dict(current_data)
+                new_data.update(payload["config"])
+
+                if new_data != current_data or not os.path.exists(user_config_path):
+                    config_store.write_atomic(
+                        user_config_path, json.dumps(new_data, indent=2)
+                    )
+                    written.append("config.json")
+                    logging.info("Updated config.json")
+
+            if not written and self.pool:
+                return {"success": True, "message": "Configuration unchanged."}
+
+            # 3. Refresh Session (coalesced with other saves and file edits)
+            outcome = await self._request_rebuild()
+            if outcome == "failed":
+                return {"error": "Configuration saved but session refresh failed."}
+            if outcome == "unchanged":
                 return {
                     "success": True,
-                    "message": "Configuration updated and session refreshed.",
+                    "message": "Configuration saved. Session settings unchanged.",
                 }
-            else:
-                return {"error": "Configuration saved but session refresh failed."}
+            return {
+                "success": True,
+                "message": "Configuration updated and session refreshed.",
+            }
 
         except Exception as e:
             logging.error(f"Error updating config: {e}")
             return {"error": str(e)}
 
-    def start_input_thread(self):
-        """Starts a daemon thread to read stdin without blocking the async loop."""
-        t = threading.Thread(target=self._read_stdin_loop, daemon=True)
-        t.start()
-        logging.info("Input thread started.")
-
-    def _read_stdin_loop(self):
-        """Blocking loop that reads Native Messaging format from stdin."""
-        while self.running and self.loop:
+    async def read_stdin(self):
+        """Dispatches stdin frames as they arrive. Returns when stdin closes."""
+        reader = None
+        if os.name != "nt":
             try:
-                # Read 4 bytes length
-                # sys.stdin.buffer.read is blocking
-                raw_length = sys.stdin.buffer.read(4)
-                if len(raw_length) == 0:
-                    logging.info("Stdin closed. Stopping.")
-                    self.running = False
-                    # Signal the main loop to exit
-                    self.loop.call_soon_threadsafe(self.input_queue.put_nowait, None)
-                    break
+                reader = await framing.connect_stdin(sys.stdin.buffer)
+            except (OSError, ValueError) as e:
+                logging.info(f"Stdin is not a pipe ({e}); reading it on a thread.")
 
-                message_length = struct.unpack("@I", raw_length)[0]
-                message_data = sys.stdin.buffer.read(message_length).decode("utf-8")
+        if reader is None:
+            # The Windows proactor cannot watch the anonymous stdin pipe
+            await self._read_stdin_on_thread()
+        else:
+            logging.info("Reading stdin on the event loop.")
+            while True:
+                try:
+                    message = await framing.read_frame(reader)
+                except ValueError as e:
+                    # The stream cannot be resynchronized after a bad length
+                    logging.error(f"Error in input stream: {e}")
+                    break
+                if message is None:
+                    break
+                self.dispatch(message)
 
-                if not message_data:
-                    continue
+        logging.info("Stdin closed. Stopping.")
+        self.running = False
 
-                message = json.loads(message_data)
-                # Thread-safe put into async queue
-                self.loop.call_soon_threadsafe(self.input_queue.put_nowait, message)
+    async def _read_stdin_on_thread(self):
+        """Blocking reads on a thread, decoded incrementally, dispatched on the loop."""
+        done = asyncio.Event()
 
+        def read_loop():
+            decoder = framing.FrameDecoder()
+            fd = sys.stdin.fileno()
+            try:
+                while True:
+                    data = os.read(fd, framing.READ_CHUNK_BYTES)
+                    if not data:
+                        break
+                    for message in decoder.feed(data):
+                        self.loop.call_soon_threadsafe(self.dispatch, message)
             except Exception as e:
                 logging.error(f"Error in input thread: {e}")
-                self.running = False
-                break
+            if decoder.pending:
+                logging.warning(f"Stdin closed inside a frame ({decoder.pending} bytes).")
+            self.loop.call_soon_threadsafe(done.set)
+
+        threading.Thread(target=read_loop, daemon=True).start()
+        await done.wait()
 
     def send_message(self, message_content):
-        """Writes a message to stdout in Native Messaging format."""
+        """Queues a message for stdout in Native Messaging format."""
         try:
-            logging.debug(f"Sending message: {json.dumps(message_content)}")
-            encoded_content = json.dumps(message_content).encode("utf-8")
-            encoded_length = struct.pack("@I", len(encoded_content))
-
-            sys.stdout.buffer.write(encoded_length)
-            sys.stdout.buffer.write(encoded_content)
-            sys.stdout.buffer.flush()
+            frames = self._encode_frames(message_content)
         except Exception as e:
             logging.error(f"Error sending message: {e}")
+            return
+        logging.debug("Sending message: %s", host_logging.Payload(message_content))
+
+        if self.writer is None:
+            self.writer = outbound.FrameWriter(sys.stdout.buffer)
+            self.writer.start()
+        self.writer.put_frames(frames)
 
-    async def handle_analyze_error(self, payload):
-        """Uses the Copilot SDK to analyze the error."""
-        text = payload.get("text")
-        context = payload.get("context", "Unknown")
+    def _encode_frames(self, message):
+        """Frames for one message; oversized ones are chunked if the request allows it."""
+        chunked = message.get("requestId") in self.chunked_requests
+        return framing.encode_frames(message, chunked=chunked)
 
-        if not text:
+    def _save_analysis(self, text, context, full_response):
+        """
+        Saves the latest analysis to Downloads (matching old behavior). The
+        file is replaced atomically, so concurrent analyses never leave a
+        torn one; the history store keeps every analysis.
+        """
+        downloads_path = DOWNLOADS_DIR
+        os.makedirs(downloads_path, exist_ok=True)
+        output_file = os.path.join(downloads_path, "dh_error_analysis.md")
+        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        parts = [
+            "# Dynamics Helper - Error Analysis\n\n",
+            f"**Timestamp:** {timestamp}\n\n",
+            f"## Original Error\n{text}\n\n",
+        ]
+        if context:
+            parts.append(f"## Context\n{context}\n\n")
+        parts.append(f"## AI Explanation\n{full_response}\n")
+        config_store.write_atomic(output_file, "".join(parts))
+
+        return output_file
+
+    def _get_history(self):
+        """Opens the history store on first use. Runs on a worker thread."""
+        with self.history_lock:
+            if self.history is None and self.history_max_age_days > 0:
+                # sqlite3 is only imported once history is actually used
+                import history_store
+
+                self.history = history_store.HistoryStore(
+                    os.path.join(USER_DATA_DIR, "history.db"),
+                    max_age_days=self.history_max_age_days,
+                    max_bytes=int(self.history_max_mb * 1024 * 1024),
+                    export_dir=(
+                        os.path.join(USER_DATA_DIR, "history")
+                        if self.history_export_markdown
+                        else None
+                    ),
+                )
+            return self.history
+
+    async def _record_history(self, prompt, response, context, cached):
+        """Appends an analysis to the history. Returns its id, or None."""
+
+        def record():
+            history = self._get_history()
+            if history is None:
+                return None
+            return history.add(prompt, response, context=context, cached=cached)
+
+        try:
+            return await asyncio.to_thread(record)
+        except Exception as e:
+            logging.error(f"Failed to record analysis history: {e}")
+            return None
+
+    def _close_history(self):
+        with self.history_lock:
+            if self.history:
+                self.history.close()
+                self.history = None
+
+    async def handle_search_history(self, payload):
+        """Full-text search over past analyses."""
+        query = payload.get("query", "")
+        limit = payload.get("limit", 20)
+        started = time.perf_counter()
+
+        def search():
+            history = self._get_history()
+            return None if history is None else history.search(query, limit)
+
+        results = await asyncio.to_thread(search)
+        if results is None:
+            return {"error": "Analysis history is disabled."}
+        return {
+            "results": results,
+            "took_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+
+    async def handle_get_analysis(self, payload):
+        """Returns one past analysis by id."""
+        try:
+            analysis_id = int(payload.get("id"))
+        except (TypeError, ValueError):
+            return {"error": "A numeric analysis id is required."}
+
+        def get():
+            history = self._get_history()
+            return None if history is None else history.get(analysis_id)
+
+        record = await asyncio.to_thread(get)
+        if record is None:
+            return {"error": f"Analysis {analysis_id} not found."}
+        return record
+
+    async def _scrub(self, text, vault=None):
+        """
+        Scrubs PII. Large pasted logs are scrubbed in chunks on a worker
+        thread (and optionally a process pool) so the event loop keeps
+        serving other requests.
+        """
+        self.metrics.inc("scrubbed_chars", len(text))
+        if len(text) < LARGE_TEXT_CHARS:
+            return self.scrubber.scrub(text, vault)
+
+        executor = self._get_scrub_executor()
+
+        def scrub_chunks():
+            return "".join(
+                self.scrubber.scrub_iter(text, executor=executor, vault=vault)
+            )
+
+        return await asyncio.to_thread(scrub_chunks)
+
+    def _get_scrub_executor(self):
+        if self.scrub_processes and self.scrub_executor is None:
+            from concurrent.futures import ProcessPoolExecutor
+
+            self.scrub_executor = ProcessPoolExecutor(self.scrub_processes)
+        return self.scrub_executor
+
+    def _shutdown_scrub_executor(self):
+        if self.scrub_executor:
+            self.scrub_executor.shutdown(wait=False, cancel_futures=True)
+            self.scrub_executor = None
+
+    async def _check_auth(self):
+        """Auth status for the fast-fail check, or None if unknown."""
+        await self.wait_for_sdk()
+        if not self.client:
+            return None
+        return await self.auth.get()
+
+    def _build_analysis_pipeline(self):
+        """The stages of analyze_error, in order (see pipeline.py)."""
+
+        def needs_model(analysis):
+            return not (analysis.cached or analysis.coalesced)
+
+        def leads_flight(analysis):
+            return analysis.flight is not None
+
+        return pipeline.Pipeline(
+            [
+                ("validate", self._stage_validate),
+                ("scrub", self._stage_scrub),
+                ("build_prompt", self._stage_build_prompt),
+                ("cache_lookup", self._stage_cache_lookup),
+                ("wait_for_sdk", self._stage_wait_for_sdk, needs_model),
+                ("coalesce", self._stage_coalesce, needs_model),
+                ("auth", self._stage_auth, needs_model),
+                ("send", self._stage_send, needs_model),
+                ("extract", self._stage_extract, needs_model),
+                ("share", self._stage_share, leads_flight),
+                ("store", self._stage_store),
+                ("save", self._stage_save),
+                ("respond", self._stage_respond),
+            ]
+        )
+
+    async def handle_analyze_error(self, payload, emit=None, received=None):
+        """
+        Uses the Copilot SDK to analyze the error.
+        If `emit` is given, partial output and progress are streamed through it
+        before the result is returned. The result carries per-stage timings.
+        `received` is when the request arrived (monotonic clock); its time
+        budget counts from there.
+        """
+        analysis = pipeline.Analysis(payload, emit)
+        analysis.deadline = (received or time.monotonic()) + ANALYSIS_BUDGET_SECONDS
+        result = None
+        try:
+            result = await self.analysis_pipeline.run(analysis)
+        except Exception as e:
+            self.metrics.inc("sdk_errors")
+            logging.error(f"SDK Error in stage {analysis.stage}: {e}")
+            result = {"error": f"SDK Error: {str(e)}"}
+        finally:
+            if analysis.auth_check and not analysis.auth_check.done():
+                analysis.auth_check.cancel()
+            self._land_flight(analysis, result)
+
+        total_ms = round(sum(analysis.timings.values()), 2)
+        logging.info(
+            f"Analysis took {total_ms} ms",
+            extra={"stages": analysis.timings, "duration_ms": total_ms},
+        )
+        result["timings"] = {"stages": analysis.timings, "total_ms": total_ms}
+        return result
+
+    async def _stage_validate(self, analysis):
+        if not analysis.text:
             return {"error": "No text provided for analysis."}
 
-        if not self.session or not self.client:
+        # Check authentication alongside scrubbing. It is normally answered
+        # from the cache, so no CLI round trip lands on the critical path.
+        analysis.auth_check = asyncio.ensure_future(self._check_auth())
+
+    async def _stage_scrub(self, analysis):
+        # Scrub PII from text and context. With pseudonymization, one vault
+        # covers both so a value gets the same token everywhere; the real
+        # values are put back into the answer locally.
+        analysis.vault = PiiVault() if self.pseudonymize else None
+        analysis.scrubbed_text = await self._scrub(analysis.text, analysis.vault)
+        if analysis.context:
+            analysis.scrubbed_context = await self._scrub(
+                analysis.context, analysis.vault
+            )
+
+    async def _stage_build_prompt(self, analysis):
+        analysis.prompt = (
+            f"{analysis.scrubbed_text}\nContext: {analysis.scrubbed_context}"
+            if analysis.scrubbed_context
+            else analysis.scrubbed_text
+        )
+
+    async def _stage_cache_lookup(self, analysis):
+        # Repeat analyses are answered from the cache, without a model call.
+        # Clients can pass "no_cache" to force a fresh answer. The fingerprint
+        # comes from the config files, so a hit never waits for the SDK.
+        analysis.fingerprint = result_cache.config_fingerprint(
+            self._get_session_config()
+        )
+        if not self.cache:
+            return
+        analysis.cache_key = result_cache.make_key(
+            analysis.prompt, analysis.fingerprint
+        )
+        if analysis.payload.get("no_cache"):
+            return
+        cached = self.cache.get(analysis.cache_key)
+        self.metrics.inc("cache_hits" if cached is not None else "cache_misses")
+        if cached is not None:
+            logging.info("Analysis served from cache.")
+            analysis.markdown = cached["markdown"]
+            analysis.cached = True
+
+    async def _stage_wait_for_sdk(self, analysis):
+        await self.wait_for_sdk()
+
+    async def _stage_coalesce(self, analysis):
+        # An identical analysis already waiting on the model answers this one
+        # too. "no_cache" asks for a fresh model call, so it never joins one.
+        if analysis.payload.get("no_cache"):
+            return
+        key = result_cache.make_key(analysis.prompt, analysis.fingerprint)
+        flight = self.flights.get(key)
+        if flight is None:
+            analysis.flight_key = key
+            analysis.flight = self.flights[key] = (
+                asyncio.get_running_loop().create_future()
+            )
+            return
+
+        self.metrics.inc("coalesced")
+        logging.info("Identical analysis in flight; sharing its result.")
+        if analysis.emit:
+            analysis.emit(
+                "progress",
+                {"message": "Waiting for an identical analysis already running"},
+            )
+        # Shielded: this request going away must not cancel the others
+        shared = await asyncio.shield(flight)
+        if shared is None:
+            # The first request was cancelled; ask the model ourselves
+            return
+        kind, value = shared
+        if kind == "error":
+            return dict(value)
+        analysis.markdown = value
+        analysis.coalesced = True
+
+    def _land_flight(self, analysis, result):
+        """Hands the leader's outcome to the identical requests waiting on it."""
+        flight = analysis.flight
+        if flight is None:
+            return
+        if self.flights.get(analysis.flight_key) is flight:
+            del self.flights[analysis.flight_key]
+        if not flight.done():
+            # An error the others would have hit too, or None if cancelled
+            flight.set_result(None if result is None else ("error", dict(result)))
+
+    async def _stage_auth(self, analysis):
+        if not self.pool or not self.client:
             return {"error": "Copilot session/client not initialized."}
 
         # 1. Fast Fail: Check Authentication Status
+        auth_status = await analysis.auth_check
+        if auth_status is not None and not auth_status.get("isAuthenticated", False):
+            logging.warning("Copilot is not authenticated.")
+            return {
+                "error": f"Copilot is not authenticated. Login: {auth_status.get('login', 'Unknown')}. Status: {auth_status.get('statusMessage', 'Unknown')}. Please run 'copilot auth' in your terminal."
+            }
+
+    async def _stage_send(self, analysis):
+        if analysis.fingerprint != self.config_fingerprint:
+            # The sessions still run the previous config (a rebuild is
+            # pending), so their answer is not cached under the new one
+            analysis.cache_key = None
+
+        prompt = analysis.prompt
+        logging.debug("Scrubbed Prompt content: %s", host_logging.Payload(prompt))
+        logging.info(f"Sending prompt to Copilot (length: {len(prompt)})")
+
+        # Sanitize prompt to avoid breaking CLI IPC on Windows
+        # Empirical evidence shows double quotes " cause hangs.
+        # Single quotes also seem to cause hangs.
+        # Newlines cause command injection issues if not handled by JSON-RPC.
+        # We replace them with spaces to preserve word boundaries.
+
+        # UPDATE: We are relaxing this. The SDK sends JSON. Newlines should be fine.
+        # Flattening the prompt might be confusing the model.
+        # We will still escape double quotes just in case the SDK implementation does simple string interpolation (unlikely but safe).
+
+        # safe_prompt = (
+        #     prompt.replace('"', " ")
+        #     .replace("'", " ")
+        #     .replace("\n", " ")
+        #     .replace("\r", "")
+        # )
+
+        # Less aggressive sanitization:
+        safe_prompt = prompt  # Trusting JSON serialization for now.
+
+        logging.info(f"Prompt length: {len(safe_prompt)}")
+
+        # Use send_and_wait (send_messages is not available)
+        message_options: MessageOptions = {"prompt": safe_prompt}
+
+        # Timeout Strategy:
+        # Frontend (FAB.tsx) has a safety timeout of 310 seconds.
+        # We set the backend timeout to 300 seconds (shorter than frontend).
+        # This ensures that if the SDK hangs (e.g., waiting for auth/confirmation),
+        # we catch it here and return a USEFUL error message to the UI before the frontend
+        # just gives up with a generic "Analysis timed out" message.
+        # Once enough turns have been seen, the timeout follows their observed
+        # latency instead (see latency.py); 300 seconds stays the ceiling.
+        # The turn also has to fit in what is left of the request's budget
+        # after queuing and SDK startup.
+        timeout_seconds = min(
+            (
+                self.turn_latency.timeout()
+                if self.adaptive_timeouts
+                else latency.MAX_TIMEOUT_SECONDS
+            ),
+            analysis.deadline - time.monotonic(),
+        )
+        if timeout_seconds <= 0:
+            self.metrics.inc("timeouts")
+            logging.error("Analysis used up its time budget before reaching Copilot.")
+            return {
+                "error": "Analysis ran out of time before reaching Copilot (queued, or waiting for Copilot to start). Please try again."
+            }
+        deadline = time.monotonic() + timeout_seconds
+
+        logging.debug(
+            "Calling send_and_wait with options: %s",
+            host_logging.Payload(message_options),
+        )
         try:
-            auth_status = await self.client.get_auth_status()
-            if not auth_status.get("isAuthenticated", False):
-                logging.warning("Copilot is not authenticated.")
-                return {
-                    "error": f"Copilot is not authenticated. Login: {auth_status.get('login', 'Unknown')}. Status: {auth_status.get('statusMessage', 'Unknown')}. Please run 'copilot auth' in your terminal."
-                }
-        except Exception as e:
-            logging.error(f"Failed to check auth status: {e}")
-            # Continue safely? or fail? Let's try to continue but log it.
+            hedge_delay = self.turn_latency.hedge_delay()
+            if self.hedge_requests and hedge_delay is not None and not analysis.emit:
+                analysis.response_event = await self._hedged_turn(
+                    analysis, message_options, deadline, hedge_delay
+                )
+            else:
+                analysis.response_event = await self._run_turn(
+                    analysis, message_options, deadline
+                )
+            logging.debug(
+                "Returned from send_and_wait. Event: %s",
+                host_logging.Payload(analysis.response_event),
+            )
 
-        try:
-            # Scrub PII from text and context
-            scrubbed_text = self.scrubber.scrub(text)
-            scrubbed_context = self.scrubber.scrub(context) if context else ""
-
-            prompt = (
-                f"{scrubbed_text}\nContext: {scrubbed_context}"
-                if scrubbed_context
-                else scrubbed_text
+        except asyncio.TimeoutError:
+            self.metrics.inc("timeouts")
+            logging.error(f"Copilot request timed out after {timeout_seconds} seconds.")
+            # Return a specific error guiding the user to check authentication/skills
+            return {
+                "error": "Copilot request timed out. This often happens if Copilot is waiting for authentication or approval. Please run 'copilot' in your terminal to verify your login and skill permissions."
+            }
+        except SessionPoolError as e:
+            logging.error(f"No session available: {e}")
+            return {"error": f"Copilot is busy: {e}"}
+
+    async def _run_turn(self, analysis, message_options, deadline):
+        """One send_and_wait on a leased session, finished by `deadline`."""
+        # Borrow a warm session. Time spent waiting for one counts
+        # against the same budget so the frontend contract holds.
+        async with self.pool.lease(
+            timeout=max(1.0, deadline - time.monotonic())
+        ) as session:
+            remaining = max(1.0, deadline - time.monotonic())
+            relay = (
+                StreamRelay(
+                    analysis.emit,
+                    transform=(
+                        analysis.vault.rehydrate
+                        if analysis.vault is not None
+                        else None
+                    ),
+                )
+                if analysis.emit
+                else None
             )
-            logging.debug(f"Scrubbed Prompt content: {prompt}")
-            logging.info(f"Sending prompt to Copilot (length: {len(prompt)})")
-
-            # Accumulate the response
-            full_response = ""
-
-            # Sanitize prompt to avoid breaking CLI IPC on Windows
-            # Empirical evidence shows double quotes " cause hangs.
-            # Single quotes also seem to cause hangs.
-            # Newlines cause command injection issues if not handled by JSON-RPC.
-            # We replace them with spaces to preserve word boundaries.
-
-            # UPDATE: We are relaxing this. The SDK sends JSON. Newlines should be fine.
-            # Flattening the prompt might be confusing the model.
-            # We will still escape double quotes just in case the SDK implementation does simple string interpolation (unlikely but safe).
-
-            # safe_prompt = (
-            #     prompt.replace('"', " ")
-            #     .replace("'", " ")
-            #     .replace("\n", " ")
-            #     .replace("\r", "")
-            # )
-
-            # Less aggressive sanitization:
-            safe_prompt = prompt  # Trusting JSON serialization for now.
-
-            logging.info(f"Prompt length: {len(safe_prompt)}")
-
-            # Use send_and_wait (send_messages is not available)
-            message_options: MessageOptions = {"prompt": safe_prompt}
-
-            # Timeout Strategy:
-            # Frontend (FAB.tsx) has a safety timeout of 310 seconds.
-            # We set the backend timeout to 300 seconds (shorter than frontend).
-            # This ensures that if the SDK hangs (e.g., waiting for auth/confirmation),
-            # we catch it here and return a USEFUL error message to the UI before the frontend
-            # just gives up with a generic "Analysis timed out" message.
-            timeout_seconds = 300.0
-
-            logging.debug(f"Calling send_and_wait with options: {message_options}")
+            unsubscribe = session.on(relay) if relay else None
+            started = time.monotonic()
             try:
-                response_event = await self.session.send_and_wait(
-                    message_options, timeout=timeout_seconds
+                response_event = await session.send_and_wait(
+                    message_options, timeout=remaining
                 )
-                logging.debug(f"Returned from send_and_wait. Event: {response_event}")
-
-                full_response = ""
-                # Handle possible "auth_required" or "confirmation_required" events if the SDK supports them
-                # Since we don't know the exact SDK event types for auth, we check for "type" field generically
-                if response_event:
-                    event_type = getattr(response_event, "type", "unknown")
-                    if event_type in [
-                        "auth_required",
-                        "login_required",
-                        "confirmation_required",
-                    ]:
-                        logging.warning(
-                            f"Copilot SDK requires interaction: {event_type}"
-                        )
-                        return {
-                            "error": f"Copilot requires authentication or interaction: {event_type}. Please run 'copilot' in your terminal first to authenticate."
-                        }
-
-                if response_event and response_event.data:
-                    # Check for content, but also handle cases where it might be in a different field or the event type is weird
-                    if (
-                        hasattr(response_event.data, "content")
-                        and response_event.data.content
-                    ):
-                        full_response = response_event.data.content
-                    else:
-                        # DEBUG: Dump the full event to understand why content is missing
-                        # This will help diagnose if it's a refusal, a filter, or a different event type
-                        import pprint
-
-                        debug_dump = pprint.pformat(response_event, indent=2)
-                        full_response = (
-                            f"### Debug: No content received\n\n"
-                            f"The Copilot SDK returned an event without standard content. "
-                            f"Here is the raw event data for debugging:\n\n"
-                            f"```text\n{debug_dump}\n```"
-                        )
-                        logging.warning(
-                            f"Response event data missing content: {response_event}"
-                        )
-                else:
-                    full_response = "No response event received (None)."
-
-            except asyncio.TimeoutError:
-                logging.error(
-                    f"Copilot request timed out after {timeout_seconds} seconds."
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    # The turn took at least this long. Leaving it out would
+                    # pull the percentiles, and so the next timeout, down.
+                    self.turn_latency.observe(remaining)
+                # Maybe the login expired; check again next time
+                self.auth.invalidate()
+                raise
+            finally:
+                if unsubscribe:
+                    unsubscribe()
+                    relay.flush(final=True)
+            self.turn_latency.observe(time.monotonic() - started)
+            return response_event
+
+    async def _hedged_turn(self, analysis, message_options, deadline, delay):
+        """
+        Runs a turn and, if it is still going after `delay` (the observed p95)
+        and a session is idle, the same turn on a second session. The first
+        answer wins; the other turn is cancelled, which aborts it.
+        """
+        first = asyncio.ensure_future(
+            self._run_turn(analysis, message_options, deadline)
+        )
+        turns = {first}
+        started = {first: time.monotonic()}
+        winner = None
+        try:
+            done, _ = await asyncio.wait(turns, timeout=delay)
+            if done or not self.pool.available:
+                return await first
+
+            self.metrics.inc("hedged")
+            logging.info(f"Turn slower than p95 ({delay:.1f}s); sending a hedge.")
+            hedge = asyncio.ensure_future(
+                self._run_turn(analysis, message_options, deadline)
+            )
+            turns.add(hedge)
+            started[hedge] = time.monotonic()
+
+            error = None
+            pending = set(turns)
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
                 )
-                # Return a specific error guiding the user to check authentication/skills
+                for turn in done:
+                    if turn.exception() is None:
+                        if turn is hedge:
+                            self.metrics.inc("hedge_wins")
+                        winner = turn
+                        return turn.result()
+                    error = error or turn.exception()
+            # Both failed: report the first failure
+            raise error
+        finally:
+            losers = [turn for turn in turns if not turn.done()]
+            for turn in losers:
+                turn.cancel()
+                if winner is not None:
+                    # The loser ran at least this long; count it so slow
+                    # turns are not only ever seen when they win
+                    self.turn_latency.observe(time.monotonic() - started[turn])
+            # Return once the losers are aborted and their sessions are back
+            # in the pool (cancel replies only after that)
+            await asyncio.gather(*losers, return_exceptions=True)
+            for turn in turns:
+                if not turn.cancelled():
+                    turn.exception()  # the loser's failure is not news
+
+    async def _stage_extract(self, analysis):
+        response_event = analysis.response_event
+
+        # Handle possible "auth_required" or "confirmation_required" events if the SDK supports them
+        # Since we don't know the exact SDK event types for auth, we check for "type" field generically
+        if response_event:
+            event_type = getattr(response_event, "type", "unknown")
+            if event_type in [
+                "auth_required",
+                "login_required",
+                "confirmation_required",
+            ]:
+                logging.warning(f"Copilot SDK requires interaction: {event_type}")
+                self.auth.invalidate()
                 return {
-                    "error": "Copilot request timed out. This often happens if Copilot is waiting for authentication or approval. Please run 'copilot' in your terminal to verify your login and skill permissions."
+                    "error": f"Copilot requires authentication or interaction: {event_type}. Please run 'copilot' in your terminal first to authenticate."
                 }
 
-            logging.info("Received full response from Copilot.")
-
-            # Save to Downloads (matching old behavior)
-            if os.name == "nt":
-                downloads_path = os.path.join(os.environ["USERPROFILE"], "Downloads")
+        if response_event and response_event.data:
+            # Check for content, but also handle cases where it might be in a different field or the event type is weird
+            if hasattr(response_event.data, "content") and response_event.data.content:
+                analysis.markdown = response_event.data.content
+                analysis.cacheable = True
             else:
-                downloads_path = os.path.join(os.path.expanduser("~"), "Downloads")
-
-            output_file = os.path.join(downloads_path, "dh_error_analysis.md")
-            timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-            with open(output_file, "w", encoding="utf-8") as f:
-                f.write(f"# Dynamics Helper - Error Analysis\n\n")
-                f.write(f"**Timestamp:** {timestamp}\n\n")
-                f.write(f"## Original Error\n{text}\n\n")
-                if context:
-                    f.write(f"## Context\n{context}\n\n")
-                f.write(f"## AI Explanation\n{full_response}\n")
-
-            return {"success": True, "markdown": full_response, "saved_to": output_file}
+                # DEBUG: Dump the full event to understand why content is missing
+                # This will help diagnose if it's a refusal, a filter, or a different event type
+                import pprint
+
+                debug_dump = pprint.pformat(response_event, indent=2)
+                analysis.markdown = (
+                    f"### Debug: No content received\n\n"
+                    f"The Copilot SDK returned an event without standard content. "
+                    f"Here is the raw event data for debugging:\n\n"
+                    f"```text\n{debug_dump}\n```"
+                )
+                logging.warning(
+                    f"Response event data missing content: {response_event}"
+                )
+        else:
+            analysis.markdown = "No response event received (None)."
+
+        logging.info("Received full response from Copilot.")
+
+    async def _stage_share(self, analysis):
+        # Still tokenized, so each waiting request rehydrates it with its own
+        # vault
+        if self.flights.get(analysis.flight_key) is analysis.flight:
+            del self.flights[analysis.flight_key]
+        analysis.flight.set_result(("markdown", analysis.markdown))
+
+    async def _stage_store(self, analysis):
+        # The cache keeps the tokenized answer, so it can be rehydrated
+        # for any request with the same shape
+        if analysis.cache_key and analysis.cacheable:
+            self.cache.put(analysis.cache_key, {"markdown": analysis.markdown})
+
+        # History also keeps the scrubbed answer only
+        analysis.analysis_id = await self._record_history(
+            analysis.prompt,
+            analysis.markdown,
+            analysis.scrubbed_context,
+            cached=analysis.cached or analysis.coalesced,
+        )
 
-        except Exception as e:
-            logging.error(f"SDK Error: {e}")
-            return {"error": f"SDK Error: {str(e)}"}
+    async def _stage_save(self, analysis):
+        analysis.markdown = analysis.rehydrate(analysis.markdown)
+        analysis.output_file = await asyncio.to_thread(
+            self._save_analysis,
+            analysis.text,
+            analysis.context,
+            analysis.markdown,
+        )
 
-    async def process_message(self, message):
-        """Dispatches messages to handlers."""
+    async def _stage_respond(self, analysis):
+        return {
+            "success": True,
+            "markdown": analysis.markdown,
+            "saved_to": analysis.output_file,
+            "cached": analysis.cached,
+            "coalesced": analysis.coalesced,
+            "analysis_id": analysis.analysis_id,
+        }
+
+    async def process_message(self, message, send=None, received=None):
+        """
+        Dispatches messages to handlers. Replies go to `send` (stdout by
+        default). `received` is when the message arrived (monotonic clock).
+        """
         action = message.get("action")
         payload = message.get("payload", {})
         request_id = message.get("requestId")
 
         response = {"requestId": request_id, "status": "success", "data": None}
 
+        # Every record logged while handling this request carries its id
+        context_token = host_logging.request_id.set(request_id)
+        started = time.perf_counter()
+
+        # Port clients (streaming or explicit opt-in) can take a response
+        # over the 1 MB browser limit in chunks
+        chunked = isinstance(payload, dict) and bool(
+            payload.get("chunked") or payload.get("stream")
+        )
+        if chunked:
+            self.chunked_requests.add(request_id)
+
         try:
             if action == "ping":
                 response["data"] = "pong"
+                response["sdk"] = self.sdk_state
 
             elif action == "health_check":
                 # With the SDK, existence of self.client/session implies health
-                if self.client and self.session:
+                if self.sdk_state == "initializing":
+                    response["data"] = {
+                        "status": "initializing",
+                        "message": "Copilot SDK is starting",
+                    }
+                elif self.client and self.pool:
                     response["data"] = {
                         "status": "healthy",
                         "message": "Copilot SDK Active",
+                        "sessions": {
+                            "idle": self.pool.available,
+                            "size": self.pool.size,
+                        },
                     }
                 else:
                     response["data"] = {
                         "status": "error",
                         "message": "SDK not initialized",
                     }
+                response["data"]["startup"] = self.startup_timings
+                if self.writer:
+                    response["data"]["outbound"] = self.writer.stats()
 
             elif action == "analyze_error":
-                response["data"] = await self.handle_analyze_error(payload)
+                emit = None
+                if payload.get("stream"):
+                    # Opt-in: partial/progress frames first, then the usual
+                    # response marked as the final frame
+                    response["type"] = "final"
+
+                    def emit(frame_type, data):
+                        (send or self.send_message)(
+                            {
+                                "requestId": request_id,
+                                "status": "success",
+                                "type": frame_type,
+                                "data": data,
+                            }
+                        )
+
+                response["data"] = await self.handle_analyze_error(
+                    payload, emit, received
+                )
 
             elif action == "update_config":
                 response["data"] = await self.handle_update_config(payload)
 
+            elif action == "search_history":
+                response["data"] = await self.handle_search_history(payload)
+
+            elif action == "get_analysis":
+                response["data"] = await self.handle_get_analysis(payload)
+
+            elif action == "stats":
+                response["data"] = self.get_stats()
+
+            elif action == "cancel":
+                response["data"] = await self.handle_cancel(payload)
+
             else:
                 response["status"] = "error"
                 response["error"] = "unknown_action"
                 response["message"] = f"Unknown action: {action}"
 
+        except asyncio.CancelledError:
+            # Shutting down, or cancelled by the client (then _dispatch
+            # sends the "cancelled" response)
+            response["status"] = "cancelled"
+            raise
+
         except Exception as e:
+            logging.exception(f"Unhandled error in {action}")
             response["status"] = "error"
             response["error"] = "internal_error"
             response["message"] = str(e)
 
-        self.send_message(response)
+        finally:
+            if response["status"] != "cancelled":
+                (send or self.send_message)(response)
+            if chunked:
+                self.chunked_requests.discard(request_id)
+            self._record_request(action, response, time.perf_counter() - started)
+            host_logging.request_id.reset(context_token)
+
+    def _record_request(self, action, response, seconds):
+        """Logs a finished request and adds it to the metrics."""
+        data = response.get("data")
+        if response["status"] == "cancelled":
+            outcome = "cancelled"
+        elif response["status"] != "success" or (
+            isinstance(data, dict) and "error" in data
+        ):
+            outcome = "error"
+        else:
+            outcome = "success"
 
-    async def run(self):
-        """Main async loop."""
+        # Unknown actions share one label so clients can't grow the metrics
+        if response.get("error") == "unknown_action":
+            action = "unknown"
+        self.metrics.observe(action, outcome, seconds)
+        logging.info(
+            f"Handled {action}",
+            extra={
+                "action": action,
+                "status": outcome,
+                "duration_ms": round(seconds * 1000, 1),
+            },
+        )
+
+    def _gauges(self) -> dict:
+        gauges = {
+            "in_flight": self.in_flight,
+            "queued": max(0, len(self.tasks) - self.in_flight),
+        }
+        for lane in (self.control_lane, self.work_lane):
+            if lane:
+                gauges[f"{lane.name}_running"] = lane.running
+                gauges[f"{lane.name}_queued"] = lane.queued
+        if self.pool:
+            gauges["sessions"] = self.pool.size
+            gauges["sessions_idle"] = self.pool.available
+        if self.writer:
+            gauges["outbound_queued"] = self.writer.queue.qsize()
+        return gauges
+
+    def get_stats(self) -> dict:
+        """Request latencies, counters and current load, for the stats action."""
+        stats = self.metrics.snapshot(self._gauges())
+        stats["sdk"] = self.sdk_state
+        stats["turns"] = self.turn_latency.stats()
+        waits = stats.pop("lane_waits")
+        stats["lanes"] = {
+            lane.name: {**lane.stats(), "wait": waits.get(lane.name)}
+            for lane in (self.control_lane, self.work_lane)
+            if lane
+        }
+        if self.writer:
+            stats["outbound"] = self.writer.stats()
+        return stats
+
+    def _write_metrics(self):
+        try:
+            config_store.write_atomic(METRICS_FILE, self.metrics.render(self._gauges()))
+        except OSError as e:
+            logging.error(f"Failed to write metrics: {e}")
+
+    async def _export_metrics(self):
+        """Rewrites METRICS_FILE every metrics_export_seconds."""
+        while True:
+            await asyncio.sleep(self.metrics_export_seconds)
+            await asyncio.to_thread(self._write_metrics)
+
+    def _start_metrics_export(self):
+        if self.metrics_export_seconds > 0 and self.metrics_task is None:
+            self.metrics_task = asyncio.create_task(self._export_metrics())
+
+    def _stop_metrics_export(self):
+        if self.metrics_task:
+            self.metrics_task.cancel()
+            self.metrics_task = None
+            self._write_metrics()
+
+    def _lane_for(self, message):
+        if message.get("action") in WORK_ACTIONS:
+            return self.work_lane
+        return self.control_lane
+
+    async def _dispatch(self, message, send=None, received=None):
+        """Runs one request in its lane, under that lane's concurrency limit."""
+        request_id = message.get("requestId")
+        received = received or time.monotonic()
+        started = time.perf_counter()
+        handled = False
+        try:
+            lane = self._lane_for(message)
+            async with lane.slot():
+                if (
+                    lane is self.work_lane
+                    and time.monotonic() - received >= ANALYSIS_BUDGET_SECONDS
+                ):
+                    # The client has given up on it by now
+                    self._reject(message, send, "it waited out its time budget")
+                    return
+                self.in_flight += 1
+                handled = True
+                try:
+                    await self.process_message(message, send, received)
+                finally:
+                    self.in_flight -= 1
+        except lanes.LaneFull as e:
+            self._reject(message, send, str(e))
+        except asyncio.CancelledError:
+            if request_id not in self.cancel_requested:
+                raise
+            # Cancelled by the client: it still gets an answer
+            response = {
+                "requestId": request_id,
+                "status": "cancelled",
+                "message": "Request cancelled.",
+            }
+            (send or self.send_message)(response)
+            if not handled:
+                self._record_request(
+                    message.get("action"), response, time.perf_counter() - started
+                )
+
+    def _reject(self, message, send, reason):
+        """Answers a request its lane has no room for, without running it."""
+        action = message.get("action")
+        response = {
+            "requestId": message.get("requestId"),
+            "status": "error",
+            "error": "busy",
+            "message": f"Host is busy ({reason}). Try again shortly.",
+        }
+        logging.warning(f"Rejected {action}: {reason}")
+        (send or self.send_message)(response)
+        self._record_request(action, response, 0.0)
+
+    def dispatch(self, message, send=None):
+        """Schedules a request as its own task. Responses may arrive out of order."""
+        task = asyncio.create_task(self._dispatch(message, send, time.monotonic()))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+        request_id = message.get("requestId")
+        if request_id is not None:
+            self.requests[request_id] = task
+
+            def forget(task):
+                if self.requests.get(request_id) is task:
+                    del self.requests[request_id]
+                    self.cancel_requested.discard(request_id)
+
+            task.add_done_callback(forget)
+        return task
+
+    async def handle_cancel(self, payload):
+        """Cancels a running request; its Copilot turn is aborted."""
+        target = payload.get("requestId")
+        task = self.requests.get(target)
+        if task is None or task.done():
+            return {"cancelled": False, "message": f"No request {target} in progress."}
+
+        logging.info(f"Cancelling request {target}")
+        self.cancel_requested.add(target)
+        task.cancel()
+        # Reply once the session is back in the pool (or being replaced)
+        await asyncio.wait({task}, timeout=CANCEL_WAIT_SECONDS)
+        return {"cancelled": True}
+
+    def _init_loop_state(self):
+        """Creates the primitives that must belong to the running loop."""
         self.loop = asyncio.get_running_loop()
 
         # Use proactor loop on Windows for subprocess support if not already set
         # (Though usually asyncio.run handles this in Py 3.8+)
         logging.debug(f"Using proactor: {self.loop.__class__.__name__}")
 
-        await self.initialize_sdk()
-        self.start_input_thread()
+        self.control_lane = lanes.Lane(
+            "control",
+            CONTROL_CONCURRENCY,
+            on_wait=lambda seconds: self.metrics.observe_wait("control", seconds),
+        )
+        self.work_lane = lanes.Lane(
+            "work",
+            self.max_concurrency,
+            max_queued=self.max_queued_analyses,
+            on_wait=lambda seconds: self.metrics.observe_wait("work", seconds),
+        )
+        logging.info(
+            f"Max concurrent analyses: {self.max_concurrency} "
+            f"({self.max_queued_analyses} may queue)"
+        )
+
+        # Serializes session rebuilds (update_config and the config watcher)
+        self.refresh_lock = asyncio.Lock()
 
-        logging.info("Event loop running. Waiting for messages...")
+    def _stop_config_watch(self):
+        if self.config_watch_task:
+            self.config_watch_task.cancel()
+            self.config_watch_task = None
 
-        while self.running:
-            # Wait for next message from the input thread
-            message = await self.input_queue.get()
+    async def _cancel_tasks(self):
+        """Cancels outstanding request tasks and waits for them to unwind."""
+        for task in list(self.tasks):
+            task.cancel()
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
 
-            if message is None:
-                logging.info("Received exit signal.")
-                break
+    async def run(self):
+        """Main async loop."""
+        self._init_loop_state()
 
-            await self.process_message(message)
+        # Serve requests first; the SDK comes up in the background
+        reader_task = asyncio.create_task(self.read_stdin())
+        self._mark_startup("serving_ms")
+        self._start_metrics_export()
+        self.start_sdk_init()
+
+        logging.info("Event loop running. Waiting for messages...")
+        await reader_task
+
+        # Stdin is gone, so nobody is left to read the outstanding responses
+        await self._cancel_tasks()
+        self._shutdown_scrub_executor()
+        self.auth.stop()
+        self._stop_config_watch()
+        self._close_history()
+        self._stop_metrics_export()
+        if self.writer:
+            self.writer.close()
+
+    async def _serve_connection(self, reader, writer):
+        """Handles one shim connection to the resident daemon."""
+        self.connections += 1
+        logging.info(f"Shim connected. Active connections: {self.connections}")
+
+        def send(message):
+            # The shim may have exited while this request was running
+            if not writer.is_closing():
+                writer.writelines(self._encode_frames(message))
+
+        try:
+            while True:
+                message = await framing.read_frame(reader)
+                if message is None:
+                    break
+                self.last_activity = time.monotonic()
+                self.dispatch(message, send)
+        except Exception as e:
+            logging.error(f"Error on shim connection: {e}")
+        finally:
+            self.connections -= 1
+            self.last_activity = time.monotonic()
+            writer.close()
+            logging.info(f"Shim disconnected. Active connections: {self.connections}")
+
+    async def run_daemon(self):
+        """Resident mode: owns the SDK and serves shims until idle."""
+        self._init_loop_state()
+        address = resident.daemon_address(USER_DATA_DIR)
+
+        if await resident.is_daemon_running(address):
+            logging.info("Another resident host is already running. Exiting.")
+            return
+
+        server = await resident.start_server(address, self._serve_connection)
+        logging.info(
+            f"Resident host listening on {address} (idle timeout {self.idle_timeout}s)"
+        )
+        self._mark_startup("serving_ms")
+        self._start_metrics_export()
+        self.start_sdk_init()
+        self.last_activity = time.monotonic()
+
+        try:
+            while True:
+                await asyncio.sleep(min(self.idle_timeout, 5.0))
+                busy = self.connections or self.tasks
+                idle_for = time.monotonic() - self.last_activity
+                if not busy and idle_for >= self.idle_timeout:
+                    logging.info(f"Idle for {idle_for:.0f}s. Shutting down daemon.")
+                    break
+        finally:
+            server.close()
+            resident.remove_endpoint(address)
+            await self._cancel_tasks()
+            self._shutdown_scrub_executor()
+            self.auth.stop()
+            self._stop_config_watch()
+            self._close_history()
+            self._stop_metrics_export()
+            if self.client:
+                try:
+                    await self.client.stop()
+                except Exception as e:
+                    logging.error(f"Error stopping Copilot client: {e}")
+
+
+def main():
+    script_path = os.path.abspath(__file__)
+
+    if "--daemon" in sys.argv:
+        asyncio.run(NativeHost().run_daemon())
+    elif load_host_settings().get("resident", False):
+        # Thin shim: the daemon pays the Copilot startup cost once
+        asyncio.run(
+            resident.run_shim(resident.daemon_address(USER_DATA_DIR), script_path)
+        )
+    else:
+        # Standard entry point for asyncio
+        asyncio.run(NativeHost().run())
 
 
 if __name__ == "__main__":
-    host = NativeHost()
+    if getattr(sys, "frozen", False):
+        # Lets the frozen executable act as a scrub_processes worker
+        import multiprocessing
+
+        multiprocessing.freeze_support()
+
     try:
-        # Standard entry point for asyncio
-        asyncio.run(host.run())
+        main()
     except KeyboardInterrupt:
         pass
     except Exception as e:
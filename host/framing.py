@@ -0,0 +1,205 @@
+"""
+Native Messaging framing helpers.
+
+Every frame is a 4-byte length in native byte order followed by that many
+bytes of UTF-8 JSON. The same framing is used on stdio (browser <-> host)
+and on the resident daemon socket (shim <-> daemon).
+
+Chrome drops host -> browser messages larger than 1 MB. A response over that
+limit is sent as a run of "chunk" frames, each carrying a slice of the
+serialized response, when the request opted in; ChunkAssembler puts it back
+together. Otherwise a short response_too_large error is sent in its place.
+"""
+
+import asyncio
+import json
+import logging
+import struct
+import zlib
+
+HEADER = struct.Struct("@I")
+
+# Chrome's limit for a single message from the host
+MAX_MESSAGE_BYTES = 1024 * 1024
+
+# Chrome's limit for a single message to the host
+MAX_INBOUND_BYTES = 64 * 1024 * 1024
+
+# Bytes requested per read when frames are decoded incrementally
+READ_CHUNK_BYTES = 64 * 1024
+
+# Slice of the serialized response per chunk frame. The body is ASCII JSON,
+# so escaping it again as a string at most doubles it: a chunk frame stays
+# well under MAX_MESSAGE_BYTES.
+CHUNK_BYTES = 256 * 1024
+
+
+def encode_frame(message) -> bytes:
+    """Serializes a message into a single length-prefixed buffer."""
+    body = json.dumps(message).encode("utf-8")
+    return HEADER.pack(len(body)) + body
+
+
+def encode_frames(message, chunked=False, limit=MAX_MESSAGE_BYTES):
+    """
+    Serializes a message into frames that each fit the browser's limit.
+    Small messages give a single frame. Larger ones give chunk frames if
+    `chunked`, else one response_too_large error frame. Chunk frames come as
+    a generator that builds each frame when it is consumed, so only the
+    serialized body and one frame are in memory at a time.
+    """
+    body = json.dumps(message).encode("utf-8")
+    if len(body) <= limit:
+        return [HEADER.pack(len(body)) + body]
+
+    request_id = message.get("requestId")
+    if not chunked:
+        return [
+            encode_frame(
+                {
+                    "requestId": request_id,
+                    "status": "error",
+                    "error": "response_too_large",
+                    "message": f"The response ({len(body)} bytes) exceeds the "
+                    f"{limit // 1024} KB native messaging limit. Send "
+                    '"chunked": true in the payload to receive it in parts.',
+                }
+            )
+        ]
+    total = (len(body) + CHUNK_BYTES - 1) // CHUNK_BYTES
+    logging.info(f"Response of {len(body)} bytes split into {total} chunks.")
+    return iter_chunk_frames(request_id, body)
+
+
+def iter_chunk_frames(request_id, body: bytes, chunk_bytes=CHUNK_BYTES):
+    """Yields the chunk frames for a serialized (ASCII JSON) response."""
+    total = (len(body) + chunk_bytes - 1) // chunk_bytes
+    view = memoryview(body)
+    for index in range(total):
+        piece = view[index * chunk_bytes : (index + 1) * chunk_bytes]
+        yield encode_frame(
+            {
+                "requestId": request_id,
+                "status": "success",
+                "type": "chunk",
+                "index": index,
+                "total": total,
+                "checksum": zlib.crc32(piece),
+                "data": piece.tobytes().decode("ascii"),
+            }
+        )
+
+
+class ChunkAssembler:
+    """
+    Client side of the chunked mode. Feed it every message received:
+    add() returns non-chunk messages unchanged, None for a chunk that is not
+    the last, and the reassembled response once all chunks of a request are
+    in. Chunks must arrive in order; a gap or a bad checksum drops the
+    partial response and raises ValueError.
+    """
+
+    def __init__(self):
+        self.pending = {}
+
+    def add(self, message):
+        if message.get("type") != "chunk":
+            return message
+
+        request_id = message.get("requestId")
+        parts = self.pending.setdefault(request_id, [])
+        data = message["data"]
+        if message["index"] != len(parts):
+            del self.pending[request_id]
+            raise ValueError(
+                f"Chunk {message['index']} of {request_id} arrived out of order"
+            )
+        if zlib.crc32(data.encode("ascii")) != message["checksum"]:
+            del self.pending[request_id]
+            raise ValueError(f"Chunk {message['index']} of {request_id} is corrupt")
+
+        parts.append(data)
+        if len(parts) < message["total"]:
+            return None
+        del self.pending[request_id]
+        return json.loads("".join(parts))
+
+
+async def read_frame(
+    reader: asyncio.StreamReader, max_frame_bytes=MAX_INBOUND_BYTES
+):
+    """
+    Reads one frame from an asyncio stream.
+    Returns the decoded message, or None when the stream is closed.
+    Zero-length frames carry nothing and are skipped; frames that are not
+    valid JSON are logged and skipped too. A length over `max_frame_bytes`
+    raises ValueError before any of the body is read, as in FrameDecoder.
+    """
+    while True:
+        try:
+            header = await reader.readexactly(HEADER.size)
+            (length,) = HEADER.unpack(header)
+            if length > max_frame_bytes:
+                raise ValueError(f"Frame of {length} bytes exceeds the limit")
+            body = await reader.readexactly(length)
+        except asyncio.IncompleteReadError:
+            return None
+
+        if body:
+            try:
+                return json.loads(body)
+            except ValueError as e:
+                logging.error(f"Dropping malformed frame: {e}")
+
+
+async def connect_stdin(stream) -> asyncio.StreamReader:
+    """
+    Wraps a binary pipe (sys.stdin.buffer) in a StreamReader on the running
+    loop. Raises if the loop cannot watch it (e.g. a regular file, or the
+    Windows proactor, which cannot register non-overlapped pipes).
+    """
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=READ_CHUNK_BYTES, loop=loop)
+    await loop.connect_read_pipe(
+        lambda: asyncio.StreamReaderProtocol(reader, loop=loop), stream
+    )
+    return reader
+
+
+class FrameDecoder:
+    """
+    Incremental decoder for callers that read raw bytes themselves. feed()
+    takes whatever a read returned, however it splits frames, and returns
+    the messages completed by it. Zero-length frames are skipped and frames
+    that are not valid JSON are logged and dropped.
+    """
+
+    def __init__(self, max_frame_bytes=MAX_INBOUND_BYTES):
+        self.max_frame_bytes = max_frame_bytes
+        self.buffer = bytearray()
+
+    @property
+    def pending(self) -> int:
+        """Bytes of an incomplete frame held back."""
+        return len(self.buffer)
+
+    def feed(self, data) -> list:
+        buffer = self.buffer
+        buffer += data
+        messages = []
+        offset = 0
+        while len(buffer) - offset >= HEADER.size:
+            (length,) = HEADER.unpack_from(buffer, offset)
+            if length > self.max_frame_bytes:
+                raise ValueError(f"Frame of {length} bytes exceeds the limit")
+            end = offset + HEADER.size + length
+            if len(buffer) < end:
+                break
+            if length:
+                try:
+                    messages.append(json.loads(buffer[offset + HEADER.size : end]))
+                except ValueError as e:
+                    logging.error(f"Dropping malformed frame: {e}")
+            offset = end
+        del buffer[:offset]
+        return messages
@@ -0,0 +1,243 @@
+"""
+Append-only history of analyses.
+
+Every analysis is stored in a SQLite database in the user data directory,
+with an FTS5 index over the prompt and the response, so past answers can be
+searched in milliseconds. Only scrubbed text is stored: the prompt as sent
+to Copilot and the response before tokens are rehydrated, so no raw PII
+reaches the disk. Old entries are dropped by age and by total size.
+
+The store is synchronous and thread-safe; the host calls it from a worker
+thread.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_MAX_AGE_DAYS = 90
+DEFAULT_MAX_BYTES = 100 * 1024 * 1024
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 200
+PRUNE_BATCH = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    id INTEGER PRIMARY KEY,
+    created REAL NOT NULL,
+    context TEXT NOT NULL DEFAULT '',
+    prompt TEXT NOT NULL,
+    response TEXT NOT NULL,
+    cached INTEGER NOT NULL DEFAULT 0,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS analyses_created ON analyses(created);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS analyses_fts USING fts5(
+    prompt, response, content='analyses', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS analyses_ai AFTER INSERT ON analyses BEGIN
+    INSERT INTO analyses_fts(rowid, prompt, response)
+    VALUES (new.id, new.prompt, new.response);
+END;
+CREATE TRIGGER IF NOT EXISTS analyses_ad AFTER DELETE ON analyses BEGIN
+    INSERT INTO analyses_fts(analyses_fts, rowid, prompt, response)
+    VALUES ('delete', old.id, old.prompt, old.response);
+END;
+"""
+
+
+def fts_query(query: str) -> str:
+    """
+    Turns free text into an FTS5 query: every word must appear, the last one
+    may be a prefix (search as you type). Quoting keeps punctuation such as
+    "0x80040216" or "Microsoft.Crm" from being read as query syntax.
+    """
+    terms = ['"' + term.replace('"', '""') + '"' for term in query.split()]
+    if terms:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+class HistoryStore:
+    def __init__(
+        self,
+        path: str,
+        max_age_days: float = DEFAULT_MAX_AGE_DAYS,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        export_dir: str = None,
+    ):
+        """
+        Args:
+            path: SQLite database file.
+            max_age_days: Entries older than this are dropped.
+            max_bytes: Oldest entries are dropped while the stored text is
+                larger than this.
+            export_dir: If set, each analysis is also written there as
+                <id>.md.
+        """
+        self.path = path
+        self.max_age_seconds = max_age_days * 24 * 3600
+        self.max_bytes = max_bytes
+        self.export_dir = export_dir
+        self.lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if export_dir:
+            os.makedirs(export_dir, exist_ok=True)
+
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+        try:
+            self.db.executescript(FTS_SCHEMA)
+            self.fts = True
+        except sqlite3.OperationalError as e:
+            # Python builds without FTS5 fall back to a slower LIKE scan
+            logging.warning(f"SQLite FTS5 unavailable, search is unindexed: {e}")
+            self.fts = False
+
+        self.total_bytes = self.db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM analyses"
+        ).fetchone()[0]
+        self.prune()
+
+    def add(self, prompt: str, response: str, context: str = "", cached=False) -> int:
+        """Stores one analysis. Returns its id."""
+        size = len(prompt.encode("utf-8")) + len(response.encode("utf-8"))
+        size += len(context.encode("utf-8"))
+        created = time.time()
+
+        with self.lock, self.db:
+            cursor = self.db.execute(
+                "INSERT INTO analyses (created, context, prompt, response, cached, size)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (created, context, prompt, response, int(bool(cached)), size),
+            )
+            analysis_id = cursor.lastrowid
+            self.total_bytes += size
+
+        if self.export_dir:
+            self._export(analysis_id, created, context, prompt, response)
+
+        if self.total_bytes > self.max_bytes:
+            self.prune()
+        return analysis_id
+
+    def get(self, analysis_id: int):
+        """Returns one analysis as a dict, or None."""
+        with self.lock:
+            row = self.db.execute(
+                "SELECT id, created, context, prompt, response, cached"
+                " FROM analyses WHERE id = ?",
+                (analysis_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        record = dict(row)
+        record["cached"] = bool(record["cached"])
+        return record
+
+    def search(self, query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> list:
+        """
+        List of {id, created, context, snippet} for analyses matching every
+        word of `query`, newest first. An empty query lists the most recent
+        analyses. Ranking by relevance would score every match before the
+        LIMIT applies; walking the index newest first stops after `limit`.
+        """
+        limit = max(1, min(int(limit), MAX_SEARCH_LIMIT))
+        query = (query or "").strip()
+
+        with self.lock:
+            if not query:
+                rows = self.db.execute(
+                    "SELECT id, created, context, substr(response, 1, 200) AS snippet"
+                    " FROM analyses ORDER BY id DESC LIMIT ?",
+                    (limit,),
+                ).fetchall()
+            elif self.fts:
+                rows = self.db.execute(
+                    "SELECT a.id, a.created, a.context, m.snippet FROM ("
+                    " SELECT rowid,"
+                    " snippet(analyses_fts, -1, '**', '**', '...', 16) AS snippet"
+                    " FROM analyses_fts WHERE analyses_fts MATCH ?"
+                    " ORDER BY rowid DESC LIMIT ?"
+                    ") m JOIN analyses a ON a.id = m.rowid ORDER BY a.id DESC",
+                    (fts_query(query), limit),
+                ).fetchall()
+            else:
+                pattern = f"%{query}%"
+                rows = self.db.execute(
+                    "SELECT id, created, context, substr(response, 1, 200) AS snippet"
+                    " FROM analyses WHERE prompt LIKE ? OR response LIKE ?"
+                    " ORDER BY id DESC LIMIT ?",
+                    (pattern, pattern, limit),
+                ).fetchall()
+
+        return [dict(row) for row in rows]
+
+    def prune(self):
+        """Drops entries past the age limit, then the oldest while over the size limit."""
+        removed = []
+        with self.lock, self.db:
+            cutoff = time.time() - self.max_age_seconds
+            rows = self.db.execute(
+                "SELECT id, size FROM analyses WHERE created < ?", (cutoff,)
+            ).fetchall()
+            removed.extend(rows)
+            self.db.execute("DELETE FROM analyses WHERE created < ?", (cutoff,))
+            self.total_bytes -= sum(row["size"] for row in rows)
+
+            while self.total_bytes > self.max_bytes:
+                rows = self.db.execute(
+                    "SELECT id, size FROM analyses ORDER BY id LIMIT ?",
+                    (PRUNE_BATCH,),
+                ).fetchall()
+                if not rows:
+                    self.total_bytes = 0
+                    break
+                for row in rows:
+                    if self.total_bytes <= self.max_bytes:
+                        break
+                    self.db.execute("DELETE FROM analyses WHERE id = ?", (row["id"],))
+                    self.total_bytes -= row["size"]
+                    removed.append(row)
+
+        if removed:
+            logging.info(f"Pruned {len(removed)} history entries.")
+            if self.export_dir:
+                for row in removed:
+                    self._remove_export(row["id"])
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+    def _export_path(self, analysis_id: int) -> str:
+        return os.path.join(self.export_dir, f"{analysis_id}.md")
+
+    def _export(self, analysis_id, created, context, prompt, response):
+        timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(created))
+        try:
+            with open(self._export_path(analysis_id), "w", encoding="utf-8") as f:
+                f.write("# Dynamics Helper - Error Analysis\n\n")
+                f.write(f"**Timestamp:** {timestamp}\n\n")
+                f.write(f"## Original Error (scrubbed)\n{prompt}\n\n")
+                if context:
+                    f.write(f"## Context\n{context}\n\n")
+                f.write(f"## AI Explanation\n{response}\n")
+        except OSError as e:
+            logging.error(f"Failed to export analysis {analysis_id}: {e}")
+
+    def _remove_export(self, analysis_id: int):
+        try:
+            os.remove(self._export_path(analysis_id))
+        except OSError:
+            pass
@@ -0,0 +1,167 @@
+"""
+Logging setup for the host.
+
+Log calls only put the record on a queue; a QueueListener thread writes it,
+so the event loop never waits on the disk. The file rotates by size and
+holds one JSON object per line. Each record carries the requestId of the
+request that logged it, taken from a context variable so handlers don't
+pass it around, plus any of EXTRA_FIELDS given through `extra=`.
+
+Message bodies go through Payload, which serializes nothing unless the
+record is actually emitted.
+"""
+
+import atexit
+import contextvars
+import datetime
+import json
+import logging
+import logging.handlers
+import queue
+
+DEFAULT_LEVEL = "INFO"
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 3
+
+# Longest payload dump written to the log
+MAX_PAYLOAD_CHARS = 4096
+
+EXTRA_FIELDS = ("action", "status", "duration_ms", "stages")
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+
+class Payload:
+    """
+    Lazy log argument for a message body (JSON-like, UTF-8 bytes or
+    anything printable):
+
+        logging.debug("Sending message: %s", Payload(message))
+
+    The body is serialized and clipped only when the record is formatted.
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        value = self.value
+        if isinstance(value, bytes):
+            text = value[: MAX_PAYLOAD_CHARS * 4].decode("utf-8", "replace")
+            size = f"{len(value)} bytes"
+        elif isinstance(value, (dict, list)):
+            text = json.dumps(value, default=str)
+            size = f"{len(text)} chars"
+        else:
+            text = str(value)
+            size = f"{len(text)} chars"
+        if len(text) > MAX_PAYLOAD_CHARS:
+            text = f"{text[:MAX_PAYLOAD_CHARS]}... ({size})"
+        return text
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamps records with the requestId of the request being handled."""
+
+    def filter(self, record):
+        if getattr(record, "requestId", None) is None:
+            record.requestId = request_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: ts, level, msg, requestId and extras."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "requestId", None) is not None:
+            entry["requestId"] = record.requestId
+        for field in EXTRA_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class StructuredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Merges the message arguments on the calling thread (they may not be
+    thread-safe) but keeps the traceback apart from the message, so the
+    listener can write it as its own field.
+    """
+
+    def prepare(self, record):
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class LogListener(logging.handlers.QueueListener):
+    """QueueListener whose stop() may be called more than once."""
+
+    def stop(self):
+        if self._thread is not None:
+            super().stop()
+            for handler in self.handlers:
+                handler.close()
+
+
+def parse_level(level) -> int:
+    """Level name or number; unknown values fall back to DEFAULT_LEVEL."""
+    if isinstance(level, int):
+        return level
+    value = logging.getLevelName(str(level or DEFAULT_LEVEL).upper())
+    return value if isinstance(value, int) else logging.getLevelName(DEFAULT_LEVEL)
+
+
+def configure(
+    path: str,
+    level=DEFAULT_LEVEL,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    backup_count: int = DEFAULT_BACKUP_COUNT,
+):
+    """
+    Routes the root logger through a queue to a rotating JSON-lines file.
+    Replaces any handlers already installed. Returns the started listener,
+    which is also stopped (flushing the queue) at exit.
+    """
+    file_handler = logging.handlers.RotatingFileHandler(
+        path,
+        maxBytes=max_bytes,
+        backupCount=backup_count,
+        encoding="utf-8",
+        delay=True,
+    )
+    file_handler.setFormatter(JsonFormatter())
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = StructuredQueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    root.addHandler(queue_handler)
+    root.setLevel(parse_level(level))
+
+    listener = LogListener(log_queue, file_handler)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,78 @@
+"""
+Priority lanes for request dispatch.
+
+Requests used to share one concurrency limit, so a few slow analyses could
+hold every slot while the FAB's liveness ping waited behind them. Each lane
+now has its own limit and its own waiters: control messages (ping,
+health_check, update_config...) never queue behind analyses, and the
+analysis lane is bounded so a burst is refused up front instead of piling
+up past the browser's timeout.
+
+    async with lane.slot():
+        await handle(message)
+"""
+
+import asyncio
+import contextlib
+import time
+
+
+class LaneFull(Exception):
+    """Raised instead of queuing when a lane's wait queue is at its bound."""
+
+
+class Lane:
+    def __init__(self, name, concurrency, max_queued=None, on_wait=None):
+        """
+        Args:
+            name: Label used in stats and metrics.
+            concurrency: Requests allowed to run at once.
+            max_queued: Requests allowed to wait for a slot (None = unbounded).
+            on_wait: Called with the seconds each request waited for its slot.
+        """
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queued = max_queued
+        self.on_wait = on_wait
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.running = 0
+        self.queued = 0
+        self.rejected = 0
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        """Holds one of the lane's slots, waiting for it if they are all taken."""
+        if (
+            self.max_queued is not None
+            and self.semaphore.locked()
+            and self.queued >= self.max_queued
+        ):
+            self.rejected += 1
+            raise LaneFull(
+                f"{self.queued} {self.name} requests are already waiting"
+            )
+
+        started = time.monotonic()
+        self.queued += 1
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.queued -= 1
+        if self.on_wait:
+            self.on_wait(time.monotonic() - started)
+
+        self.running += 1
+        try:
+            yield
+        finally:
+            self.running -= 1
+            self.semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "running": self.running,
+            "queued": self.queued,
+            "max_queued": self.max_queued,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,74 @@
+"""
+Observed Copilot turn latency.
+
+Keeps the durations of the most recent send_and_wait calls and derives from
+them the per-turn timeout and the delay after which a hedged duplicate is
+worth sending. Until enough turns have been seen, the fixed ceiling applies
+and nothing is hedged. Turns that time out count at their timeout, and
+hedged turns that lose at the time they were cancelled: both took at least
+that long, and leaving them out would bias the percentiles down.
+
+The ceiling is the backend's half of the frontend contract: FAB.tsx gives up
+after 310 seconds, so a turn must end (or fail with a useful message) within
+300.
+"""
+
+import bisect
+import collections
+
+MAX_TIMEOUT_SECONDS = 300.0
+DEFAULT_MIN_TIMEOUT_SECONDS = 60.0
+DEFAULT_WINDOW = 200
+MIN_SAMPLES = 20
+
+# Timeout = this many times the observed p99, within [minimum, ceiling]
+TIMEOUT_MULTIPLIER = 3.0
+
+
+class LatencyTracker:
+    def __init__(
+        self,
+        window: int = DEFAULT_WINDOW,
+        min_samples: int = MIN_SAMPLES,
+        min_timeout: float = DEFAULT_MIN_TIMEOUT_SECONDS,
+        max_timeout: float = MAX_TIMEOUT_SECONDS,
+    ):
+        self.samples = collections.deque(maxlen=window)
+        self.sorted = []
+        self.min_samples = min_samples
+        self.min_timeout = min(min_timeout, max_timeout)
+        self.max_timeout = max_timeout
+
+    def observe(self, seconds: float):
+        if len(self.samples) == self.samples.maxlen:
+            del self.sorted[bisect.bisect_left(self.sorted, self.samples[0])]
+        self.samples.append(seconds)
+        bisect.insort(self.sorted, seconds)
+
+    @property
+    def ready(self) -> bool:
+        return len(self.sorted) >= self.min_samples
+
+    def quantile(self, q: float):
+        """Observed quantile in seconds, or None until enough turns are seen."""
+        if not self.ready:
+            return None
+        return self.sorted[min(len(self.sorted) - 1, int(q * len(self.sorted)))]
+
+    def timeout(self) -> float:
+        """Per-turn timeout: a multiple of the observed p99, capped at the ceiling."""
+        p99 = self.quantile(0.99)
+        if p99 is None:
+            return self.max_timeout
+        return min(self.max_timeout, max(self.min_timeout, p99 * TIMEOUT_MULTIPLIER))
+
+    def hedge_delay(self):
+        """Time after which a turn is slower than usual (p95), or None."""
+        return self.quantile(0.95)
+
+    def stats(self) -> dict:
+        stats = {"samples": len(self.sorted), "timeout_seconds": self.timeout()}
+        if self.ready:
+            for name, q in (("p50_ms", 0.50), ("p95_ms", 0.95), ("p99_ms", 0.99)):
+                stats[name] = round(self.quantile(q) * 1000, 2)
+        return stats
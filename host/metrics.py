@@ -0,0 +1,169 @@
+"""
+Runtime metrics for the host.
+
+Per-action request counters and latency histograms, per-lane queue wait
+histograms, plus named counters (timeouts, scrubbed characters, cache
+hits...). Recording a request is a
+bisect and a few integer increments, so it can stay on the hot path.
+
+The same numbers are served by the `stats` action and written to a text
+file in the Prometheus exposition format that the node-exporter textfile
+collector reads (`--collector.textfile.directory`).
+"""
+
+import bisect
+import time
+
+# Latency bucket upper bounds, in seconds (the last bucket is +Inf)
+BUCKETS = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0,
+)
+
+DEFAULT_EXPORT_SECONDS = 60.0
+PREFIX = "dynamics_helper"
+
+
+class Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Estimate in seconds, interpolated inside the bucket it falls in."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = BUCKETS[index - 1] if index else 0.0
+                upper = BUCKETS[index] if index < len(BUCKETS) else BUCKETS[-1]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return BUCKETS[-1]
+
+
+class Metrics:
+    def __init__(self):
+        self.started = time.time()
+        self.requests = {}  # (action, outcome) -> count
+        self.latency = {}  # action -> Histogram
+        self.waits = {}  # dispatch lane -> Histogram
+        self.counters = {}
+
+    def observe(self, action, outcome: str, seconds: float):
+        """Records one finished request."""
+        key = (action, outcome)
+        self.requests[key] = self.requests.get(key, 0) + 1
+        histogram = self.latency.get(action)
+        if histogram is None:
+            histogram = self.latency[action] = Histogram()
+        histogram.observe(seconds)
+
+    def observe_wait(self, lane: str, seconds: float):
+        """Records how long a request waited for a slot in its dispatch lane."""
+        histogram = self.waits.get(lane)
+        if histogram is None:
+            histogram = self.waits[lane] = Histogram()
+        histogram.observe(seconds)
+
+    def inc(self, name: str, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def snapshot(self, gauges=None) -> dict:
+        """Summary for the stats action. `gauges` are current values (in flight...)."""
+        actions = {}
+        for action, histogram in self.latency.items():
+            actions[str(action)] = {
+                "count": histogram.count,
+                "errors": self.requests.get((action, "error"), 0),
+                **_summary(histogram),
+            }
+        return {
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "requests": actions,
+            "lane_waits": {
+                lane: {"count": histogram.count, **_summary(histogram)}
+                for lane, histogram in self.waits.items()
+            },
+            "counters": dict(self.counters),
+            "gauges": dict(gauges or {}),
+        }
+
+    def render(self, gauges=None) -> str:
+        """Prometheus text exposition of every metric."""
+        lines = [
+            f"# HELP {PREFIX}_requests_total Requests handled, by action and outcome.",
+            f"# TYPE {PREFIX}_requests_total counter",
+        ]
+        for (action, outcome), count in sorted(
+            self.requests.items(), key=lambda item: str(item[0])
+        ):
+            lines.append(
+                f"{PREFIX}_requests_total"
+                f'{{action="{_label(action)}",outcome="{outcome}"}} {count}'
+            )
+
+        _render_histograms(
+            lines,
+            f"{PREFIX}_request_duration_seconds",
+            "Time from receiving a request to queuing its response.",
+            "action",
+            self.latency,
+        )
+        _render_histograms(
+            lines,
+            f"{PREFIX}_lane_wait_seconds",
+            "Time a request waited for a slot in its dispatch lane.",
+            "lane",
+            self.waits,
+        )
+
+        for counter, value in sorted(self.counters.items()):
+            lines += [
+                f"# TYPE {PREFIX}_{counter}_total counter",
+                f"{PREFIX}_{counter}_total {value}",
+            ]
+        for gauge, value in sorted((gauges or {}).items()):
+            lines += [f"# TYPE {PREFIX}_{gauge} gauge", f"{PREFIX}_{gauge} {value}"]
+
+        lines += [
+            f"# TYPE {PREFIX}_start_time_seconds gauge",
+            f"{PREFIX}_start_time_seconds {self.started:.3f}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+def _summary(histogram) -> dict:
+    return {
+        "mean_ms": round(histogram.total * 1000 / histogram.count, 2),
+        "p50_ms": round(histogram.quantile(0.50) * 1000, 2),
+        "p95_ms": round(histogram.quantile(0.95) * 1000, 2),
+        "p99_ms": round(histogram.quantile(0.99) * 1000, 2),
+    }
+
+
+def _render_histograms(lines, name, help_text, label_name, histograms):
+    lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for key, histogram in sorted(histograms.items(), key=lambda item: str(item[0])):
+        label = f'{label_name}="{_label(key)}"'
+        cumulative = 0
+        for bound, count in zip(BUCKETS + (float("inf"),), histogram.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f'{name}_bucket{{{label},le="{le}"}} {cumulative}')
+        lines.append(f"{name}_sum{{{label}}} {histogram.total:.6f}")
+        lines.append(f"{name}_count{{{label}}} {histogram.count}")
+
+
+def _label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
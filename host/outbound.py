@@ -0,0 +1,124 @@
+"""
+Outbound frame writer for stdout.
+
+Handlers hand finished frames to a queue and return at once; a single
+writer thread drains it. Frames therefore reach the browser whole and in
+the order they were queued, and a browser that is slow to read only backs
+up the queue instead of blocking the event loop. The chunk frames of a large
+response are queued as one lazy iterable and built on the writer thread as
+they are written, so they never all sit in memory at once.
+"""
+
+import logging
+import queue
+import threading
+import time
+
+# A single write slower than this means the browser is not keeping up
+SLOW_WRITE_SECONDS = 1.0
+
+_CLOSE = object()
+
+
+class FrameWriter:
+    def __init__(self, stream):
+        """
+        Args:
+            stream: Binary stream frames are written to (sys.stdout.buffer).
+        """
+        self.stream = stream
+        self.queue = queue.SimpleQueue()
+        self.closed = False
+        self.thread = None
+
+        # Write statistics, updated by the writer thread only
+        self.frames = 0
+        self.bytes = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.write_seconds = 0.0
+        self.max_write_seconds = 0.0
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(
+                target=self._run, name="frame-writer", daemon=True
+            )
+            self.thread.start()
+
+    def put(self, frame: bytes):
+        """Queues one encoded frame (header and body in a single buffer)."""
+        if self.closed:
+            self.dropped += 1
+            return
+        self.queue.put(frame)
+        depth = self.queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    def put_frames(self, frames):
+        """
+        Queues the frames of one message. A generator is consumed on the
+        writer thread, one frame at a time, and its frames stay together.
+        """
+        if isinstance(frames, list) and len(frames) == 1:
+            self.put(frames[0])
+        else:
+            self.put(frames)
+
+    def close(self, timeout: float = 5.0):
+        """Writes what is already queued, then stops the writer thread."""
+        if self.thread is None or self.closed:
+            self.closed = True
+            return
+        self.closed = True
+        self.queue.put(_CLOSE)
+        self.thread.join(timeout)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queue.qsize(),
+            "max_queued": self.max_depth,
+            "frames": self.frames,
+            "bytes": self.bytes,
+            "dropped": self.dropped,
+            "avg_write_ms": round(
+                self.write_seconds * 1000 / self.frames if self.frames else 0.0, 3
+            ),
+            "max_write_ms": round(self.max_write_seconds * 1000, 3),
+        }
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is _CLOSE:
+                return
+            for frame in (item,) if isinstance(item, bytes) else item:
+                if not self._write(frame):
+                    return
+
+    def _write(self, frame) -> bool:
+        """Writes one frame. False once the stream is gone."""
+        started = time.perf_counter()
+        try:
+            self.stream.write(frame)
+            self.stream.flush()
+        except Exception as e:
+            # The browser closed the pipe; nothing more can be delivered
+            logging.error(f"Error sending message: {e}")
+            self.closed = True
+            self.dropped += 1 + self.queue.qsize()
+            return False
+
+        elapsed = time.perf_counter() - started
+        self.frames += 1
+        self.bytes += len(frame)
+        self.write_seconds += elapsed
+        if elapsed > self.max_write_seconds:
+            self.max_write_seconds = elapsed
+        if elapsed > SLOW_WRITE_SECONDS:
+            logging.warning(
+                f"Writing a {len(frame)} byte frame took {elapsed:.1f}s "
+                f"({self.queue.qsize()} queued)"
+            )
+        return True
@@ -1,5 +1,58 @@
+import collections
 import re
 
+WORD_CHAR = re.compile(r"\w")
+
+# Characters allowed in the local part of an email address
+EMAIL_LOCAL_CHARS = "a-zA-Z0-9.!#$%&'*+/=?^_`{|}~-"
+EMAIL_LOCAL_CHAR_SET = frozenset(
+    "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789.!#$%&'*+/=?^_`{|}~-"
+)
+EMAIL_DOMAIN = r"[a-zA-Z0-9](?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?(?:\.[a-zA-Z0-9](?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?)*"
+
+# Detectors in priority order with their placeholders. When two detections
+# overlap, the one listed first wins (matching the original four-pass order).
+DETECTORS = (
+    ("guid", "[REDACTED_GUID]"),
+    ("email", "[REDACTED_EMAIL]"),
+    ("ip", "[REDACTED_IP]"),
+    ("phone", "[REDACTED_PHONE]"),
+)
+
+# Prefilter triggers: every match of a detector contains a substring matched
+# by at least one of its triggers, so a detector whose triggers are all absent
+# cannot match. Each trigger starts with a literal, which lets the regex
+# engine jump between candidates instead of testing every position.
+#   guid:  8-4-4-4-12 hex groups contain "-XXXX-"
+#   email: always contains "@"
+#   ip:    four dotted octets contain ".N." (1-3 digits)
+#   phone: "(123)" or a "-"/"." separator followed by 3 digits and another
+#          separator, e.g. the "-456-" in 123-456-7890
+TRIGGERS = {
+    "guid": (r"-[0-9a-fA-F]{4}-",),
+    "email": (r"@",),
+    "ip": (r"\.[0-9]{1,3}\.",),
+    "phone": (r"\(\d{3}\)", r"-\s*\d{3}\s*[-.]", r"\.\s*\d{3}\s*[-.]"),
+}
+
+# Streaming (scrub_iter / scrub_stream)
+DEFAULT_CHUNK_SIZE = 64 * 1024
+DEFAULT_MAX_CHUNK_SIZE = 1024 * 1024
+DEFAULT_MAX_IN_FLIGHT = 8
+
+# Places where text can be cut into independently scrubbed chunks. No
+# detection can span them and no detector's lookarounds can tell the
+# difference between the neighbouring character and the start/end of a chunk:
+#   - right after a character no detector uses (",", ":", ";", quotes, ...)
+#   - right after whitespace that a phone number cannot span: a phone only
+#     has whitespace between a digit, ")", "-" or "." on the left and a digit,
+#     "(", "-" or "." on the right
+SAFE_CUT = re.compile(
+    r"[^\w\s.!#$%&'*+/=?^`{|}~@()\-]"
+    r"|(?<![\d).\s-])\s+(?=\S)"
+    r"|\s+(?=[^\d(.\s-])"
+)
+
 
 class PiiScrubber:
     """
@@ -12,9 +65,7 @@ class PiiScrubber:
         # Using verbose mode (re.VERBOSE) for readability where appropriate
 
         # Email: Standard implementation adapted for finding substrings (no anchors)
-        self.email_pattern = re.compile(
-            r"[a-zA-Z0-9.!#$%&'*+/=?^_`{|}~-]+@[a-zA-Z0-9](?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?(?:\.[a-zA-Z0-9](?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?)*"
-        )
+        self.email_pattern = re.compile(rf"[{EMAIL_LOCAL_CHARS}]+@{EMAIL_DOMAIN}")
 
         # IPv4: \b ensures we don't match random numbers in version strings easily
         # 0-255 logic is preserved.
@@ -71,13 +122,341 @@ class PiiScrubber:
             r"(?!\d)"  # Negative lookahead: Ensure it doesn't continue with more digits
         )
 
-    def scrub(self, text: str) -> str:
+        # Single-pass engine: all detectors as one alternation with named groups,
+        # in DETECTORS order, so at any position the highest priority wins.
+        # Texts that can only contain some detectors get a smaller pattern
+        # (see active_detectors), compiled once per combination.
+        self.placeholders = dict(DETECTORS)
+        self.triggers = {
+            name: tuple(re.compile(trigger) for trigger in triggers)
+            for name, triggers in TRIGGERS.items()
+        }
+        self.combined_patterns = {}
+        self.combined_pattern = self._combined_pattern(tuple(self.placeholders))
+
+        # Anchored check for a higher-priority detection inside a phone match
+        self.guid_email_or_ip_pattern = re.compile(
+            f"{self.guid_pattern.pattern}"
+            f"|{self.email_pattern.pattern}"
+            f"|{self.ip_pattern.pattern}"
+        )
+
+    def scrub(self, text: str, vault=None) -> str:
+        """
+        Replaces detected PII in the given text with placeholders, or with
+        stable tokens recorded in `vault` (a PiiVault) if one is given.
+
+        Skips detectors whose triggers are absent, scans the text once with
+        the combined pattern of the rest and joins the output in a single
+        allocation. Produces exactly what scrub_multipass produces.
+        """
+        if not text:
+            return ""
+
+        active = self.active_detectors(text)
+        if not active:
+            return text
+
+        detections = []
+        for match in self._combined_pattern(active).finditer(text):
+            name = match.lastgroup
+            start, end = match.span()
+
+            # A single scan resolves overlaps leftmost-first, the four passes
+            # resolve them by priority, and later passes see placeholders
+            # instead of the original neighbours. The results only differ in
+            # rare, detectable cases; defer to the four-pass order then.
+            if self._needs_multipass(text, name, start, end):
+                return self.scrub_multipass(text, vault)
+
+            detections.append((name, start, end))
+
+        if not detections:
+            return text
+
+        # Tokens are only handed out once the scan is known to be final, so
+        # a fallback to scrub_multipass never leaves gaps in the numbering
+        parts = []
+        last = 0
+        for name, start, end in detections:
+            parts.append(text[last:start])
+            if vault is None:
+                parts.append(self.placeholders[name])
+            else:
+                parts.append(vault.token(name, text[start:end]))
+            last = end
+
+        parts.append(text[last:])
+        return "".join(parts)
+
+    def scrub_iter(
+        self,
+        pieces,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        max_chunk_size: int = DEFAULT_MAX_CHUNK_SIZE,
+        executor=None,
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+        vault=None,
+    ):
+        """
+        Scrubs text arriving in pieces and yields the scrubbed text in order.
+
+        The input is regrouped into chunks of about `chunk_size` characters,
+        each ending at a SAFE_CUT boundary, so joining the output gives
+        exactly scrub() of the joined input. Only one chunk (plus what the
+        executor holds) is in memory at a time.
+
+        Args:
+            pieces: Iterable of strings (a single string is accepted too).
+            chunk_size: Target chunk length in characters.
+            max_chunk_size: A stretch this long without any safe boundary
+                (no punctuation, no suitable whitespace) is cut anyway to keep
+                memory bounded. Detections spanning such a cut can be missed.
+            executor: Optional concurrent.futures executor (e.g. a process
+                pool) to scrub chunks in parallel.
+            max_in_flight: Chunks submitted to the executor ahead of output.
+            vault: Optional PiiVault for stable tokens. With an executor,
+                each chunk is tokenized in a worker with a vault of its own,
+                and the tokens are renumbered into `vault` here, in chunk
+                order, so the numbering matches a single-threaded scrub.
+        """
+        if isinstance(pieces, str):
+            pieces = (pieces,)
+
+        chunks = self._chunks(pieces, max(1, chunk_size), max_chunk_size)
+
+        if executor is None:
+            for chunk in chunks:
+                yield self.scrub(chunk, vault)
+            return
+
+        if vault is None:
+            work, finish = _scrub_chunk, lambda chunk, result: result
+        else:
+            work = _tokenize_chunk
+
+            def finish(chunk, result):
+                return self._renumber(chunk, result, vault)
+
+        in_flight = collections.deque()
+        try:
+            for chunk in chunks:
+                in_flight.append((chunk, executor.submit(work, chunk)))
+                if len(in_flight) >= max_in_flight:
+                    chunk, future = in_flight.popleft()
+                    yield finish(chunk, future.result())
+            while in_flight:
+                chunk, future = in_flight.popleft()
+                yield finish(chunk, future.result())
+        finally:
+            for _, future in in_flight:
+                future.cancel()
+
+    def _renumber(self, chunk, result, vault):
+        """Moves a chunk tokenized by _tokenize_chunk onto the request's vault."""
+        if result is None:
+            return self.scrub(chunk, vault)
+        scrubbed, tokens = result
+        if not tokens:
+            return scrubbed
+        # Assigned in the chunk's order of first appearance
+        mapping = {token: vault.token(kind, value) for token, kind, value in tokens}
+        return PiiVault.TOKEN_PATTERN.sub(
+            lambda match: mapping.get(match.group(), match.group()), scrubbed
+        )
+
+    def scrub_stream(
+        self,
+        source,
+        sink,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        executor=None,
+        vault=None,
+    ) -> int:
+        """
+        Scrubs a text file-like `source` into `sink` chunk by chunk.
+        Returns the number of characters written.
+        """
+        written = 0
+        pieces = iter(lambda: source.read(chunk_size), "")
+        for part in self.scrub_iter(
+            pieces, chunk_size, executor=executor, vault=vault
+        ):
+            sink.write(part)
+            written += len(part)
+        return written
+
+    @staticmethod
+    def _chunks(pieces, chunk_size, max_chunk_size):
+        """Regroups `pieces` into chunks that end at SAFE_CUT boundaries."""
+        buffered = []
+        size = 0
+        wanted = chunk_size
+
+        for piece in pieces:
+            if not piece:
+                continue
+            buffered.append(piece)
+            size += len(piece)
+            if size <= wanted:
+                continue
+
+            text = "".join(buffered)
+            start = 0
+            while len(text) - start > chunk_size:
+                match = SAFE_CUT.search(text, start + chunk_size)
+                if match is not None:
+                    cut = match.end()
+                elif len(text) - start >= max_chunk_size:
+                    cut = start + chunk_size
+                else:
+                    break
+                yield text[start:cut]
+                start = cut
+
+            rest = text[start:]
+            buffered = [rest] if rest else []
+            size = len(rest)
+            # No boundary in sight: wait for twice as much text before
+            # searching again, so long unbreakable runs stay linear
+            if size > chunk_size:
+                wanted = min(2 * size, max_chunk_size - 1)
+            else:
+                wanted = chunk_size
+
+        if buffered:
+            yield "".join(buffered)
+
+    def active_detectors(self, text: str) -> tuple:
+        """
+        Names of the detectors that could match somewhere in `text`, in
+        priority order. Placeholders contain none of the trigger characters,
+        so a detector ruled out here stays ruled out after other detections
+        are replaced.
+        """
+        return tuple(
+            name
+            for name in self.placeholders
+            if any(trigger.search(text) for trigger in self.triggers[name])
+        )
+
+    def _combined_pattern(self, active):
+        pattern = self.combined_patterns.get(active)
+        if pattern is None:
+            pattern = self._build_combined_pattern(active)
+            self.combined_patterns[active] = pattern
+        return pattern
+
+    def _build_combined_pattern(self, active):
+        """
+        One alternation of the given detectors with named groups.
+
+        The email branch only starts where a local part can start. Leftmost
+        matching would never start an email after a local-part character
+        anyway, and the guard keeps long words from being rescanned once per
+        character (quadratic in the four-pass version).
+
+        IP and phone share a cheap gate: both need a digit, "+" or "(" to
+        start, which rules out most positions before either branch runs.
+        """
+        branches = []
+        if "guid" in active:
+            branches.append(f"(?P<guid>{self.guid_pattern.pattern})")
+        if "email" in active:
+            branches.append(
+                f"(?P<email>(?<![{EMAIL_LOCAL_CHARS}]){self.email_pattern.pattern})"
+            )
+
+        numeric = []
+        if "ip" in active:
+            numeric.append(f"(?P<ip>{self.ip_pattern.pattern})")
+        if "phone" in active:
+            numeric.append(f"(?P<phone>{self.phone_pattern.pattern})")
+        if numeric:
+            branches.append(rf"(?=[\d+(])(?:{'|'.join(numeric)})")
+
+        return re.compile("|".join(branches))
+
+    def _needs_multipass(self, text, name, start, end) -> bool:
+        """
+        True if the four passes could resolve this match differently.
+
+        1. It starts or ends between two word characters. The "[...]"
+           placeholder would create a word boundary, or hide a digit, that
+           the other detectors' boundary and digit lookarounds can observe.
+        2. It ends between two local-part characters and an email starts
+           right after it. The four passes would find that email after the
+           placeholder; the guarded email branch does not.
+        3. A higher-priority detection starts inside it:
+           - GUID inside IP: impossible, IP octets are at most 3 digits and
+             end on a word boundary, a GUID needs 8 hex digits in a row.
+           - Email inside IP: impossible, the email would match from the
+             IP's first digit and win there.
+           - GUID inside email: needs a "-" in or right after the email.
+           - Anything inside a phone: needs the phone to be followed by "@"
+             or a local-part character; otherwise nothing can continue
+             past its last digit (case 1 covers word characters).
+        """
+        if self._splits_word(text, start) or self._splits_word(text, end):
+            return True
+
+        length = len(text)
+        if end < length:
+            after = text[end]
+            if (
+                text[end - 1] in EMAIL_LOCAL_CHAR_SET
+                and after in EMAIL_LOCAL_CHAR_SET
+                and self.email_pattern.match(text, end)
+            ):
+                return True
+        else:
+            after = ""
+
+        if name == "email":
+            if text.find("-", start, end + 1) != -1:
+                return self._starts_inside(self.guid_pattern, text, start, end)
+        elif name == "phone":
+            if after == "@" or after in EMAIL_LOCAL_CHAR_SET:
+                return self._starts_inside(
+                    self.guid_email_or_ip_pattern, text, start, end
+                )
+        return False
+
+    @staticmethod
+    def _starts_inside(pattern, text, start, end) -> bool:
+        """True if `pattern` matches at any position strictly inside [start, end)."""
+        for position in range(start + 1, end):
+            if pattern.match(text, position):
+                return True
+        return False
+
+    @staticmethod
+    def _splits_word(text, position) -> bool:
+        return (
+            0 < position < len(text)
+            and WORD_CHAR.match(text, position - 1) is not None
+            and WORD_CHAR.match(text, position) is not None
+        )
+
+    def scrub_multipass(self, text: str, vault=None) -> str:
         """
-        Replaces detected PII in the given text with placeholders.
+        Reference implementation: one re.sub pass per detector, in priority order.
         """
         if not text:
             return ""
 
+        if vault is not None:
+            for name, pattern in (
+                ("guid", self.guid_pattern),
+                ("email", self.email_pattern),
+                ("ip", self.ip_pattern),
+                ("phone", self.phone_pattern),
+            ):
+                text = pattern.sub(
+                    lambda match, name=name: vault.token(name, match.group()), text
+                )
+            return text
+
         # Order matters slightly: scrub more specific patterns first if there's overlap.
         # GUIDs and IPs are quite distinct. Emails are distinct.
         # Phone numbers can be tricky (overlapping with IPs or dates), but the pattern is specific to US format.
@@ -95,3 +474,84 @@ class PiiScrubber:
         text = self.phone_pattern.sub("[REDACTED_PHONE]", text)
 
         return text
+
+
+class PiiVault:
+    """
+    Per-request mapping between stable tokens and the values they replace.
+
+    Each distinct value gets a token numbered per kind in order of first
+    appearance ("[GUID_1]", "[GUID_2]", "[EMAIL_1]"...), so two prompts that
+    only differ in the actual IDs scrub to the same text. The vault never
+    leaves the host; rehydrate() puts the real values back into the answer.
+    """
+
+    TOKEN_PATTERN = re.compile(r"\[(?:GUID|EMAIL|IP|PHONE)_\d+\]")
+
+    # System message text telling the model to keep tokens intact
+    INSTRUCTIONS = (
+        "**Pseudonymized values:** Tokens such as `[GUID_1]`, `[EMAIL_2]`, "
+        "`[IP_1]` or `[PHONE_1]` stand for real values that were removed before "
+        "the error reached you. The same token always means the same value. "
+        "Copy tokens into your answer exactly as written (including the "
+        "brackets) wherever you would use the value; they are replaced with the "
+        "real values on the user's machine."
+    )
+
+    def __init__(self):
+        self.tokens = {}  # (kind, normalized value) -> token
+        self.values = {}  # token -> original value
+        self.counts = collections.Counter()
+
+    def __len__(self):
+        return len(self.values)
+
+    def token(self, kind: str, value: str) -> str:
+        """Returns the token for a value, assigning the next one if it is new."""
+        # GUIDs and email addresses are case-insensitive
+        key = (kind, value.lower() if kind in ("guid", "email") else value)
+        token = self.tokens.get(key)
+        if token is None:
+            self.counts[kind] += 1
+            token = f"[{kind.upper()}_{self.counts[kind]}]"
+            self.tokens[key] = token
+            self.values[token] = value
+        return token
+
+    def rehydrate(self, text: str) -> str:
+        """Replaces the tokens of this vault in `text` with the original values."""
+        if not self.values or not text:
+            return text
+        return self.TOKEN_PATTERN.sub(
+            lambda match: self.values.get(match.group(), match.group()), text
+        )
+
+
+_worker_scrubber = None
+
+
+def _scrub_chunk(text: str) -> str:
+    """Executor entry point; each worker process builds its scrubber once."""
+    global _worker_scrubber
+    if _worker_scrubber is None:
+        _worker_scrubber = PiiScrubber()
+    return _worker_scrubber.scrub(text)
+
+
+def _tokenize_chunk(text: str):
+    """
+    Executor entry point for pseudonymization. Returns the chunk tokenized
+    with a vault of its own and that vault's (token, kind, value) entries in
+    order, or None if the chunk already holds token-like text, which would
+    be renumbered by mistake (the caller scrubs such a chunk itself).
+    """
+    global _worker_scrubber
+    if PiiVault.TOKEN_PATTERN.search(text):
+        return None
+    if _worker_scrubber is None:
+        _worker_scrubber = PiiScrubber()
+    vault = PiiVault()
+    scrubbed = _worker_scrubber.scrub(text, vault)
+    return scrubbed, [
+        (token, kind, vault.values[token]) for (kind, _), token in vault.tokens.items()
+    ]
@@ -0,0 +1,103 @@
+"""
+Staged request pipeline.
+
+An analysis runs as a list of named stages over one shared Analysis object.
+Each stage is an async function taking the Analysis. A stage that returns a
+dict ends the run with that result (errors, early answers); otherwise the
+next stage runs. A stage may carry a `when` predicate and is skipped, and
+not timed, when it is false (e.g. model stages on a cache hit).
+
+Every stage that runs is timed on the monotonic clock, so a slow analysis
+shows where its time went. New stages are added by name relative to the
+existing ones, without touching the others:
+
+    host.analysis_pipeline.add("compact", compact_prompt, before="send")
+"""
+
+import time
+
+
+class Analysis:
+    """State handed from stage to stage for one analyze_error request."""
+
+    def __init__(self, payload, emit=None):
+        self.payload = payload
+        self.emit = emit
+        self.text = payload.get("text")
+        self.context = payload.get("context", "Unknown")
+
+        self.vault = None
+        self.auth_check = None
+        self.scrubbed_text = ""
+        self.scrubbed_context = ""
+        self.prompt = ""
+        # Session config the prompt is answered under (see result_cache)
+        self.fingerprint = None
+        self.cache_key = None
+
+        # Answer as the model sees it (tokenized); rehydrated when saved
+        self.markdown = None
+        self.cached = False
+        self.cacheable = False
+        # Answer shared by an identical request already waiting on the model
+        self.coalesced = False
+        self.flight_key = None
+        self.flight = None
+        self.response_event = None
+        self.analysis_id = None
+        self.output_file = None
+
+        # Monotonic time by which the answer is due (see ANALYSIS_BUDGET_SECONDS)
+        self.deadline = None
+
+        self.stage = None
+        self.timings = {}
+
+    def rehydrate(self, markdown):
+        return self.vault.rehydrate(markdown) if self.vault is not None else markdown
+
+
+class Pipeline:
+    def __init__(self, stages=()):
+        """
+        Args:
+            stages: (name, func) or (name, func, when) tuples, in order.
+        """
+        self.stages = []
+        for stage in stages:
+            self.add(*stage)
+
+    @property
+    def names(self) -> list:
+        return [name for name, _, _ in self.stages]
+
+    def add(self, name, func, when=None, before=None, after=None):
+        """Appends a stage, or inserts it before/after an existing one."""
+        if name in self.names:
+            raise ValueError(f"Stage {name!r} already exists")
+        index = len(self.stages)
+        if before is not None:
+            index = self.names.index(before)
+        elif after is not None:
+            index = self.names.index(after) + 1
+        self.stages.insert(index, (name, func, when))
+
+    def remove(self, name):
+        del self.stages[self.names.index(name)]
+
+    async def run(self, analysis) -> dict:
+        """Runs the stages in order. Returns the first dict a stage returns."""
+        for name, func, when in self.stages:
+            if when is not None and not when(analysis):
+                continue
+            analysis.stage = name
+            started = time.monotonic()
+            try:
+                result = await func(analysis)
+            finally:
+                analysis.timings[name] = round(
+                    (time.monotonic() - started) * 1000, 2
+                )
+            if result is not None:
+                return result
+        return None
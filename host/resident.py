@@ -0,0 +1,191 @@
+"""
+Resident host support.
+
+In resident mode one long-lived daemon owns the Copilot client and sessions
+and listens on a local endpoint (a Unix socket on POSIX, a named pipe on
+Windows). The process the browser launches is only a thin shim: it connects
+to the daemon (starting it if needed) and copies Native Messaging frames
+between stdio and the daemon. Frames are forwarded as raw bytes, so the shim
+never parses JSON.
+"""
+
+import asyncio
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+
+# How long the shim waits for a freshly spawned daemon to accept connections
+CONNECT_TIMEOUT_SECONDS = 30.0
+CONNECT_RETRY_SECONDS = 0.1
+PUMP_CHUNK_SIZE = 64 * 1024
+
+
+def daemon_address(user_data_dir: str) -> str:
+    """Returns the per-user endpoint the daemon listens on."""
+    if os.name == "nt":
+        user = os.environ.get("USERNAME", "user")
+        return rf"\\.\pipe\DynamicsHelper-{user}"
+    return os.path.join(user_data_dir, "host.sock")
+
+
+async def start_server(address: str, client_connected_cb):
+    """
+    Starts listening on the daemon endpoint.
+    Returns an object with a close() method.
+    """
+    loop = asyncio.get_running_loop()
+
+    def protocol_factory():
+        reader = asyncio.StreamReader()
+        return asyncio.StreamReaderProtocol(reader, client_connected_cb)
+
+    if os.name == "nt":
+        # The Proactor loop creates the first pipe instance with
+        # FILE_FLAG_FIRST_PIPE_INSTANCE, so a second daemon fails here.
+        servers = await loop.start_serving_pipe(protocol_factory, address)
+        return _PipeServers(servers)
+
+    if os.path.exists(address):
+        # Leftover from a daemon that did not exit cleanly
+        os.unlink(address)
+
+    # Owner-only socket: the daemon auto-approves Copilot permissions
+    old_umask = os.umask(0o177)
+    try:
+        return await loop.create_unix_server(protocol_factory, address)
+    finally:
+        os.umask(old_umask)
+
+
+def remove_endpoint(address: str):
+    """Removes the socket file once the daemon stops listening."""
+    if os.name != "nt" and os.path.exists(address):
+        try:
+            os.unlink(address)
+        except OSError as e:
+            logging.error(f"Failed to remove {address}: {e}")
+
+
+class _PipeServers:
+    """Gives the list returned by start_serving_pipe a server-like close()."""
+
+    def __init__(self, servers):
+        self.servers = servers
+
+    def close(self):
+        for server in self.servers:
+            server.close()
+
+
+async def open_connection(address: str):
+    """Connects to the daemon endpoint. Returns (reader, writer)."""
+    if os.name != "nt":
+        return await asyncio.open_unix_connection(address)
+
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    protocol = asyncio.StreamReaderProtocol(reader)
+    transport, _ = await loop.create_pipe_connection(lambda: protocol, address)
+    writer = asyncio.StreamWriter(transport, protocol, reader, loop)
+    return reader, writer
+
+
+async def is_daemon_running(address: str) -> bool:
+    """Checks whether a daemon is already accepting connections."""
+    try:
+        _, writer = await open_connection(address)
+    except OSError:
+        return False
+    writer.close()
+    return True
+
+
+def spawn_daemon(script_path: str):
+    """Starts the daemon as a detached background process."""
+    if getattr(sys, "frozen", False):
+        cmd = [sys.executable, "--daemon"]
+    else:
+        cmd = [sys.executable, "-u", script_path, "--daemon"]
+
+    kwargs = {
+        "stdin": subprocess.DEVNULL,
+        "stdout": subprocess.DEVNULL,
+        "stderr": subprocess.DEVNULL,
+        "close_fds": True,
+    }
+
+    if os.name == "nt":
+        flags = subprocess.CREATE_NEW_PROCESS_GROUP | subprocess.CREATE_NO_WINDOW
+        # The browser may run us inside a job object that is torn down with
+        # the shim. Try to break away from it; not every job allows that.
+        try:
+            return subprocess.Popen(
+                cmd,
+                creationflags=flags | subprocess.CREATE_BREAKAWAY_FROM_JOB,
+                **kwargs,
+            )
+        except OSError:
+            return subprocess.Popen(cmd, creationflags=flags, **kwargs)
+
+    return subprocess.Popen(cmd, start_new_session=True, **kwargs)
+
+
+async def connect_or_spawn(address: str, script_path: str):
+    """Connects to the daemon, starting one first if none is running."""
+    try:
+        return await open_connection(address)
+    except OSError:
+        pass
+
+    logging.info("No resident host running. Spawning daemon...")
+    spawn_daemon(script_path)
+
+    deadline = time.monotonic() + CONNECT_TIMEOUT_SECONDS
+    while True:
+        try:
+            return await open_connection(address)
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(CONNECT_RETRY_SECONDS)
+
+
+async def run_shim(address: str, script_path: str):
+    """Copies frames between stdio and the daemon until either side closes."""
+    loop = asyncio.get_running_loop()
+    reader, writer = await connect_or_spawn(address, script_path)
+    done = asyncio.Event()
+
+    def pump_stdin():
+        # Blocking reads stay on a thread; writes are handed to the loop
+        fd = sys.stdin.fileno()
+        try:
+            while True:
+                data = os.read(fd, PUMP_CHUNK_SIZE)
+                if not data:
+                    break
+                loop.call_soon_threadsafe(writer.write, data)
+        except OSError as e:
+            logging.error(f"Shim stdin error: {e}")
+        # The browser is gone, nobody is left to read responses
+        loop.call_soon_threadsafe(done.set)
+
+    threading.Thread(target=pump_stdin, daemon=True).start()
+
+    async def pump_daemon():
+        out = sys.stdout.buffer
+        while True:
+            data = await reader.read(PUMP_CHUNK_SIZE)
+            if not data:
+                break
+            out.write(data)
+            out.flush()
+        done.set()
+
+    pump_task = asyncio.create_task(pump_daemon())
+    await done.wait()
+    pump_task.cancel()
+    writer.close()
@@ -0,0 +1,157 @@
+"""
+Two-tier cache for analysis results.
+
+Entries are keyed on a hash of the scrubbed prompt plus a fingerprint of the
+active session config, so a config change never serves stale answers. The
+memory tier is a small LRU; the disk tier keeps one JSON file per entry and
+is bounded by age (TTL) and total size. Only scrubbed prompts are ever used
+to build keys, so no raw PII reaches the disk.
+"""
+
+import collections
+import hashlib
+import json
+import logging
+import os
+import time
+
+DEFAULT_MEMORY_ENTRIES = 128
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_MAX_DISK_BYTES = 50 * 1024 * 1024
+
+
+def config_fingerprint(session_config) -> str:
+    """Stable hash of the settings that shape an answer (model, instructions, skills...)."""
+    serializable = {
+        key: value for key, value in session_config.items() if not callable(value)
+    }
+    blob = json.dumps(serializable, sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def make_key(prompt: str, fingerprint: str) -> str:
+    """Cache key for a scrubbed prompt under a given config."""
+    digest = hashlib.sha256()
+    digest.update(fingerprint.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(prompt.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ResultCache:
+    def __init__(
+        self,
+        directory: str,
+        memory_entries: int = DEFAULT_MEMORY_ENTRIES,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        max_disk_bytes: int = DEFAULT_MAX_DISK_BYTES,
+    ):
+        self.directory = directory
+        self.memory_entries = memory_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_bytes = max_disk_bytes
+        self.memory = collections.OrderedDict()  # key -> (created, value)
+        self.disk_bytes = None  # computed on first write
+
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _expired(self, created: float) -> bool:
+        return time.time() - created > self.ttl_seconds
+
+    def get(self, key: str):
+        """Returns the cached value, or None on a miss or expired entry."""
+        entry = self.memory.get(key)
+        if entry is not None:
+            created, value = entry
+            if not self._expired(created):
+                self.memory.move_to_end(key)
+                return value
+            del self.memory[key]
+
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                record = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logging.warning(f"Discarding unreadable cache entry {path}: {e}")
+            self._remove(path)
+            return None
+
+        if self._expired(record.get("created", 0)):
+            self._remove(path)
+            return None
+
+        self._remember(key, record["created"], record["value"])
+        return record["value"]
+
+    def put(self, key: str, value):
+        """Stores a value in both tiers."""
+        created = time.time()
+        self._remember(key, created, value)
+
+        path = self._path(key)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"created": created, "value": value}, f)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logging.error(f"Failed to write cache entry {path}: {e}")
+            self._remove(tmp_path)
+            return
+
+        if self.disk_bytes is None:
+            self.disk_bytes = self._scan_disk_bytes()
+        else:
+            self.disk_bytes += os.path.getsize(path)
+
+        if self.disk_bytes > self.max_disk_bytes:
+            self.evict()
+
+    def _remember(self, key, created, value):
+        self.memory[key] = (created, value)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def _entries(self):
+        """(mtime, size, path) for every file in the disk tier."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _scan_disk_bytes(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """Drops expired entries, then the oldest ones until under the size limit."""
+        entries = sorted(self._entries())
+        now = time.time()
+        total = sum(size for _, size, _ in entries)
+
+        for mtime, size, path in entries:
+            if now - mtime <= self.ttl_seconds and total <= self.max_disk_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+        self.disk_bytes = total
+
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
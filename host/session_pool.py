@@ -0,0 +1,173 @@
+"""
+Pool of pre-created Copilot sessions.
+
+A session processes one turn at a time, so sharing a single session
+serializes every analysis. The pool keeps several warm sessions built from
+the same config, lends one to each request and takes it back afterwards.
+A turn cancelled mid-way is aborted and its session reused; sessions that
+fail, time out or cannot be aborted are destroyed and replaced in the
+background.
+"""
+
+import asyncio
+import contextlib
+import logging
+
+DEFAULT_ACQUIRE_TIMEOUT_SECONDS = 60.0
+REPLACEMENT_ATTEMPTS = 3
+REPLACEMENT_BACKOFF_SECONDS = 1.0
+
+# A session whose turn cannot be aborted this quickly is recycled instead
+ABORT_TIMEOUT_SECONDS = 5.0
+
+
+class SessionPoolError(RuntimeError):
+    """Raised when no session can be obtained from the pool."""
+
+
+class SessionPool:
+    def __init__(self, create_session, size: int):
+        """
+        Args:
+            create_session: Coroutine function returning a new session.
+            size: Number of sessions to keep alive.
+        """
+        self.create_session = create_session
+        self.size = max(1, size)
+        self.idle = asyncio.Queue()
+        self.live = 0  # sessions that exist (idle or leased)
+        self.pending = 0  # replacements being created
+        self.closed = False
+        self.background = set()
+
+    @property
+    def available(self) -> int:
+        """Number of idle sessions ready to lend."""
+        return self.idle.qsize()
+
+    async def start(self) -> bool:
+        """Pre-creates the sessions. Returns True if at least one was created."""
+        results = await asyncio.gather(
+            *(self.create_session() for _ in range(self.size)),
+            return_exceptions=True,
+        )
+
+        for result in results:
+            if isinstance(result, BaseException):
+                logging.error(f"Failed to pre-create session: {result}")
+            else:
+                self.live += 1
+                self.idle.put_nowait(result)
+
+        logging.info(f"Session pool warmed up: {self.live}/{self.size} sessions")
+
+        # Top up whatever failed, without holding up the caller
+        for _ in range(self.size - self.live):
+            self._spawn_replacement()
+
+        return self.live > 0
+
+    async def acquire(self, timeout: float = DEFAULT_ACQUIRE_TIMEOUT_SECONDS):
+        """Takes an idle session, waiting for one to be returned if needed."""
+        if self.closed:
+            raise SessionPoolError("Session pool is closed.")
+
+        if self.idle.empty() and self.live + self.pending < self.size:
+            self._spawn_replacement()
+
+        try:
+            return await asyncio.wait_for(self.idle.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            raise SessionPoolError(
+                f"No Copilot session became available within {timeout} seconds."
+            )
+
+    def release(self, session, healthy: bool = True):
+        """Returns a session. Unhealthy sessions are destroyed and replaced."""
+        if healthy and not self.closed:
+            self.idle.put_nowait(session)
+            return
+
+        self.live -= 1
+        self._spawn(self._destroy(session))
+        if not self.closed:
+            logging.info("Recycling Copilot session.")
+            self._spawn_replacement()
+
+    async def abort(self, session) -> bool:
+        """Stops the session's current turn. Returns whether it is reusable."""
+        try:
+            await asyncio.wait_for(session.abort(), timeout=ABORT_TIMEOUT_SECONDS)
+            return True
+        except Exception as e:
+            logging.warning(f"Failed to abort session turn: {e}")
+            return False
+
+    @contextlib.asynccontextmanager
+    async def lease(self, timeout: float = DEFAULT_ACQUIRE_TIMEOUT_SECONDS):
+        """
+        Lends a session for the duration of the block.
+        On cancellation the session's turn is aborted and the session goes
+        back to the pool; any other exception, timeouts included, recycles it.
+        """
+        session = await self.acquire(timeout)
+        try:
+            yield session
+        except asyncio.CancelledError:
+            self.release(session, healthy=await self.abort(session))
+            raise
+        except BaseException:
+            self.release(session, healthy=False)
+            raise
+        else:
+            self.release(session)
+
+    async def close(self):
+        """Destroys idle sessions. Leased ones are destroyed when returned."""
+        self.closed = True
+        while not self.idle.empty():
+            session = self.idle.get_nowait()
+            self.live -= 1
+            await self._destroy(session)
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self.background.add(task)
+        task.add_done_callback(self.background.discard)
+        return task
+
+    def _spawn_replacement(self):
+        self.pending += 1
+        self._spawn(self._replace())
+
+    async def _replace(self):
+        """Creates one session in the background, retrying with backoff."""
+        try:
+            for attempt in range(1, REPLACEMENT_ATTEMPTS + 1):
+                if self.closed:
+                    return
+                try:
+                    session = await self.create_session()
+                except Exception as e:
+                    logging.error(
+                        f"Failed to create replacement session "
+                        f"(attempt {attempt}/{REPLACEMENT_ATTEMPTS}): {e}"
+                    )
+                    await asyncio.sleep(REPLACEMENT_BACKOFF_SECONDS * attempt)
+                    continue
+
+                if self.closed:
+                    await self._destroy(session)
+                    return
+
+                self.live += 1
+                self.idle.put_nowait(session)
+                return
+        finally:
+            self.pending -= 1
+
+    async def _destroy(self, session):
+        try:
+            await session.destroy()
+        except Exception as e:
+            logging.warning(f"Failed to destroy session: {e}")
@@ -0,0 +1,127 @@
+"""
+Relays Copilot session events to the browser as incremental frames.
+
+Clients opt in with "stream": true in the analyze_error payload. They then
+receive, under the same requestId:
+
+    {"type": "progress", "data": {"message": "..."}}   tool / intent updates
+    {"type": "partial",  "data": {"delta": "..."}}     new markdown text
+    {"type": "final",    ...regular response...}       always last
+
+Deltas are coalesced so that a fast token stream does not turn into one
+frame per token.
+"""
+
+import time
+
+DEFAULT_FLUSH_INTERVAL_SECONDS = 0.1
+
+# Longest tail held back when it may be the start of a token such as
+# "[EMAIL_12]" that the next delta completes
+MAX_HELD_TOKEN_LENGTH = 16
+
+DELTA_EVENTS = {"assistant.message_delta"}
+PROGRESS_EVENTS = {
+    "assistant.turn_start",
+    "assistant.intent",
+    "tool.execution_start",
+    "tool.execution_progress",
+    "subagent.started",
+}
+
+
+def _event_type(event) -> str:
+    event_type = getattr(event, "type", "")
+    return getattr(event_type, "value", event_type)
+
+
+def _progress_message(event_type, data):
+    if event_type == "assistant.turn_start":
+        return "Copilot is working..."
+    if event_type == "assistant.intent":
+        return getattr(data, "intent", None)
+    if event_type == "tool.execution_start":
+        tool_name = getattr(data, "tool_name", None)
+        return f"Running tool: {tool_name}" if tool_name else None
+    if event_type == "tool.execution_progress":
+        return getattr(data, "progress_message", None)
+    if event_type == "subagent.started":
+        name = getattr(data, "agent_display_name", None) or getattr(
+            data, "agent_name", None
+        )
+        return f"Delegating to {name}" if name else None
+    return None
+
+
+class StreamRelay:
+    """Session event handler that forwards deltas and progress through `emit`."""
+
+    def __init__(
+        self,
+        emit,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL_SECONDS,
+        transform=None,
+    ):
+        """
+        Args:
+            emit: Callable taking (frame_type, data) that sends one frame.
+            flush_interval: Minimum seconds between two partial frames.
+            transform: Optional callable applied to text before it is sent,
+                e.g. PiiVault.rehydrate. Bracketed tokens are never split
+                across two calls.
+        """
+        self.emit = emit
+        self.flush_interval = flush_interval
+        self.transform = transform
+        self.buffer = []
+        self.last_flush = 0.0
+        self.first_delta_at = None
+
+    def __call__(self, event):
+        event_type = _event_type(event)
+        data = getattr(event, "data", None)
+
+        if event_type in DELTA_EVENTS:
+            delta = getattr(data, "delta_content", None)
+            if not delta:
+                return
+            if self.first_delta_at is None:
+                self.first_delta_at = time.monotonic()
+            self.buffer.append(delta)
+            if time.monotonic() - self.last_flush >= self.flush_interval:
+                self.flush()
+
+        elif event_type in PROGRESS_EVENTS:
+            message = _progress_message(event_type, data)
+            if message:
+                # Keep text ahead of the status that follows it
+                self.flush()
+                self.emit("progress", {"message": message})
+
+    def flush(self, final: bool = False):
+        """
+        Sends any buffered text as one partial frame.
+        Unless `final`, a trailing "[..." that may be an unfinished token is
+        kept for the next flush.
+        """
+        if not self.buffer:
+            return
+        delta = "".join(self.buffer)
+        self.buffer = []
+
+        if self.transform:
+            if not final:
+                start = delta.rfind("[")
+                if (
+                    start != -1
+                    and "]" not in delta[start:]
+                    and len(delta) - start < MAX_HELD_TOKEN_LENGTH
+                ):
+                    self.buffer = [delta[start:]]
+                    delta = delta[:start]
+            delta = self.transform(delta)
+
+        if not delta:
+            return
+        self.last_flush = time.monotonic()
+        self.emit("partial", {"delta": delta})
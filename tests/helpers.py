@@ -0,0 +1,124 @@
+"""
+Shared test setup and stand-ins for the Copilot SDK.
+
+Import this before any host module. It points HOME / APPDATA / USERPROFILE at
+a throwaway directory, so the user data a NativeHost touches (config, result
+cache, history.db, native_host.log, saved analyses under Downloads) stays out
+of the developer's own.
+"""
+
+import asyncio
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+import types
+
+HOST_DIR = os.path.join(os.path.dirname(__file__), "..", "host")
+sys.path.append(HOST_DIR)
+
+if "dh_native_host" in sys.modules:
+    raise RuntimeError("Import helpers before dh_native_host")
+
+TEST_HOME = tempfile.mkdtemp(prefix="dh-tests-")
+atexit.register(shutil.rmtree, TEST_HOME, ignore_errors=True)
+for name in ("HOME", "APPDATA", "USERPROFILE"):
+    os.environ[name] = TEST_HOME
+
+
+def answer(content):
+    """A Copilot assistant.message event carrying `content`."""
+    return types.SimpleNamespace(
+        type="assistant.message", data=types.SimpleNamespace(content=content)
+    )
+
+
+class FakeClient:
+    """Stand-in CopilotClient: auth status, and sessions for the pool."""
+
+    def __init__(self, authenticated=True, session_factory=None):
+        self.authenticated = authenticated
+        self.auth_checks = 0
+        self.created = []
+        self.session_factory = session_factory or FakeSession
+
+    async def get_auth_status(self):
+        self.auth_checks += 1
+        return {"isAuthenticated": self.authenticated}
+
+    async def create_session(self, config=None):
+        self.created.append(config)
+        return self.session_factory()
+
+
+class FakeSession:
+    """
+    Stand-in Copilot session. Records prompts and answers each turn after
+    `delay` seconds with `content` ("answer <n>" by default). Counts aborts.
+    """
+
+    def __init__(self, content=None, delay=0):
+        self.content = content
+        self.delay = delay
+        self.prompts = []
+        self.aborts = 0
+        self.destroyed = False
+
+    @property
+    def turns(self):
+        return len(self.prompts)
+
+    async def send_and_wait(self, options, timeout=None):
+        self.prompts.append(options["prompt"])
+        await asyncio.wait_for(asyncio.sleep(self.delay), timeout)
+        return self.reply(options["prompt"])
+
+    def reply(self, prompt):
+        return answer(self.content or f"answer {self.turns}")
+
+    async def abort(self):
+        self.aborts += 1
+
+    async def destroy(self):
+        self.destroyed = True
+
+
+class SlowSession(FakeSession):
+    """Turns take `delay` seconds and end without a response event."""
+
+    def __init__(self, delay):
+        super().__init__(delay=delay)
+
+    def reply(self, prompt):
+        return None
+
+
+class TokenEchoSession(FakeSession):
+    """Answers with the last word of the prompt; prompts containing `fail_on` fail."""
+
+    def __init__(self, delay=0, fail_on=None):
+        super().__init__(delay=delay)
+        self.fail_on = fail_on
+
+    def reply(self, prompt):
+        if self.fail_on and self.fail_on in prompt:
+            raise RuntimeError("session expired")
+        return answer(f"Look up {prompt.split()[-1]}")
+
+
+class FailingSession(FakeSession):
+    async def send_and_wait(self, options, timeout=None):
+        raise RuntimeError("session expired")
+
+
+def session_pool(*sessions, size=None):
+    """A SessionPool lending out `sessions`, then fresh FakeSessions."""
+    from session_pool import SessionPool
+
+    pending = list(sessions)
+
+    async def create_session():
+        return pending.pop(0) if pending else FakeSession()
+
+    return SessionPool(create_session, size or max(1, len(sessions)))
@@ -0,0 +1,120 @@
+import asyncio
+import os
+import sys
+import unittest
+
+# Ensure host directory is in path
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "host"))
+
+from auth_cache import AuthCache
+
+
+class FakeAuth:
+    """Stand-in for client.get_auth_status that counts calls."""
+
+    def __init__(self, authenticated=True, delay=0, error=None):
+        self.authenticated = authenticated
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return {"isAuthenticated": self.authenticated, "login": "octocat"}
+
+
+class TestAuthCache(unittest.TestCase):
+    def run_async(self, coro):
+        return asyncio.run(coro)
+
+    def test_positive_answer_is_cached(self):
+        async def scenario():
+            fetch = FakeAuth()
+            cache = AuthCache(fetch, ttl_seconds=60)
+            for _ in range(3):
+                self.assertTrue((await cache.get())["isAuthenticated"])
+            self.assertEqual(fetch.calls, 1)
+
+        self.run_async(scenario())
+
+    def test_expired_answer_is_refetched(self):
+        async def scenario():
+            fetch = FakeAuth()
+            cache = AuthCache(fetch, ttl_seconds=0)
+            await cache.get()
+            await cache.get()
+            self.assertEqual(fetch.calls, 2)
+
+        self.run_async(scenario())
+
+    def test_unauthenticated_is_checked_every_time(self):
+        async def scenario():
+            fetch = FakeAuth(authenticated=False)
+            cache = AuthCache(fetch, ttl_seconds=60)
+            self.assertFalse((await cache.get())["isAuthenticated"])
+            fetch.authenticated = True
+            self.assertTrue((await cache.get())["isAuthenticated"])
+            self.assertEqual(fetch.calls, 2)
+
+        self.run_async(scenario())
+
+    def test_concurrent_callers_share_one_call(self):
+        async def scenario():
+            fetch = FakeAuth(delay=0.05)
+            cache = AuthCache(fetch, ttl_seconds=60)
+            results = await asyncio.gather(*(cache.get() for _ in range(5)))
+            self.assertEqual(len(results), 5)
+            self.assertEqual(fetch.calls, 1)
+
+        self.run_async(scenario())
+
+    def test_invalidate_forces_a_new_check(self):
+        async def scenario():
+            fetch = FakeAuth()
+            cache = AuthCache(fetch, ttl_seconds=60)
+            await cache.get()
+            cache.invalidate()
+            await cache.get()
+            self.assertEqual(fetch.calls, 2)
+
+        self.run_async(scenario())
+
+    def test_invalidation_during_check_wins(self):
+        async def scenario():
+            fetch = FakeAuth(delay=0.05)
+            cache = AuthCache(fetch, ttl_seconds=60)
+            pending = asyncio.ensure_future(cache.get())
+            await asyncio.sleep(0.01)
+            cache.invalidate()
+            await pending
+            self.assertFalse(cache.fresh)
+
+        self.run_async(scenario())
+
+    def test_failed_check_returns_none(self):
+        async def scenario():
+            cache = AuthCache(FakeAuth(error=RuntimeError("cli gone")), 60)
+            self.assertIsNone(await cache.get())
+            self.assertFalse(cache.fresh)
+
+        self.run_async(scenario())
+
+    def test_background_refresh_warms_the_cache(self):
+        async def scenario():
+            fetch = FakeAuth()
+            cache = AuthCache(fetch, ttl_seconds=60)
+            cache.start_refresh()
+            await asyncio.sleep(0.01)
+            self.assertTrue(cache.fresh)
+            await cache.get()
+            cache.stop()
+            self.assertEqual(fetch.calls, 1)
+
+        self.run_async(scenario())
+
+
+if __name__ == "__main__":
+    unittest.main()
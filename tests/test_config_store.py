@@ -0,0 +1,299 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+# Ensure host directory is in path
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "host"))
+
+# Throwaway home for the host's user data; must come before host imports
+from helpers import FakeClient
+
+import dh_native_host
+from config_store import ConfigStore, write_atomic
+from dh_native_host import NativeHost
+from pii_scrubber import PiiVault
+from result_cache import ResultCache
+
+
+def write_json(path, data, bump=0):
+    with open(path, "w") as f:
+        json.dump(data, f)
+    # Make the edit visible even on filesystems with coarse timestamps
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + bump * 10**9))
+
+
+class JsonLoader:
+    def __init__(self, path):
+        self.path = path
+        self.loads = 0
+
+    def __call__(self):
+        self.loads += 1
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path) as f:
+            return json.load(f)
+
+
+class TestConfigStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "config.json")
+        self.loader = JsonLoader(self.path)
+        self.store = ConfigStore(self.loader, [self.path])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_unchanged_files_are_not_reread(self):
+        write_json(self.path, {"model": "gpt-5"})
+        for _ in range(3):
+            self.assertEqual(self.store.get(), {"model": "gpt-5"})
+        self.assertEqual(self.loader.loads, 1)
+        self.assertFalse(self.store.changed())
+
+    def test_edit_triggers_reload(self):
+        write_json(self.path, {"model": "gpt-5"})
+        self.store.get()
+        write_json(self.path, {"model": "claude-sonnet-4"}, bump=1)
+        self.assertTrue(self.store.changed())
+        self.assertEqual(self.store.get(), {"model": "claude-sonnet-4"})
+        self.assertEqual(self.loader.loads, 2)
+
+    def test_new_file_counts_as_change(self):
+        self.assertEqual(self.store.get(), {})
+        write_json(self.path, {"model": "gpt-5"})
+        self.assertEqual(self.store.get(), {"model": "gpt-5"})
+
+    def test_callers_get_their_own_copy(self):
+        write_json(self.path, {"model": "gpt-5"})
+        self.store.get()["streaming"] = True
+        self.assertNotIn("streaming", self.store.get())
+
+    def test_watch_reports_edits(self):
+        async def scenario():
+            write_json(self.path, {"model": "gpt-5"})
+            self.store.get()
+            changed = asyncio.Event()
+
+            async def on_change():
+                self.store.get()
+                changed.set()
+
+            watcher = asyncio.create_task(self.store.watch(on_change, 0.01))
+            write_json(self.path, {"model": "gpt-4.1"}, bump=1)
+            await asyncio.wait_for(changed.wait(), 1)
+            watcher.cancel()
+            self.assertEqual(self.store.get(), {"model": "gpt-4.1"})
+
+        asyncio.run(scenario())
+
+
+class TestConfigReload(unittest.TestCase):
+    def test_reload_rebuilds_only_on_real_changes(self):
+        async def scenario():
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, "config.json")
+                write_json(path, {"model": "gpt-5"})
+
+                host = NativeHost()
+                host._init_loop_state()
+                host.rebuild_debounce = 0
+                host.session_pool_size = 1
+                host.client = FakeClient()
+                host.config_store = ConfigStore(JsonLoader(path), [path])
+                await host._refresh_session()
+                self.assertEqual(len(host.client.created), 1)
+
+                # Touched but identical: keep the warm sessions
+                write_json(path, {"model": "gpt-5"}, bump=1)
+                await host._reload_config()
+                self.assertEqual(len(host.client.created), 1)
+
+                write_json(path, {"model": "gpt-4.1"}, bump=2)
+                await host._reload_config()
+                self.assertEqual(len(host.client.created), 2)
+                self.assertEqual(host.client.created[-1]["model"], "gpt-4.1")
+
+        asyncio.run(scenario())
+
+    def test_edit_read_by_an_analysis_before_the_poll_still_rebuilds(self):
+        async def scenario():
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, "config.json")
+                write_json(path, {"model": "gpt-5"})
+
+                host = NativeHost()
+                host._init_loop_state()
+                host.rebuild_debounce = 0
+                host.session_pool_size = 1
+                host.client = FakeClient()
+                host.cache = ResultCache(os.path.join(tmp, "cache"))
+                host.config_store = ConfigStore(JsonLoader(path), [path])
+                await host._refresh_session()
+                watcher = asyncio.create_task(
+                    host.config_store.watch(host._reload_config, 0.1)
+                )
+
+                # An analysis reads the edited config before the watcher polls
+                write_json(path, {"model": "gpt-4.1"}, bump=1)
+                payload = {"text": "Plugin failed", "context": ""}
+                await host.handle_analyze_error(payload)
+                await asyncio.sleep(0.3)
+                watcher.cancel()
+
+                models = [config["model"] for config in host.client.created]
+                first = await host.handle_analyze_error(payload)
+                second = await host.handle_analyze_error(payload)
+                return models, first, second
+
+        models, first, second = asyncio.run(scenario())
+        self.assertEqual(models, ["gpt-5", "gpt-4.1"])
+        self.assertFalse(first["cached"])
+        self.assertTrue(second["cached"])
+
+    def test_failed_rebuild_keeps_the_working_sessions(self):
+        class BrokenModelClient(FakeClient):
+            async def create_session(self, config=None):
+                self.created.append(config)
+                if config.get("model") == "no-such-model":
+                    raise RuntimeError("unknown model")
+                return self.session_factory()
+
+        async def scenario():
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, "config.json")
+                write_json(path, {"model": "gpt-5"})
+
+                host = NativeHost()
+                host._init_loop_state()
+                host.rebuild_debounce = 0
+                host.session_pool_size = 2
+                host.client = BrokenModelClient()
+                host.config_store = ConfigStore(JsonLoader(path), [path])
+                await host._refresh_session()
+                pool, fingerprint = host.pool, host.config_fingerprint
+
+                write_json(path, {"model": "no-such-model"}, bump=1)
+                self.assertEqual(await host._request_rebuild(), "failed")
+                self.assertIs(host.pool, pool)
+                self.assertFalse(pool.closed)
+                self.assertEqual(pool.available, 2)
+                self.assertEqual(host.config_fingerprint, fingerprint)
+
+                # The failed pool does not keep creating sessions in the background
+                await asyncio.sleep(0.05)
+                self.assertEqual(len(host.client.created), 4)
+
+        asyncio.run(scenario())
+
+
+class TestAtomicWrite(unittest.TestCase):
+    def test_failed_write_keeps_old_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "config.json")
+            write_atomic(path, '{"model": "gpt-5"}')
+            with self.assertRaises(TypeError):
+                write_atomic(path, None)
+            with open(path) as f:
+                self.assertEqual(json.load(f), {"model": "gpt-5"})
+            self.assertEqual(os.listdir(tmp), ["config.json"])
+
+
+class TestUpdateConfig(unittest.TestCase):
+    """handle_update_config against a temporary user data directory."""
+
+    def run_host(self, scenario):
+        async def run():
+            with tempfile.TemporaryDirectory() as tmp:
+                with mock.patch.object(dh_native_host, "USER_DATA_DIR", tmp):
+                    host = NativeHost()
+                    host._init_loop_state()
+                    host.session_pool_size = 1
+                    host.client = FakeClient()
+                    host.config_store = ConfigStore(
+                        host._load_session_config,
+                        [
+                            os.path.join(tmp, "config.json"),
+                            os.path.join(tmp, "copilot-instructions.md"),
+                        ],
+                    )
+                    await host._refresh_session()
+                    await scenario(host)
+
+        asyncio.run(run())
+
+    def test_identical_save_keeps_sessions(self):
+        async def scenario(host):
+            payload = {"config": {"model": "gpt-5"}}
+            first = await host.handle_update_config(payload)
+            second = await host.handle_update_config(payload)
+            self.assertTrue(first["success"])
+            self.assertEqual(second["message"], "Configuration unchanged.")
+            self.assertEqual(len(host.client.created), 2)
+
+        self.run_host(scenario)
+
+    def test_host_only_change_keeps_sessions(self):
+        async def scenario(host):
+            await host.handle_update_config({"config": {"model": "gpt-5"}})
+            result = await host.handle_update_config(
+                {"config": {"host": {"max_concurrency": 8}}}
+            )
+            self.assertIn("Session settings unchanged", result["message"])
+            self.assertEqual(len(host.client.created), 2)
+
+        self.run_host(scenario)
+
+    def test_rapid_saves_share_one_rebuild(self):
+        async def scenario(host):
+            client = host.client
+            results = await asyncio.gather(
+                *(
+                    host.handle_update_config({"config": {"model": model}})
+                    for model in ("gpt-4.1", "gpt-5", "claude-sonnet-4")
+                )
+            )
+            self.assertTrue(all(r["success"] for r in results))
+            self.assertEqual(len(client.created), 2)
+            self.assertEqual(client.created[-1]["model"], "claude-sonnet-4")
+
+        self.run_host(scenario)
+
+    def test_instructions_change_rebuilds_sessions_on_same_client(self):
+        async def scenario(host):
+            client = host.client
+            await host.handle_update_config({"system_instructions": "Be brief."})
+            self.assertIs(host.client, client)
+            self.assertEqual(len(client.created), 2)
+            self.assertEqual(
+                client.created[-1]["system_message"]["content"],
+                f"Be brief.\n\n{PiiVault.INSTRUCTIONS}",
+            )
+
+        self.run_host(scenario)
+
+    def test_token_instructions_follow_pseudonymize(self):
+        async def scenario(host):
+            # A user's instructions file replaces the bundled one entirely
+            await host.handle_update_config({"system_instructions": "Be brief."})
+            instructions = host._get_session_config()["system_message"]["content"]
+            self.assertTrue(instructions.startswith("Be brief."))
+            self.assertIn(PiiVault.INSTRUCTIONS, instructions)
+
+            host.pseudonymize = False
+            host.config_store.config = None
+            self.assertEqual(
+                host._get_session_config()["system_message"]["content"], "Be brief."
+            )
+
+        self.run_host(scenario)
+
+
+if __name__ == "__main__":
+    unittest.main()
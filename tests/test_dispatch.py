@@ -0,0 +1,514 @@
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+# Ensure host directory is in path
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "host"))
+
+# Throwaway home for the host's user data; must come before host imports
+from helpers import (
+    FailingSession,
+    FakeClient,
+    FakeSession,
+    SlowSession,
+    TokenEchoSession,
+)
+
+import dh_native_host
+from dh_native_host import NativeHost
+from session_pool import SessionPool
+from result_cache import ResultCache, config_fingerprint, make_key
+
+
+class TestConcurrentDispatch(unittest.TestCase):
+    def test_ping_not_blocked_by_analysis(self):
+        async def scenario():
+            host = NativeHost()
+            host._init_loop_state()
+            host.client = FakeClient()
+            host.pool = SessionPool(lambda: asyncio.sleep(0, SlowSession(0.5)), 1)
+            await host.pool.start()
+
+            sent = []
+            host.send_message = sent.append
+
+            host.dispatch(
+                {
+                    "action": "analyze_error",
+                    "requestId": "slow",
+                    "payload": {"text": "boom"},
+                }
+            )
+            host.dispatch({"action": "ping", "requestId": "fast"})
+
+            await asyncio.sleep(0.1)
+            self.assertEqual([m["requestId"] for m in sent], ["fast"])
+
+            await asyncio.gather(*host.tasks)
+            self.assertEqual([m["requestId"] for m in sent], ["fast", "slow"])
+            return sent[-1]["data"]["saved_to"]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            with mock.patch.object(dh_native_host, "DOWNLOADS_DIR", tmp):
+                saved_to = asyncio.run(scenario())
+            self.assertEqual(os.path.dirname(saved_to), tmp)
+
+    def test_control_lane_skips_a_saturated_work_lane(self):
+        async def scenario():
+            host = NativeHost()
+            host.max_concurrency = 1
+            host.max_queued_analyses = 1
+            host._init_loop_state()
+            host.client = FakeClient()
+            host.cache = None
+            host.pool = SessionPool(lambda: asyncio.sleep(0, SlowSession(0.2)), 1)
+            await host.pool.start()
+
+            sent = []
+            host.send_message = sent.append
+            for n in range(3):
+                host.dispatch(
+                    {
+                        "action": "analyze_error",
+                        "requestId": f"a{n}",
+                        "payload": {"text": f"boom {n}"},
+                    }
+                )
+            await asyncio.sleep(0.05)
+            for action in ("ping", "health_check", "stats"):
+                host.dispatch({"action": action, "requestId": action})
+            await asyncio.sleep(0.05)
+
+            # One analysis runs, one waits, the third is refused
+            replies = {m["requestId"]: m for m in sent}
+            self.assertEqual(replies["a2"]["error"], "busy")
+            self.assertTrue({"ping", "health_check", "stats"} <= set(replies))
+            self.assertNotIn("a0", replies)
+            lane_stats = replies["stats"]["data"]["lanes"]
+            self.assertEqual(lane_stats["work"]["running"], 1)
+            self.assertEqual(lane_stats["work"]["queued"], 1)
+            self.assertEqual(lane_stats["work"]["rejected"], 1)
+
+            await asyncio.gather(*host.tasks)
+            self.assertEqual(sent[-1]["requestId"], "a1")
+            return host.get_stats()["lanes"]
+
+        lane_stats = asyncio.run(scenario())
+        self.assertEqual(lane_stats["control"]["wait"]["count"], 3)
+        self.assertLess(lane_stats["control"]["wait"]["p99_ms"], 5)
+        # The queued analysis waited out the first one
+        self.assertEqual(lane_stats["work"]["wait"]["count"], 2)
+        self.assertGreaterEqual(lane_stats["work"]["wait"]["mean_ms"], 50)
+
+    def test_requests_during_sdk_startup(self):
+        async def scenario():
+            host = NativeHost()
+            host._init_loop_state()
+            host.cache = None
+            started = asyncio.Event()
+
+            async def initialize_sdk():
+                await started.wait()
+                host.client = FakeClient()
+                host.pool = SessionPool(
+                    lambda: asyncio.sleep(0, FakeSession("Re-register the step.")), 1
+                )
+                await host.pool.start()
+                host.sdk_state = "ready"
+
+            host.initialize_sdk = initialize_sdk
+            host.start_sdk_init()
+
+            sent = []
+            host.send_message = sent.append
+            host.dispatch(
+                {
+                    "action": "analyze_error",
+                    "requestId": "analysis",
+                    "payload": {"text": "boom"},
+                }
+            )
+            for action in ("ping", "health_check"):
+                host.dispatch({"action": action, "requestId": action})
+            await asyncio.sleep(0.05)
+
+            # Control messages answer at once; the analysis waits for the SDK
+            replies = {m["requestId"]: m for m in sent}
+            self.assertEqual(set(replies), {"ping", "health_check"})
+            self.assertEqual(replies["ping"]["sdk"], "initializing")
+            self.assertEqual(replies["health_check"]["data"]["status"], "initializing")
+            self.assertFalse(host.init_task.done())
+
+            started.set()
+            await asyncio.gather(*host.tasks)
+            await host.dispatch({"action": "ping", "requestId": "ready"})
+            return {m["requestId"]: m for m in sent}
+
+        replies = asyncio.run(scenario())
+        self.assertEqual(
+            replies["analysis"]["data"]["markdown"], "Re-register the step."
+        )
+        self.assertEqual(replies["ready"]["sdk"], "ready")
+
+    def test_queued_analysis_past_its_budget_is_refused(self):
+        async def scenario():
+            host = NativeHost()
+            host.max_concurrency = 1
+            host._init_loop_state()
+            host.client = FakeClient()
+            host.cache = None
+            session = FakeSession(delay=0.3)
+            host.pool = SessionPool(lambda: asyncio.sleep(0, session), 1)
+            await host.pool.start()
+
+            sent = []
+            host.send_message = sent.append
+            for request_id in ("first", "queued"):
+                host.dispatch(
+                    {
+                        "action": "analyze_error",
+                        "requestId": request_id,
+                        "payload": {"text": f"boom {request_id}"},
+                    }
+                )
+            await asyncio.gather(*host.tasks)
+            return session, {m["requestId"]: m for m in sent}
+
+        with mock.patch.object(dh_native_host, "ANALYSIS_BUDGET_SECONDS", 0.2):
+            session, replies = asyncio.run(scenario())
+        self.assertTrue(replies["first"]["data"]["success"])
+        self.assertEqual(replies["queued"]["error"], "busy")
+        self.assertEqual(session.turns, 1)
+
+    def test_sdk_startup_counts_against_the_budget(self):
+        async def scenario():
+            host = NativeHost()
+            host._init_loop_state()
+            host.cache = None
+            host.client = FakeClient()
+            session = FakeSession()
+            host.pool = SessionPool(lambda: asyncio.sleep(0, session), 1)
+            await host.pool.start()
+            # Startup outlasts the whole budget
+            host.init_task = asyncio.ensure_future(asyncio.sleep(0.3))
+
+            sent = []
+            await host.dispatch(
+                {
+                    "action": "analyze_error",
+                    "requestId": "a",
+                    "payload": {"text": "boom"},
+                },
+                sent.append,
+            )
+            return session, sent[0]["data"]
+
+        with mock.patch.object(dh_native_host, "ANALYSIS_BUDGET_SECONDS", 0.2):
+            session, result = asyncio.run(scenario())
+        self.assertIn("ran out of time", result["error"])
+        self.assertEqual(session.turns, 0)
+
+
+class TestAnalysisCache(unittest.TestCase):
+    def test_repeat_analysis_is_served_from_cache(self):
+        async def scenario():
+            with tempfile.TemporaryDirectory() as tmp:
+                host = NativeHost()
+                host.client = FakeClient()
+                session = FakeSession()
+                host.pool = SessionPool(lambda: asyncio.sleep(0, session), 1)
+                await host.pool.start()
+                host.cache = ResultCache(tmp)
+                host.config_fingerprint = config_fingerprint(host._get_session_config())
+
+                payload = {"text": "Error 500 for user a@b.com", "context": "ctx"}
+                first = await host.handle_analyze_error(payload)
+                second = await host.handle_analyze_error(payload)
+                bypass = await host.handle_analyze_error(
+                    dict(payload, no_cache=True)
+                )
+
+                self.assertFalse(first["cached"])
+                self.assertTrue(second["cached"])
+                self.assertEqual(second["markdown"], first["markdown"])
+                self.assertFalse(bypass["cached"])
+                self.assertEqual(session.turns, 2)
+
+        asyncio.run(scenario())
+
+    def test_pseudonymized_prompts_share_cache_entries(self):
+        async def scenario():
+            with tempfile.TemporaryDirectory() as tmp:
+                host = NativeHost()
+                host.pseudonymize = True
+                host.client = FakeClient()
+                session = TokenEchoSession()
+                host.pool = SessionPool(lambda: asyncio.sleep(0, session), 1)
+                await host.pool.start()
+                host.cache = ResultCache(tmp)
+                host.config_fingerprint = config_fingerprint(host._get_session_config())
+
+                first_id = "550e8400-e29b-41d4-a716-446655440000"
+                second_id = "123e4567-e89b-12d3-a456-426614174000"
+                first = await host.handle_analyze_error(
+                    {"text": f"Plugin failed on {first_id}", "context": ""}
+                )
+                second = await host.handle_analyze_error(
+                    {"text": f"Plugin failed on {second_id}", "context": ""}
+                )
+
+                # The model only ever sees the token; each caller gets its own ID back
+                self.assertEqual(session.prompts, ["Plugin failed on [GUID_1]"])
+                self.assertEqual(first["markdown"], f"Look up {first_id}")
+                self.assertTrue(second["cached"])
+                self.assertEqual(second["markdown"], f"Look up {second_id}")
+
+        asyncio.run(scenario())
+
+    def test_cache_hit_does_not_wait_for_sdk_startup(self):
+        async def scenario():
+            with tempfile.TemporaryDirectory() as tmp:
+                host = NativeHost()
+                host.cache = ResultCache(tmp)
+                fingerprint = config_fingerprint(host._get_session_config())
+                host.cache.put(
+                    make_key("Plugin failed", fingerprint), {"markdown": "Cached."}
+                )
+                # The SDK is still starting, with no client or sessions yet
+                host.init_task = asyncio.ensure_future(asyncio.sleep(10))
+
+                result = await asyncio.wait_for(
+                    host.handle_analyze_error({"text": "Plugin failed", "context": ""}),
+                    timeout=1,
+                )
+                self.assertFalse(host.init_task.done())
+                host.init_task.cancel()
+                return result
+
+        result = asyncio.run(scenario())
+        self.assertTrue(result["cached"])
+        self.assertEqual(result["markdown"], "Cached.")
+
+    def test_answers_from_an_older_config_are_not_cached(self):
+        async def scenario():
+            with tempfile.TemporaryDirectory() as tmp:
+                host = NativeHost()
+                host.client = FakeClient()
+                host.pool = SessionPool(lambda: asyncio.sleep(0, FakeSession()), 1)
+                await host.pool.start()
+                host.cache = ResultCache(tmp)
+                # The sessions were built before the config files changed
+                host.config_fingerprint = "previous-config"
+
+                payload = {"text": "Plugin failed", "context": ""}
+                first = await host.handle_analyze_error(payload)
+                second = await host.handle_analyze_error(payload)
+                return first, second
+
+        first, second = asyncio.run(scenario())
+        self.assertTrue(first["success"])
+        self.assertFalse(second["cached"])
+
+
+class TestCoalescing(unittest.TestCase):
+    def make_host(self, session):
+        host = NativeHost()
+        host.pseudonymize = True
+        host.cache = None
+        host.client = FakeClient()
+        host.pool = SessionPool(lambda: asyncio.sleep(0, session), 2)
+        return host
+
+    def test_identical_analyses_share_one_model_call(self):
+        async def scenario():
+            session = TokenEchoSession(delay=0.1, fail_on="crash")
+            host = self.make_host(session)
+            await host.pool.start()
+
+            first_id = "550e8400-e29b-41d4-a716-446655440000"
+            second_id = "123e4567-e89b-12d3-a456-426614174000"
+            texts = [
+                f"Plugin failed on {first_id}",
+                f"Plugin failed on {second_id}",
+                f"Plugin timed out on {first_id}",
+            ]
+            results = await asyncio.gather(
+                *(
+                    host.handle_analyze_error({"text": text, "context": ""})
+                    for text in texts
+                )
+            )
+            return session, host, results
+
+        session, host, (first, second, other) = asyncio.run(scenario())
+        self.assertEqual(
+            session.prompts,
+            ["Plugin failed on [GUID_1]", "Plugin timed out on [GUID_1]"],
+        )
+        # Same answer, rehydrated with each caller's own values
+        self.assertEqual(
+            first["markdown"], "Look up 550e8400-e29b-41d4-a716-446655440000"
+        )
+        self.assertEqual(
+            second["markdown"], "Look up 123e4567-e89b-12d3-a456-426614174000"
+        )
+        self.assertFalse(first["coalesced"])
+        self.assertTrue(second["coalesced"])
+        self.assertNotIn("send", second["timings"]["stages"])
+        self.assertFalse(other["coalesced"])
+        self.assertEqual(host.metrics.counters["coalesced"], 1)
+        self.assertEqual(host.flights, {})
+
+    def test_errors_are_shared_and_no_cache_opts_out(self):
+        async def scenario():
+            session = TokenEchoSession(delay=0.1, fail_on="crash")
+            host = self.make_host(session)
+            await host.pool.start()
+            payload = {"text": "crash now", "context": ""}
+            results = await asyncio.gather(
+                host.handle_analyze_error(payload),
+                host.handle_analyze_error(payload),
+                host.handle_analyze_error(dict(payload, no_cache=True)),
+            )
+            return session, results
+
+        session, (first, second, fresh) = asyncio.run(scenario())
+        self.assertEqual(len(session.prompts), 2)
+        self.assertIn("session expired", first["error"])
+        self.assertEqual(second["error"], first["error"])
+        self.assertIn("session expired", fresh["error"])
+
+    def test_cancelled_leader_does_not_cancel_followers(self):
+        async def scenario():
+            session = TokenEchoSession(delay=0.1, fail_on="crash")
+            host = self.make_host(session)
+            await host.pool.start()
+            payload = {"text": "Plugin failed", "context": ""}
+            leader = asyncio.ensure_future(host.handle_analyze_error(payload))
+            await asyncio.sleep(0.02)
+            follower = asyncio.ensure_future(host.handle_analyze_error(payload))
+            await asyncio.sleep(0.02)
+            leader.cancel()
+            return session, await follower
+
+        session, result = asyncio.run(scenario())
+        # The follower made its own call once the leader went away
+        self.assertEqual(result["markdown"], "Look up failed")
+        self.assertFalse(result["coalesced"])
+        self.assertEqual(len(session.prompts), 2)
+
+
+class TestCancel(unittest.TestCase):
+    def test_cancel_aborts_the_turn_and_frees_the_session(self):
+        async def scenario():
+            host = NativeHost()
+            host.max_concurrency = 1
+            host._init_loop_state()
+            host.client = FakeClient()
+            host.cache = None
+            created = []
+
+            async def create_session():
+                created.append(FakeSession(delay=10))
+                return created[-1]
+
+            host.pool = SessionPool(create_session, 1)
+            await host.pool.start()
+
+            sent = []
+            host.send_message = sent.append
+            for request_id in ("slow", "queued"):
+                host.dispatch(
+                    {
+                        "action": "analyze_error",
+                        "requestId": request_id,
+                        "payload": {"text": f"boom {request_id}"},
+                    }
+                )
+            await asyncio.sleep(0.05)
+
+            # Cancel the queued one, then the one holding the session
+            for target in ("queued", "slow", "gone"):
+                await host.dispatch(
+                    {
+                        "action": "cancel",
+                        "requestId": f"cancel-{target}",
+                        "payload": {"requestId": target},
+                    }
+                )
+            await asyncio.sleep(0)
+            return host, created, sent
+
+        host, created, sent = asyncio.run(scenario())
+        self.assertEqual(
+            [(m["requestId"], m["status"]) for m in sent],
+            [
+                ("queued", "cancelled"),
+                ("cancel-queued", "success"),
+                ("slow", "cancelled"),
+                ("cancel-slow", "success"),
+                ("cancel-gone", "success"),
+            ],
+        )
+        self.assertTrue(sent[3]["data"]["cancelled"])
+        self.assertFalse(sent[4]["data"]["cancelled"])
+
+        # The turn was aborted and the same session is ready again
+        self.assertEqual(created[0].aborts, 1)
+        self.assertEqual(len(created), 1)
+        self.assertEqual(host.pool.available, 1)
+        self.assertEqual(host.requests, {})
+        stats = host.metrics.snapshot()["requests"]
+        self.assertEqual(host.metrics.requests[("analyze_error", "cancelled")], 2)
+        self.assertEqual(stats["cancel"]["count"], 3)
+
+
+class TestAuthCheck(unittest.TestCase):
+    def make_host(self, client, session):
+        host = NativeHost()
+        host.cache = None
+        host.client = client
+        host.pool = SessionPool(lambda: asyncio.sleep(0, session), 1)
+        return host
+
+    def test_auth_is_checked_once_across_analyses(self):
+        async def scenario():
+            client = FakeClient()
+            host = self.make_host(client, FakeSession())
+            await host.pool.start()
+            for _ in range(3):
+                result = await host.handle_analyze_error({"text": "boom"})
+                self.assertTrue(result["success"])
+            self.assertEqual(client.auth_checks, 1)
+
+        asyncio.run(scenario())
+
+    def test_unauthenticated_fails_fast(self):
+        async def scenario():
+            client = FakeClient(authenticated=False)
+            session = FakeSession()
+            host = self.make_host(client, session)
+            await host.pool.start()
+            result = await host.handle_analyze_error({"text": "boom"})
+            self.assertIn("not authenticated", result["error"])
+            self.assertEqual(session.turns, 0)
+
+        asyncio.run(scenario())
+
+    def test_failed_turn_invalidates_auth(self):
+        async def scenario():
+            client = FakeClient()
+            host = self.make_host(client, FailingSession())
+            await host.pool.start()
+            result = await host.handle_analyze_error({"text": "boom"})
+            self.assertIn("session expired", result["error"])
+            self.assertFalse(host.auth.fresh)
+
+        asyncio.run(scenario())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,246 @@
+import asyncio
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+# Ensure host directory is in path
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "host"))
+
+# Throwaway home for the host's user data; must come before host imports
+import helpers  # noqa: F401
+
+import framing
+from dh_native_host import NativeHost
+from framing import ChunkAssembler
+from history_store import HistoryStore
+from outbound import FrameWriter
+
+# Quotes, backslashes and non-ASCII all grow when escaped
+LARGE_ANSWER = ('Step "1": C:\\Temp\\plugin.dll — réessayez.\n' * 60000)[:2_500_000]
+
+
+def split_frames(data):
+    frames = []
+    offset = 0
+    while offset < len(data):
+        (length,) = framing.HEADER.unpack_from(data, offset)
+        offset += framing.HEADER.size
+        frames.append(data[offset : offset + length])
+        offset += length
+    return frames
+
+
+class TestChunkedFraming(unittest.TestCase):
+    def test_small_message_is_one_frame(self):
+        message = {"requestId": "r1", "status": "success", "data": "pong"}
+        self.assertEqual(
+            framing.encode_frames(message, chunked=True),
+            [framing.encode_frame(message)],
+        )
+
+    def test_large_message_round_trips(self):
+        message = {"requestId": "r1", "status": "success", "data": LARGE_ANSWER}
+        frames = framing.encode_frames(message, chunked=True)
+        # Built one by one as they are written, not all up front
+        self.assertIs(iter(frames), frames)
+        frames = list(frames)
+        self.assertGreater(len(frames), 1)
+
+        assembler = ChunkAssembler()
+        results = []
+        for frame in frames:
+            self.assertLessEqual(len(frame), framing.MAX_MESSAGE_BYTES)
+            results.append(assembler.add(json.loads(frame[framing.HEADER.size :])))
+
+        self.assertEqual(results[:-1], [None] * (len(frames) - 1))
+        self.assertEqual(results[-1], message)
+        self.assertEqual(assembler.pending, {})
+
+    def test_without_opt_in_an_error_is_sent(self):
+        message = {"requestId": "r1", "status": "success", "data": LARGE_ANSWER}
+        (frame,) = framing.encode_frames(message)
+        reply = json.loads(frame[framing.HEADER.size :])
+        self.assertEqual(reply["requestId"], "r1")
+        self.assertEqual(reply["error"], "response_too_large")
+
+    def chunks(self, request_id="r1"):
+        body = json.dumps({"requestId": request_id, "data": "x" * 100}).encode()
+        return [
+            json.loads(frame[framing.HEADER.size :])
+            for frame in framing.iter_chunk_frames(request_id, body, chunk_bytes=40)
+        ]
+
+    def test_interleaved_requests_are_kept_apart(self):
+        assembler = ChunkAssembler()
+        done = []
+        for a, b in zip(self.chunks("a"), self.chunks("b")):
+            done += [m for m in (assembler.add(a), assembler.add(b)) if m]
+        self.assertEqual([m["requestId"] for m in done], ["a", "b"])
+
+    def test_gap_is_rejected(self):
+        chunks = self.chunks()
+        assembler = ChunkAssembler()
+        assembler.add(chunks[0])
+        with self.assertRaises(ValueError):
+            assembler.add(chunks[2])
+        self.assertEqual(assembler.pending, {})
+
+    def test_corrupt_chunk_is_rejected(self):
+        chunk = self.chunks()[0]
+        chunk["data"] = chunk["data"].replace("x", "y")
+        with self.assertRaises(ValueError):
+            ChunkAssembler().add(chunk)
+
+    def test_other_messages_pass_through(self):
+        message = {"requestId": "r1", "type": "partial", "data": {"delta": "a"}}
+        self.assertIs(ChunkAssembler().add(message), message)
+
+
+def frames_bytes(messages):
+    return b"".join(framing.encode_frame(m) for m in messages)
+
+
+MESSAGES = [{"action": "ping", "requestId": str(n), "pad": "é" * n * 300} for n in range(20)]
+
+
+class TestFrameDecoder(unittest.TestCase):
+    def test_any_split_of_the_stream_decodes_the_same(self):
+        data = frames_bytes(MESSAGES)
+        for step in (1, 3, 4, 1000, len(data)):
+            decoder = framing.FrameDecoder()
+            decoded = []
+            for offset in range(0, len(data), step):
+                decoded += decoder.feed(data[offset : offset + step])
+            self.assertEqual(decoded, MESSAGES)
+            self.assertEqual(decoder.pending, 0)
+
+    def test_empty_and_malformed_frames_are_skipped(self):
+        data = (
+            framing.HEADER.pack(0)
+            + framing.HEADER.pack(5)
+            + b"{oops"
+            + framing.encode_frame({"ok": True})
+        )
+        decoder = framing.FrameDecoder()
+        self.assertEqual(decoder.feed(data), [{"ok": True}])
+
+    def test_partial_frame_is_held_back(self):
+        frame = framing.encode_frame({"ok": True})
+        decoder = framing.FrameDecoder()
+        self.assertEqual(decoder.feed(frame[:-1]), [])
+        self.assertEqual(decoder.pending, len(frame) - 1)
+
+    def test_oversized_frame_is_rejected(self):
+        decoder = framing.FrameDecoder(max_frame_bytes=10)
+        with self.assertRaises(ValueError):
+            decoder.feed(framing.HEADER.pack(11))
+
+
+class TestReadFrame(unittest.TestCase):
+    def test_short_reads_and_eof(self):
+        async def scenario():
+            reader = asyncio.StreamReader()
+            data = frames_bytes(MESSAGES[:3]) + framing.HEADER.pack(0) + b"\x10\x00"
+            for offset in range(0, len(data), 7):
+                reader.feed_data(data[offset : offset + 7])
+            reader.feed_eof()
+            return [await framing.read_frame(reader) for _ in range(4)]
+
+        *messages, eof = asyncio.run(scenario())
+        self.assertEqual(messages, MESSAGES[:3])
+        self.assertIsNone(eof)
+
+    def test_oversized_frame_is_rejected_before_its_body(self):
+        async def scenario():
+            reader = asyncio.StreamReader()
+            # Only the header arrives; the body is never waited for
+            reader.feed_data(framing.HEADER.pack(framing.MAX_INBOUND_BYTES + 1))
+            with self.assertRaises(ValueError):
+                await asyncio.wait_for(framing.read_frame(reader), 1)
+            reader.feed_data(framing.HEADER.pack(11))
+            with self.assertRaises(ValueError):
+                await framing.read_frame(reader, max_frame_bytes=10)
+
+        asyncio.run(scenario())
+
+
+class TestStdinReader(unittest.TestCase):
+    """NativeHost.read_stdin on a real pipe, written in uneven pieces."""
+
+    def read_through_pipe(self, read):
+        data = frames_bytes(MESSAGES)
+        read_fd, write_fd = os.pipe()
+
+        def write():
+            with os.fdopen(write_fd, "wb", buffering=0) as f:
+                for offset in range(0, len(data), 777):
+                    f.write(data[offset : offset + 777])
+
+        async def scenario():
+            host = NativeHost()
+            host.loop = asyncio.get_running_loop()
+            received = []
+            host.dispatch = received.append
+            writer = threading.Thread(target=write)
+            writer.start()
+            await read(host)
+            writer.join()
+            return received
+
+        with os.fdopen(read_fd, "rb", buffering=0) as stdin_buffer:
+            stdin = mock.Mock(buffer=stdin_buffer, fileno=stdin_buffer.fileno)
+            with mock.patch.object(sys, "stdin", stdin):
+                return asyncio.run(scenario())
+
+    @unittest.skipIf(os.name == "nt", "stdin is read on a thread on Windows")
+    def test_event_loop_reader(self):
+        self.assertEqual(self.read_through_pipe(NativeHost.read_stdin), MESSAGES)
+
+    def test_thread_reader(self):
+        self.assertEqual(
+            self.read_through_pipe(NativeHost._read_stdin_on_thread), MESSAGES
+        )
+
+
+class TestHostChunking(unittest.TestCase):
+    def test_large_response_reaches_stdout_in_chunks(self):
+        async def scenario():
+            with tempfile.TemporaryDirectory() as tmp:
+                host = NativeHost()
+                host.history = HistoryStore(os.path.join(tmp, "history.db"))
+                analysis_id = host.history.add("Plugin failed", LARGE_ANSWER)
+                stream = io.BytesIO()
+                host.writer = FrameWriter(stream)
+                host.writer.start()
+
+                for request_id, chunked in (("plain", False), ("parts", True)):
+                    await host.process_message(
+                        {
+                            "action": "get_analysis",
+                            "requestId": request_id,
+                            "payload": {"id": analysis_id, "chunked": chunked},
+                        }
+                    )
+                host.writer.close()
+                host._close_history()
+                return split_frames(stream.getvalue()), host
+
+        frames, host = asyncio.run(scenario())
+        assembler = ChunkAssembler()
+        replies = [assembler.add(json.loads(frame)) for frame in frames]
+        replies = [reply for reply in replies if reply]
+
+        too_large, chunked = replies
+        self.assertEqual(too_large["error"], "response_too_large")
+        self.assertEqual(chunked["requestId"], "parts")
+        self.assertEqual(chunked["data"]["response"], LARGE_ANSWER)
+        self.assertEqual(host.chunked_requests, set())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,179 @@
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+
+# Ensure host directory is in path
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "host"))
+
+# Throwaway home for the host's user data; must come before host imports
+import helpers
+from helpers import FakeClient, TokenEchoSession, session_pool
+
+from dh_native_host import NativeHost
+from history_store import HistoryStore, fts_query
+
+
+class TestHistoryStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "history.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def open(self, **kwargs):
+        store = HistoryStore(self.path, **kwargs)
+        self.addCleanup(store.close)
+        return store
+
+    def test_add_and_get(self):
+        store = self.open()
+        analysis_id = store.add(
+            "Error 0x80040216 for [EMAIL_1]", "Check the plugin.", context="Case"
+        )
+        record = store.get(analysis_id)
+        self.assertEqual(record["prompt"], "Error 0x80040216 for [EMAIL_1]")
+        self.assertEqual(record["response"], "Check the plugin.")
+        self.assertEqual(record["context"], "Case")
+        self.assertFalse(record["cached"])
+        self.assertIsNone(store.get(analysis_id + 1))
+
+    def test_search_matches_prompt_and_response(self):
+        store = self.open()
+        first = store.add("Plugin Microsoft.Crm.Sales failed", "Re-register the step.")
+        second = store.add("SQL timeout 0x80040216", "Add an index on account.")
+        store.add("Throttled with 429", "Back off and retry.")
+
+        self.assertEqual([r["id"] for r in store.search("Microsoft.Crm")], [first])
+        self.assertEqual([r["id"] for r in store.search("0x80040216")], [second])
+        self.assertEqual([r["id"] for r in store.search("index account")], [second])
+        # The last word is a prefix
+        self.assertEqual([r["id"] for r in store.search("re-reg")], [first])
+        self.assertEqual(store.search("nothing-like-this"), [])
+        self.assertEqual(len(store.search("")), 3)
+
+    def test_query_syntax_is_neutralized(self):
+        self.assertEqual(fts_query('say "hi" OR'), '"say" """hi""" "OR"*')
+        store = self.open()
+        store.add('a "quoted" (thing) AND NOT', "x")
+        self.assertEqual(len(store.search('"quoted" (thing) AND NOT')), 1)
+
+    def test_unindexed_fallback(self):
+        store = self.open()
+        store.fts = False
+        store.add("Plugin failed", "Re-register the step.")
+        self.assertEqual(len(store.search("register")), 1)
+
+    def test_size_retention_drops_oldest(self):
+        store = self.open(max_bytes=250)
+        ids = [store.add("p" * 50, "r" * 50) for _ in range(5)]
+        self.assertLessEqual(store.total_bytes, 250)
+        self.assertIsNone(store.get(ids[0]))
+        self.assertIsNotNone(store.get(ids[-1]))
+        self.assertEqual([r["id"] for r in store.search("")], ids[:-3:-1])
+
+    def test_age_retention(self):
+        store = self.open()
+        old = store.add("old", "answer")
+        store.max_age_seconds = -1
+        store.prune()
+        self.assertIsNone(store.get(old))
+        self.assertEqual(store.total_bytes, 0)
+        self.assertEqual(store.search("old"), [])
+
+    def test_entries_survive_reopening(self):
+        store = HistoryStore(self.path)
+        analysis_id = store.add("persisted", "answer")
+        store.close()
+        store = self.open()
+        self.assertEqual(store.get(analysis_id)["prompt"], "persisted")
+        self.assertGreater(store.total_bytes, 0)
+
+    def test_markdown_export_follows_retention(self):
+        export_dir = os.path.join(self.tmp.name, "history")
+        store = self.open(export_dir=export_dir)
+        analysis_id = store.add("Plugin failed", "Re-register the step.")
+        path = os.path.join(export_dir, f"{analysis_id}.md")
+        with open(path, encoding="utf-8") as f:
+            self.assertIn("Re-register the step.", f.read())
+
+        store.max_age_seconds = -1
+        store.prune()
+        self.assertFalse(os.path.exists(path))
+
+
+class TestHistoryActions(unittest.TestCase):
+    def test_search_and_get_actions(self):
+        async def scenario():
+            with tempfile.TemporaryDirectory() as tmp:
+                host = NativeHost()
+                host.history = HistoryStore(os.path.join(tmp, "history.db"))
+                analysis_id = host.history.add("SQL timeout", "Add an index.")
+
+                sent = []
+                await host.process_message(
+                    {
+                        "action": "search_history",
+                        "requestId": "s",
+                        "payload": {"query": "timeout"},
+                    },
+                    sent.append,
+                )
+                await host.process_message(
+                    {
+                        "action": "get_analysis",
+                        "requestId": "g",
+                        "payload": {"id": analysis_id},
+                    },
+                    sent.append,
+                )
+                await host.process_message(
+                    {"action": "get_analysis", "requestId": "x", "payload": {}},
+                    sent.append,
+                )
+                host._close_history()
+
+                search, get, missing = (m["data"] for m in sent)
+                self.assertEqual([r["id"] for r in search["results"]], [analysis_id])
+                self.assertIn("took_ms", search)
+                self.assertEqual(get["response"], "Add an index.")
+                self.assertIn("error", missing)
+
+        asyncio.run(scenario())
+
+    def test_concurrent_analyses_replace_the_saved_file_whole(self):
+        async def scenario():
+            with tempfile.TemporaryDirectory() as tmp:
+                host = NativeHost()
+                host.cache = None
+                host.history = HistoryStore(os.path.join(tmp, "history.db"))
+                host.client = FakeClient()
+                host.pool = session_pool(TokenEchoSession(delay=0.02), size=2)
+                await host.pool.start()
+                results = await asyncio.gather(
+                    *(
+                        host.handle_analyze_error({"text": text, "context": ""})
+                        for text in ("Plugin A failed", "Plugin B failed")
+                    )
+                )
+                host._close_history()
+                return results
+
+        first, second = asyncio.run(scenario())
+        self.assertEqual(first["saved_to"], second["saved_to"])
+        self.assertEqual(os.path.basename(first["saved_to"]), "dh_error_analysis.md")
+        self.assertTrue(first["saved_to"].startswith(helpers.TEST_HOME))
+        # One analysis, written whole, and no temp files left behind
+        with open(first["saved_to"], encoding="utf-8") as f:
+            saved = f.read()
+        self.assertEqual(saved.count("## AI Explanation"), 1)
+        self.assertTrue(first["markdown"] in saved or second["markdown"] in saved)
+        downloads = os.path.dirname(first["saved_to"])
+        self.assertFalse([n for n in os.listdir(downloads) if n.endswith(".tmp")])
+        # Every analysis is still in history
+        self.assertNotEqual(first["analysis_id"], second["analysis_id"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+import json
+import logging
+import os
+import sys
+import tempfile
+import unittest
+
+# Ensure host directory is in path
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "host"))
+
+import host_logging
+from host_logging import Payload
+
+
+class CountingBody:
+    """Message body that records how often it is rendered."""
+
+    def __init__(self):
+        self.renders = 0
+
+    def __str__(self):
+        self.renders += 1
+        return "body"
+
+
+class TestHostLogging(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "native_host.log")
+
+        root = logging.getLogger()
+        saved_handlers, saved_level = root.handlers[:], root.level
+        root.handlers = []
+
+        def restore():
+            for handler in root.handlers:
+                handler.close()
+            root.handlers = saved_handlers
+            root.setLevel(saved_level)
+
+        self.addCleanup(restore)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def configure(self, **kwargs):
+        listener = host_logging.configure(self.path, **kwargs)
+        self.addCleanup(listener.stop)
+        return listener
+
+    def read_records(self, listener, path=None):
+        # Stopping the listener drains the queue
+        listener.stop()
+        with open(path or self.path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+    def test_records_are_json_lines_with_request_id(self):
+        listener = self.configure()
+        token = host_logging.request_id.set("req-1")
+        try:
+            logging.info("Handled ping", extra={"action": "ping", "duration_ms": 1.5})
+        finally:
+            host_logging.request_id.reset(token)
+        logging.warning("Outside a request")
+
+        first, second = self.read_records(listener)
+        self.assertEqual(first["msg"], "Handled ping")
+        self.assertEqual(first["requestId"], "req-1")
+        self.assertEqual(first["action"], "ping")
+        self.assertEqual(first["duration_ms"], 1.5)
+        self.assertEqual(first["level"], "INFO")
+        self.assertNotIn("requestId", second)
+
+    def test_payload_is_not_rendered_below_the_level(self):
+        listener = self.configure(level="INFO")
+        body = CountingBody()
+        logging.debug("Sending message: %s", Payload(body))
+        logging.info("Sending message: %s", Payload(body))
+
+        records = self.read_records(listener)
+        self.assertEqual(body.renders, 1)
+        self.assertEqual([r["msg"] for r in records], ["Sending message: body"])
+
+    def test_payload_is_clipped(self):
+        text = str(Payload({"text": "x" * (host_logging.MAX_PAYLOAD_CHARS * 2)}))
+        self.assertLess(len(text), host_logging.MAX_PAYLOAD_CHARS + 50)
+        self.assertTrue(text.endswith("chars)"))
+        self.assertEqual(str(Payload(b'{"a": 1}')), '{"a": 1}')
+
+    def test_traceback_is_its_own_field(self):
+        listener = self.configure()
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logging.exception("Failed")
+
+        (record,) = self.read_records(listener)
+        self.assertEqual(record["msg"], "Failed")
+        self.assertIn("ValueError: boom", record["exc"])
+
+    def test_file_rotates_by_size(self):
+        listener = self.configure(max_bytes=2000, backup_count=2)
+        for n in range(100):
+            logging.info(f"line {n}")
+        listener.stop()
+
+        names = sorted(os.listdir(self.tmp.name))
+        self.assertEqual(
+            names, ["native_host.log", "native_host.log.1", "native_host.log.2"]
+        )
+        for name in names:
+            self.assertLessEqual(os.path.getsize(os.path.join(self.tmp.name, name)), 2000)
+
+    def test_level_names(self):
+        self.assertEqual(host_logging.parse_level("debug"), logging.DEBUG)
+        self.assertEqual(host_logging.parse_level(logging.ERROR), logging.ERROR)
+        self.assertEqual(host_logging.parse_level("nonsense"), logging.INFO)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,157 @@
+import asyncio
+import os
+import sys
+import unittest
+
+# Ensure host directory is in path
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "host"))
+
+# Throwaway home for the host's user data; must come before host imports
+from helpers import FakeClient, FakeSession, session_pool
+
+from dh_native_host import NativeHost
+from latency import MAX_TIMEOUT_SECONDS, LatencyTracker
+
+
+class TestLatencyTracker(unittest.TestCase):
+    def test_ceiling_until_enough_samples(self):
+        tracker = LatencyTracker(min_samples=5)
+        for _ in range(4):
+            tracker.observe(1.0)
+        self.assertEqual(tracker.timeout(), MAX_TIMEOUT_SECONDS)
+        self.assertIsNone(tracker.hedge_delay())
+
+        tracker.observe(1.0)
+        self.assertEqual(tracker.hedge_delay(), 1.0)
+
+    def test_timeout_follows_p99_within_bounds(self):
+        tracker = LatencyTracker(min_samples=10, min_timeout=5)
+        for n in range(100):
+            tracker.observe(10.0 + n * 0.1)
+        self.assertAlmostEqual(tracker.quantile(0.5), 15.0)
+        self.assertAlmostEqual(tracker.timeout(), 19.9 * 3)
+
+        fast = LatencyTracker(min_samples=10, min_timeout=5)
+        for _ in range(10):
+            fast.observe(0.1)
+        self.assertEqual(fast.timeout(), 5)
+
+        slow = LatencyTracker(min_samples=10)
+        for _ in range(10):
+            slow.observe(200.0)
+        self.assertEqual(slow.timeout(), MAX_TIMEOUT_SECONDS)
+
+    def test_window_keeps_recent_turns(self):
+        tracker = LatencyTracker(window=10, min_samples=10)
+        for _ in range(10):
+            tracker.observe(100.0)
+        for _ in range(10):
+            tracker.observe(1.0)
+        self.assertEqual(tracker.quantile(0.99), 1.0)
+        self.assertEqual(tracker.stats()["samples"], 10)
+
+    def test_timeouts_counted_at_their_timeout_do_not_shrink_it(self):
+        tracker = LatencyTracker(min_samples=10, min_timeout=5)
+        for _ in range(10):
+            tracker.observe(0.1)
+        previous = tracker.timeout()
+        for _ in range(50):
+            tracker.observe(tracker.timeout())
+            self.assertGreaterEqual(tracker.timeout(), previous)
+            previous = tracker.timeout()
+        self.assertEqual(previous, MAX_TIMEOUT_SECONDS)
+
+
+class TestTurnLatency(unittest.TestCase):
+    def make_host(self, sessions, fast_turns=0.05):
+        host = NativeHost()
+        host.cache = None
+        host.client = FakeClient()
+        host.pool = session_pool(*sessions)
+        host.turn_latency = LatencyTracker(min_samples=5, min_timeout=0.3)
+        for _ in range(5):
+            host.turn_latency.observe(fast_turns)
+        return host
+
+    def test_timeout_follows_observed_latency(self):
+        async def scenario():
+            host = self.make_host([FakeSession("late", delay=10)])
+            await host.pool.start()
+            return host, await host.handle_analyze_error({"text": "boom"})
+
+        host, result = asyncio.run(scenario())
+        self.assertIn("timed out", result["error"])
+        # Far below the 300 second ceiling (turns get at least one second)
+        self.assertLess(result["timings"]["stages"]["send"], 2000)
+        self.assertEqual(host.metrics.counters["timeouts"], 1)
+        # Recorded at the time it was given, so it cannot pull the timeout down
+        self.assertEqual(max(host.turn_latency.samples), 1.0)
+        self.assertGreaterEqual(host.turn_latency.timeout(), 0.3)
+
+    def test_slow_turn_is_hedged_on_a_second_session(self):
+        async def scenario():
+            slow = FakeSession("slow", delay=0.25)
+            fast = FakeSession("fast", delay=0.02)
+            host = self.make_host([slow, fast])
+            host.hedge_requests = True
+            await host.pool.start()
+            result = await host.handle_analyze_error({"text": "boom"})
+            await asyncio.sleep(0)
+            return host, slow, result
+
+        host, slow, result = asyncio.run(scenario())
+        self.assertEqual(result["markdown"], "fast")
+        self.assertEqual(host.metrics.counters["hedged"], 1)
+        self.assertEqual(host.metrics.counters["hedge_wins"], 1)
+        # The losing turn was aborted and its session kept
+        self.assertEqual(slow.aborts, 1)
+        self.assertEqual(host.pool.available, 2)
+        # Both the winner and the cancelled loser were recorded
+        self.assertEqual(len(host.turn_latency.samples), 7)
+        self.assertGreater(max(host.turn_latency.samples), 0.05)
+
+    def test_cancel_replies_after_both_hedged_turns_are_aborted(self):
+        async def scenario():
+            sessions = [FakeSession(delay=10), FakeSession(delay=10)]
+            host = self.make_host(sessions)
+            host.hedge_requests = True
+            host._init_loop_state()
+            await host.pool.start()
+
+            sent = []
+            host.send_message = sent.append
+            host.dispatch(
+                {
+                    "action": "analyze_error",
+                    "requestId": "a",
+                    "payload": {"text": "boom"},
+                }
+            )
+            await asyncio.sleep(0.2)
+            await host.dispatch(
+                {"action": "cancel", "requestId": "c", "payload": {"requestId": "a"}}
+            )
+            # Checked right after the reply, without yielding to the loop
+            return host, sessions, sent
+
+        host, sessions, sent = asyncio.run(scenario())
+        self.assertEqual(host.metrics.counters["hedged"], 1)
+        self.assertEqual([m["status"] for m in sent], ["cancelled", "success"])
+        self.assertEqual([session.aborts for session in sessions], [1, 1])
+        self.assertEqual(host.pool.available, 2)
+
+    def test_fast_turn_is_not_hedged(self):
+        async def scenario():
+            host = self.make_host([FakeSession("quick", delay=0.01)])
+            host.hedge_requests = True
+            await host.pool.start()
+            return host, await host.handle_analyze_error({"text": "boom"})
+
+        host, result = asyncio.run(scenario())
+        self.assertEqual(result["markdown"], "quick")
+        self.assertNotIn("hedged", host.metrics.counters)
+        self.assertEqual(host.get_stats()["turns"]["samples"], 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+# Ensure host directory is in path
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "host"))
+
+# Throwaway home for the host's user data; must come before host imports
+import helpers  # noqa: F401
+
+import dh_native_host
+from dh_native_host import NativeHost
+from metrics import Histogram, Metrics
+
+
+def samples(text):
+    """name{labels} -> value for every sample line of an exposition."""
+    result = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            result[name] = float(value)
+    return result
+
+
+class TestMetrics(unittest.TestCase):
+    def test_quantiles_fall_in_the_right_bucket(self):
+        histogram = Histogram()
+        for _ in range(90):
+            histogram.observe(0.003)
+        for _ in range(10):
+            histogram.observe(2.0)
+        self.assertTrue(0.001 <= histogram.quantile(0.5) <= 0.005)
+        self.assertTrue(1.0 <= histogram.quantile(0.95) <= 2.5)
+        self.assertEqual(Histogram().quantile(0.5), 0.0)
+
+    def test_exposition(self):
+        m = Metrics()
+        m.observe("ping", "success", 0.0004)
+        m.observe("ping", "success", 0.2)
+        m.observe("analyze_error", "error", 400.0)
+        m.inc("timeouts")
+        m.inc("scrubbed_chars", 1200)
+
+        text = m.render({"in_flight": 2})
+        values = samples(text)
+        self.assertEqual(
+            values['dynamics_helper_requests_total{action="ping",outcome="success"}'], 2
+        )
+        bucket = 'dynamics_helper_request_duration_seconds_bucket{action="ping",le="%s"}'
+        self.assertEqual(values[bucket % "0.001"], 1)
+        self.assertEqual(values[bucket % "0.25"], 2)
+        self.assertEqual(values[bucket % "+Inf"], 2)
+        self.assertEqual(
+            values[
+                'dynamics_helper_request_duration_seconds_bucket'
+                '{action="analyze_error",le="300.0"}'
+            ],
+            0,
+        )
+        self.assertEqual(values["dynamics_helper_timeouts_total"], 1)
+        self.assertEqual(values["dynamics_helper_scrubbed_chars_total"], 1200)
+        self.assertEqual(values["dynamics_helper_in_flight"], 2)
+        self.assertIn("# TYPE dynamics_helper_request_duration_seconds histogram", text)
+
+    def test_lane_waits(self):
+        m = Metrics()
+        m.observe_wait("control", 0.0002)
+        m.observe_wait("work", 3.0)
+        values = samples(m.render())
+        bucket = 'dynamics_helper_lane_wait_seconds_bucket{lane="%s",le="%s"}'
+        self.assertEqual(values[bucket % ("control", "0.001")], 1)
+        self.assertEqual(values[bucket % ("work", "2.5")], 0)
+        self.assertEqual(values['dynamics_helper_lane_wait_seconds_count{lane="work"}'], 1)
+        self.assertEqual(m.snapshot()["lane_waits"]["work"]["count"], 1)
+
+    def test_snapshot(self):
+        m = Metrics()
+        m.observe("ping", "success", 0.002)
+        m.observe("ping", "error", 0.002)
+        stats = m.snapshot({"in_flight": 0})
+        self.assertEqual(stats["requests"]["ping"]["count"], 2)
+        self.assertEqual(stats["requests"]["ping"]["errors"], 1)
+        self.assertEqual(stats["gauges"], {"in_flight": 0})
+
+
+class TestStatsAction(unittest.TestCase):
+    def test_requests_are_counted(self):
+        async def scenario():
+            host = NativeHost()
+            host._init_loop_state()
+            sent = []
+            for action in ("ping", "ping", "no_such_action", "stats"):
+                await host.dispatch({"action": action, "requestId": action}, sent.append)
+            return host, sent[-1]["data"]
+
+        host, stats = asyncio.run(scenario())
+        self.assertEqual(stats["requests"]["ping"]["count"], 2)
+        self.assertEqual(stats["requests"]["unknown"]["errors"], 1)
+        self.assertNotIn("no_such_action", stats["requests"])
+        # The stats request itself is still in flight
+        self.assertEqual(stats["gauges"]["in_flight"], 1)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "dynamics_helper.prom")
+            with mock.patch.object(dh_native_host, "METRICS_FILE", path):
+                host._write_metrics()
+            with open(path) as f:
+                values = samples(f.read())
+        self.assertEqual(
+            values['dynamics_helper_requests_total{action="stats",outcome="success"}'], 1
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+import io
+import json
+import os
+import sys
+import threading
+import time
+import unittest
+
+# Ensure host directory is in path
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "host"))
+
+# Throwaway home for the host's user data; must come before host imports
+import helpers  # noqa: F401
+
+import framing
+from dh_native_host import NativeHost
+from outbound import FrameWriter
+
+
+class RecordingStream(io.BytesIO):
+    """Binary stream that counts writes and can be made slow or broken."""
+
+    def __init__(self, delay=0, broken=False):
+        super().__init__()
+        self.delay = delay
+        self.broken = broken
+        self.writes = 0
+
+    def write(self, data):
+        if self.broken:
+            raise BrokenPipeError("pipe closed")
+        time.sleep(self.delay)
+        self.writes += 1
+        return super().write(data)
+
+
+def decode_frames(data):
+    messages = []
+    offset = 0
+    while offset < len(data):
+        (length,) = framing.HEADER.unpack_from(data, offset)
+        offset += framing.HEADER.size
+        messages.append(json.loads(data[offset : offset + length]))
+        offset += length
+    return messages
+
+
+class TestFrameWriter(unittest.TestCase):
+    def test_frames_are_written_whole_and_in_order(self):
+        stream = RecordingStream()
+        writer = FrameWriter(stream)
+        writer.start()
+        for n in range(50):
+            writer.put(framing.encode_frame({"n": n}))
+        writer.close()
+
+        self.assertEqual(stream.writes, 50)
+        self.assertEqual([m["n"] for m in decode_frames(stream.getvalue())], list(range(50)))
+        stats = writer.stats()
+        self.assertEqual(stats["frames"], 50)
+        self.assertEqual(stats["bytes"], len(stream.getvalue()))
+        self.assertEqual(stats["queued"], 0)
+
+    def test_lazy_frames_are_built_on_the_writer_thread(self):
+        stream = RecordingStream()
+        writer = FrameWriter(stream)
+        built = []
+
+        def frames():
+            for n in range(3):
+                built.append(threading.current_thread().name)
+                yield framing.encode_frame({"n": n})
+
+        writer.put_frames(frames())
+        writer.put(framing.encode_frame({"n": 3}))
+        self.assertEqual(built, [])
+        writer.start()
+        writer.close()
+
+        self.assertEqual(built, ["frame-writer"] * 3)
+        messages = decode_frames(stream.getvalue())
+        self.assertEqual([m["n"] for m in messages], [0, 1, 2, 3])
+        self.assertEqual(writer.stats()["frames"], 4)
+
+    def test_concurrent_senders_never_interleave(self):
+        stream = RecordingStream()
+        writer = FrameWriter(stream)
+        writer.start()
+
+        def send(sender):
+            for n in range(100):
+                writer.put(framing.encode_frame({"sender": sender, "n": n, "pad": "x" * n}))
+
+        threads = [threading.Thread(target=send, args=(s,)) for s in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        writer.close()
+
+        messages = decode_frames(stream.getvalue())
+        self.assertEqual(len(messages), 400)
+        for sender in range(4):
+            self.assertEqual(
+                [m["n"] for m in messages if m["sender"] == sender], list(range(100))
+            )
+
+    def test_slow_reader_does_not_block_senders(self):
+        stream = RecordingStream(delay=0.05)
+        writer = FrameWriter(stream)
+        writer.start()
+        started = time.perf_counter()
+        for n in range(10):
+            writer.put(framing.encode_frame({"n": n}))
+        self.assertLess(time.perf_counter() - started, 0.05)
+        self.assertGreater(writer.stats()["max_queued"], 1)
+        writer.close()
+        self.assertEqual(stream.writes, 10)
+
+    def test_broken_pipe_drops_later_frames(self):
+        writer = FrameWriter(RecordingStream(broken=True))
+        writer.start()
+        writer.put(framing.encode_frame({"n": 1}))
+        writer.thread.join(1)
+        writer.put(framing.encode_frame({"n": 2}))
+        self.assertTrue(writer.closed)
+        self.assertEqual(writer.stats()["dropped"], 2)
+
+    def test_host_sends_through_the_writer(self):
+        host = NativeHost()
+        stream = RecordingStream()
+        host.writer = FrameWriter(stream)
+        host.writer.start()
+        host.send_message({"requestId": "r1", "status": "success", "data": "pong"})
+        host.writer.close()
+
+        self.assertEqual(stream.writes, 1)
+        self.assertEqual(decode_frames(stream.getvalue())[0]["requestId"], "r1")
+
+
+if __name__ == "__main__":
+    unittest.main()
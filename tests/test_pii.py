@@ -1,12 +1,15 @@
 import unittest
+import io
 import json
 import os
+import random
 import sys
+from concurrent.futures import ProcessPoolExecutor
 
 # Ensure host directory is in path
 sys.path.append(os.path.join(os.path.dirname(__file__), "..", "host"))
 
-from pii_scrubber import PiiScrubber
+from pii_scrubber import PiiScrubber, PiiVault
 
 
 class TestPiiScrubber(unittest.TestCase):
@@ -39,5 +42,310 @@ class TestPiiScrubber(unittest.TestCase):
         self.assertIn("[REDACTED_GUID]", scrubbed)
 
 
+# Fragments that are glued together without separators to provoke overlaps
+# between detectors and placeholder boundary effects.
+FUZZ_TOKENS = [
+    "550e8400-e29b-41d4-a716-446655440000",
+    "a716-446655440000",
+    "e8400-",
+    "john.doe@corp.com",
+    "first-last@x-y.com",
+    "a@b.co",
+    "@x.com",
+    "10.0.0.5",
+    "192.168.1.100",
+    "255.255.255.255",
+    "1.2.3",
+    "(555) 123-4567",
+    "555-123-4567",
+    "555.123.4567",
+    "+1 555 123 4567",
+    "1.255.123.4567",
+    "٣٣٣-٣٣٣-٣٣٣٣",
+    "12345678",
+    "abcdef12",
+    "4567",
+    "a" * 30,
+    "b-" * 20,
+    "é",
+    "x",
+    "_",
+    "@",
+    "-",
+    ".",
+    "+",
+    " ",
+    "\n",
+    "(",
+    ")",
+    "[",
+    "]",
+]
+
+
+class TestSinglePassEngine(unittest.TestCase):
+    """scrub() must produce exactly what the four-pass scrub_multipass() does."""
+
+    def setUp(self):
+        self.scrubber = PiiScrubber()
+
+    def assertSameAsMultipass(self, text):
+        self.assertEqual(
+            self.scrubber.scrub(text), self.scrubber.scrub_multipass(text), repr(text)
+        )
+
+    def test_overlapping_detections(self):
+        for text in [
+            "john.550e8400-e29b-41d4-a716-446655440000@x.com",
+            "(555) 123-4567@x.com",
+            "(555) 123-4567.x@y.com",
+            "555-123-4567abcdef12-1234-1234-1234-123456789012",
+            "a@b.co" + "5" * 70 + "10.0.0.5",
+            "550e8400-e29b-41d4-a716-446655440000-john@x.com",
+            "Server at 10.0.0.5. Contact ops@contoso.com, (555) 123-4567.",
+        ]:
+            self.assertSameAsMultipass(text)
+
+    def test_differential_fuzz(self):
+        rnd = random.Random(1234)
+        for _ in range(5000):
+            text = "".join(
+                rnd.choice(FUZZ_TOKENS) for _ in range(rnd.randint(1, 10))
+            )
+            self.assertSameAsMultipass(text)
+
+
+class TestPrefilter(unittest.TestCase):
+    """
+    The prefilter may only skip a detector when it cannot match. Each check
+    runs the detector on its own and requires a trigger inside every match,
+    which is the property active_detectors() relies on.
+    """
+
+    # Shortest and oddest forms each detector accepts
+    MINIMAL_MATCHES = {
+        "guid": ["00000000-0000-0000-0000-000000000000", "aBcDeF01-aaaa-BBBB-cccc-0123456789ab"],
+        "email": ["a@b", "!@b.c", "x@y-z.io"],
+        "ip": ["0.0.0.0", "1.22.255.9"],
+        "phone": [
+            "(555)5551234",
+            "(555) - 555 . 1234",
+            "555-555-1234",
+            "555 .555. 1234",
+            "+1 555.555.1234",
+            "٣٣٣-٣٣٣-٣٣٣٣",
+        ],
+    }
+
+    def setUp(self):
+        self.scrubber = PiiScrubber()
+        self.patterns = {
+            "guid": self.scrubber.guid_pattern,
+            "email": self.scrubber.email_pattern,
+            "ip": self.scrubber.ip_pattern,
+            "phone": self.scrubber.phone_pattern,
+        }
+
+    def assertTriggersCover(self, name, text):
+        for match in self.patterns[name].finditer(text):
+            self.assertTrue(
+                any(t.search(match.group()) for t in self.scrubber.triggers[name]),
+                f"{name} match {match.group()!r} has no trigger",
+            )
+            self.assertIn(name, self.scrubber.active_detectors(text))
+
+    def test_minimal_matches_have_triggers(self):
+        for name, samples in self.MINIMAL_MATCHES.items():
+            for sample in samples:
+                self.assertTrue(self.patterns[name].search(sample), sample)
+                self.assertTriggersCover(name, sample)
+
+    def test_fuzzed_matches_have_triggers(self):
+        rnd = random.Random(5678)
+        for _ in range(5000):
+            text = "".join(
+                rnd.choice(FUZZ_TOKENS) for _ in range(rnd.randint(1, 10))
+            )
+            for name in self.patterns:
+                self.assertTriggersCover(name, text)
+
+    def test_placeholders_contain_no_triggers(self):
+        # Otherwise a replacement could wake up a detector that was skipped
+        for placeholder in self.scrubber.placeholders.values():
+            for triggers in self.scrubber.triggers.values():
+                for trigger in triggers:
+                    self.assertIsNone(trigger.search(placeholder))
+
+    def test_clean_error_is_returned_unchanged(self):
+        text = (
+            "Plugin Microsoft.Crm.Sales.UpdateOpportunity failed: An unexpected "
+            "error occurred. Error code: 0x80040216 at 2026-01-05T10:00:00Z"
+        )
+        self.assertEqual(self.scrubber.active_detectors(text), ())
+        self.assertIs(self.scrubber.scrub(text), text)
+
+    def test_only_triggered_detectors_run(self):
+        text = "Login failed for admin@contoso.com"
+        self.assertEqual(self.scrubber.active_detectors(text), ("email",))
+        self.assertEqual(self.scrubber.scrub(text), "Login failed for [REDACTED_EMAIL]")
+
+
+# Separators and whitespace that make safe chunk boundaries, or almost do
+STREAM_TOKENS = FUZZ_TOKENS + [",", ": ", "\t", " \n ", "1 ", "- ", "a ", ") ", " ("]
+
+
+class TestScrubStream(unittest.TestCase):
+    """Chunked scrubbing must give exactly scrub() of the whole text."""
+
+    def setUp(self):
+        self.scrubber = PiiScrubber()
+
+    def random_text(self, rnd):
+        return "".join(
+            rnd.choice(STREAM_TOKENS) for _ in range(rnd.randint(1, 30))
+        )
+
+    def split(self, rnd, text):
+        cuts = sorted(rnd.sample(range(len(text) + 1), min(len(text) + 1, 5)))
+        return [text[a:b] for a, b in zip([0] + cuts, cuts + [len(text)])]
+
+    def test_chunked_output_matches_scrub(self):
+        rnd = random.Random(4321)
+        for _ in range(3000):
+            text = self.random_text(rnd)
+            output = "".join(
+                self.scrubber.scrub_iter(
+                    self.split(rnd, text), chunk_size=rnd.randint(1, 40)
+                )
+            )
+            self.assertEqual(output, self.scrubber.scrub(text), repr(text))
+
+    def test_chunks_end_at_safe_boundaries(self):
+        rnd = random.Random(8765)
+        for _ in range(500):
+            text = self.random_text(rnd)
+            chunks = list(self.scrubber._chunks([text], 8, 10**9))
+            self.assertEqual("".join(chunks), text)
+            for chunk in chunks[:-1]:
+                # Each chunk is scrubbed as if it were the whole text
+                self.assertEqual(
+                    self.scrubber.scrub_multipass(chunk)
+                    + self.scrubber.scrub_multipass(text[len(chunk) :]),
+                    self.scrubber.scrub_multipass(text),
+                    repr((chunk, text)),
+                )
+                text = text[len(chunk) :]
+
+    def test_memory_is_bounded(self):
+        # An endless run without any boundary is still cut
+        pieces = iter(lambda: "a" * 1000, None)
+        chunks = self.scrubber.scrub_iter(pieces, chunk_size=100, max_chunk_size=5000)
+        for _ in range(20):
+            self.assertLessEqual(len(next(chunks)), 5000)
+
+    def test_scrub_stream(self):
+        text = "Login from 10.0.0.5, user admin@contoso.com\n" * 2000
+        sink = io.StringIO()
+        written = self.scrubber.scrub_stream(io.StringIO(text), sink, chunk_size=1000)
+        self.assertEqual(sink.getvalue(), self.scrubber.scrub(text))
+        self.assertEqual(written, len(sink.getvalue()))
+
+    def test_process_pool(self):
+        text = "Caller (555) 123-4567; session 550e8400-e29b-41d4-a716-446655440000\n" * 500
+        with ProcessPoolExecutor(2) as executor:
+            output = "".join(
+                self.scrubber.scrub_iter(text, chunk_size=1000, executor=executor)
+            )
+        self.assertEqual(output, self.scrubber.scrub(text))
+
+
+class TestPseudonymization(unittest.TestCase):
+    def setUp(self):
+        self.scrubber = PiiScrubber()
+
+    def test_stable_tokens_per_value(self):
+        vault = PiiVault()
+        text = (
+            "User a@contoso.com hit 550e8400-e29b-41d4-a716-446655440000, "
+            "then A@Contoso.com hit 123e4567-e89b-12d3-a456-426614174000 "
+            "and 550E8400-E29B-41D4-A716-446655440000 again from 10.0.0.5"
+        )
+        self.assertEqual(
+            self.scrubber.scrub(text, vault),
+            "User [EMAIL_1] hit [GUID_1], then [EMAIL_1] hit [GUID_2] "
+            "and [GUID_1] again from [IP_1]",
+        )
+        self.assertEqual(len(vault), 4)
+
+    def test_prompts_differing_only_in_ids_are_identical(self):
+        template = "Plugin failed for record {} owned by {}"
+        first = self.scrubber.scrub(
+            template.format("550e8400-e29b-41d4-a716-446655440000", "a@x.com"),
+            PiiVault(),
+        )
+        second = self.scrubber.scrub(
+            template.format("123e4567-e89b-12d3-a456-426614174000", "b@y.org"),
+            PiiVault(),
+        )
+        self.assertEqual(first, second)
+
+    def test_rehydrate_restores_values(self):
+        vault = PiiVault()
+        text = "Call (555) 123-4567 about 550e8400-e29b-41d4-a716-446655440000"
+        self.assertEqual(vault.rehydrate(self.scrubber.scrub(text, vault)), text)
+        # Tokens the vault does not know are left alone
+        self.assertEqual(vault.rehydrate("[GUID_9] [PHONE_1]"), "[GUID_9] (555) 123-4567")
+
+    def test_same_detections_as_placeholders(self):
+        placeholders = {
+            "GUID": "[REDACTED_GUID]",
+            "EMAIL": "[REDACTED_EMAIL]",
+            "IP": "[REDACTED_IP]",
+            "PHONE": "[REDACTED_PHONE]",
+        }
+        rnd = random.Random(2468)
+        for _ in range(3000):
+            text = "".join(
+                rnd.choice(STREAM_TOKENS) for _ in range(rnd.randint(1, 20))
+            )
+            single, multi = PiiVault(), PiiVault()
+            tokenized = self.scrubber.scrub(text, single)
+            self.assertEqual(tokenized, self.scrubber.scrub_multipass(text, multi))
+            self.assertEqual(single.values, multi.values)
+            self.assertEqual(
+                PiiVault.TOKEN_PATTERN.sub(
+                    lambda m: placeholders[m.group()[1:].split("_")[0]], tokenized
+                ),
+                self.scrubber.scrub(text),
+            )
+            self.assertEqual(single.rehydrate(tokenized), text)
+
+    def test_chunked_tokens_match(self):
+        text = "Login from 10.0.0.%d, user u%d@contoso.com\n"
+        text = "".join(text % (i % 7, i % 5) for i in range(500))
+        whole, chunked = PiiVault(), PiiVault()
+        self.assertEqual(
+            "".join(self.scrubber.scrub_iter(text, chunk_size=100, vault=chunked)),
+            self.scrubber.scrub(text, whole),
+        )
+        self.assertEqual(chunked.values, whole.values)
+
+    def test_process_pool_tokens_match(self):
+        text = "Login from 10.0.0.%d, user u%d@contoso.com, call (555) 123-456%d\n"
+        text = "".join(text % (i % 7, i % 5, i % 3) for i in range(500))
+        # Token-like input is left to the calling side
+        text += "Already tokenized: [GUID_1] for 550e8400-e29b-41d4-a716-446655440000\n"
+        whole, pooled = PiiVault(), PiiVault()
+        with ProcessPoolExecutor(2) as executor:
+            output = "".join(
+                self.scrubber.scrub_iter(
+                    text, chunk_size=500, executor=executor, vault=pooled
+                )
+            )
+        self.assertEqual(output, self.scrubber.scrub(text, whole))
+        self.assertEqual(pooled.values, whole.values)
+        self.assertEqual(list(pooled.values), list(whole.values))
+
+
 if __name__ == "__main__":
     unittest.main()
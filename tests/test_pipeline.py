@@ -0,0 +1,171 @@
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+
+# Ensure host directory is in path
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "host"))
+
+# Throwaway home for the host's user data; must come before host imports
+from helpers import FakeClient, FakeSession, session_pool
+
+from dh_native_host import NativeHost
+from pipeline import Analysis, Pipeline
+from result_cache import ResultCache, config_fingerprint
+
+
+def recorder(calls, name, result=None, delay=0):
+    async def stage(analysis):
+        calls.append(name)
+        await asyncio.sleep(delay)
+        return result
+
+    return stage
+
+
+class TestPipeline(unittest.TestCase):
+    def run_pipeline(self, pipeline, analysis=None):
+        analysis = analysis or Analysis({"text": "boom"})
+        return asyncio.run(pipeline.run(analysis)), analysis
+
+    def test_stages_run_in_order_and_are_timed(self):
+        calls = []
+        pipeline = Pipeline(
+            [
+                ("a", recorder(calls, "a")),
+                ("b", recorder(calls, "b", delay=0.02)),
+                ("c", recorder(calls, "c", {"done": True})),
+            ]
+        )
+        result, analysis = self.run_pipeline(pipeline)
+        self.assertEqual(result, {"done": True})
+        self.assertEqual(calls, ["a", "b", "c"])
+        self.assertEqual(list(analysis.timings), ["a", "b", "c"])
+        self.assertGreaterEqual(analysis.timings["b"], 15)
+
+    def test_returned_dict_stops_the_run(self):
+        calls = []
+        pipeline = Pipeline(
+            [
+                ("a", recorder(calls, "a", {"error": "nope"})),
+                ("b", recorder(calls, "b")),
+            ]
+        )
+        result, analysis = self.run_pipeline(pipeline)
+        self.assertEqual(result, {"error": "nope"})
+        self.assertEqual(calls, ["a"])
+        self.assertNotIn("b", analysis.timings)
+
+    def test_skipped_stages_are_not_timed(self):
+        calls = []
+        pipeline = Pipeline(
+            [
+                ("a", recorder(calls, "a")),
+                ("b", recorder(calls, "b"), lambda analysis: analysis.cached),
+            ]
+        )
+        _, analysis = self.run_pipeline(pipeline)
+        self.assertEqual(calls, ["a"])
+        self.assertEqual(list(analysis.timings), ["a"])
+
+    def test_stages_plug_in_by_name(self):
+        calls = []
+        pipeline = Pipeline([("a", recorder(calls, "a")), ("c", recorder(calls, "c"))])
+        pipeline.add("b", recorder(calls, "b"), before="c")
+        pipeline.add("d", recorder(calls, "d"), after="c")
+        pipeline.add("first", recorder(calls, "first"), before="a")
+        self.assertEqual(pipeline.names, ["first", "a", "b", "c", "d"])
+        pipeline.remove("d")
+        self.run_pipeline(pipeline)
+        self.assertEqual(calls, ["first", "a", "b", "c"])
+        with self.assertRaises(ValueError):
+            pipeline.add("a", recorder(calls, "a"))
+
+    def test_failing_stage_is_still_timed(self):
+        async def fail(analysis):
+            raise RuntimeError("boom")
+
+        analysis = Analysis({"text": "boom"})
+        with self.assertRaises(RuntimeError):
+            asyncio.run(Pipeline([("fail", fail)]).run(analysis))
+        self.assertEqual(analysis.stage, "fail")
+        self.assertIn("fail", analysis.timings)
+
+
+class TestAnalysisStages(unittest.TestCase):
+    def test_response_carries_stage_timings(self):
+        async def scenario():
+            with tempfile.TemporaryDirectory() as tmp:
+                host = NativeHost()
+                host.client = FakeClient()
+                host.pool = session_pool(FakeSession("Re-register the step.", delay=0.01))
+                await host.pool.start()
+                host.cache = ResultCache(tmp)
+                host.config_fingerprint = config_fingerprint(host._get_session_config())
+
+                payload = {"text": "Plugin failed for a@b.com", "context": "ctx"}
+                return (
+                    await host.handle_analyze_error(payload),
+                    await host.handle_analyze_error(payload),
+                )
+
+        fresh, cached = asyncio.run(scenario())
+        self.assertEqual(fresh["markdown"], "Re-register the step.")
+        self.assertEqual(
+            list(fresh["timings"]["stages"]),
+            [
+                "validate",
+                "scrub",
+                "build_prompt",
+                "cache_lookup",
+                "wait_for_sdk",
+                "coalesce",
+                "auth",
+                "send",
+                "extract",
+                "share",
+                "store",
+                "save",
+                "respond",
+            ],
+        )
+        self.assertGreaterEqual(fresh["timings"]["stages"]["send"], 5)
+        self.assertAlmostEqual(
+            fresh["timings"]["total_ms"],
+            sum(fresh["timings"]["stages"].values()),
+            places=1,
+        )
+
+        # A cache hit skips the model stages
+        self.assertTrue(cached["cached"])
+        self.assertNotIn("send", cached["timings"]["stages"])
+        self.assertNotIn("wait_for_sdk", cached["timings"]["stages"])
+        self.assertIn("save", cached["timings"]["stages"])
+
+    def test_custom_stage_and_early_errors(self):
+        async def scenario():
+            host = NativeHost()
+
+            async def shout(analysis):
+                analysis.prompt = analysis.prompt.upper()
+
+            async def stop(analysis):
+                return {"error": f"stopped at {analysis.prompt}"}
+
+            host.analysis_pipeline.add("shout", shout, after="build_prompt")
+            host.analysis_pipeline.add("stop", stop, after="shout")
+            return (
+                await host.handle_analyze_error({"text": "boom", "context": ""}),
+                await host.handle_analyze_error({}),
+            )
+
+        stopped, empty = asyncio.run(scenario())
+        self.assertEqual(stopped["error"], "stopped at BOOM")
+        self.assertIn("shout", stopped["timings"]["stages"])
+        self.assertEqual(empty["error"], "No text provided for analysis.")
+        self.assertEqual(list(empty["timings"]["stages"]), ["validate"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,160 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+# Ensure host directory is in path
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "host"))
+
+# Throwaway home for the host's user data; must come before host imports
+from helpers import FakeClient, TokenEchoSession, session_pool
+
+import dh_native_host
+import framing
+import resident
+from dh_native_host import NativeHost
+
+FAKE_SDK_DIR = os.path.join(os.path.dirname(__file__), "..", "benchmarks", "fake_sdk")
+
+
+async def request(reader, writer, message):
+    writer.write(framing.encode_frame(message))
+    await writer.drain()
+    return await asyncio.wait_for(framing.read_frame(reader), 10)
+
+
+@unittest.skipIf(os.name == "nt", "Unix socket endpoint")
+class TestResidentDaemon(unittest.TestCase):
+    def test_shim_spawns_daemon_which_answers_and_exits_when_idle(self):
+        with tempfile.TemporaryDirectory() as home:
+            user_data_dir = os.path.join(home, ".config", "dynamics_helper")
+            os.makedirs(user_data_dir)
+            with open(os.path.join(user_data_dir, "config.json"), "w") as f:
+                json.dump({"host": {"idle_timeout_seconds": 1}}, f)
+            address = resident.daemon_address(user_data_dir)
+
+            # The daemon gets its own home and the fake SDK instead of Copilot
+            env = {
+                "HOME": home,
+                "PYTHONPATH": os.path.abspath(FAKE_SDK_DIR),
+                "FAKE_COPILOT_START_MS": "0",
+                "FAKE_COPILOT_LATENCY_MS": "10",
+                "FAKE_COPILOT_JITTER_MS": "0",
+                "FAKE_COPILOT_ANSWER_CHARS": "100",
+            }
+            spawned = []
+            spawn_daemon = resident.spawn_daemon
+
+            def spawn(script_path):
+                spawned.append(spawn_daemon(script_path))
+                return spawned[-1]
+
+            async def scenario():
+                script_path = os.path.abspath(dh_native_host.__file__)
+                reader, writer = await resident.connect_or_spawn(address, script_path)
+                ping = await request(
+                    reader, writer, {"action": "ping", "requestId": "p"}
+                )
+                analysis = await request(
+                    reader,
+                    writer,
+                    {
+                        "action": "analyze_error",
+                        "requestId": "a",
+                        "payload": {"text": "Plugin failed", "context": ""},
+                    },
+                )
+                # A second shim finds the daemon already running
+                _, second = await resident.connect_or_spawn(address, script_path)
+                second.close()
+                writer.close()
+                return ping, analysis
+
+            try:
+                with mock.patch.dict(os.environ, env), mock.patch.object(
+                    resident, "spawn_daemon", spawn
+                ):
+                    ping, analysis = asyncio.run(scenario())
+
+                self.assertEqual(len(spawned), 1)
+                self.assertEqual(ping["data"], "pong")
+                self.assertTrue(analysis["data"]["success"], analysis)
+                self.assertTrue(
+                    analysis["data"]["markdown"].startswith("Re-register the plugin")
+                )
+
+                # With no shim connected the daemon exits and removes its socket
+                self.assertEqual(spawned[0].wait(timeout=15), 0)
+                self.assertFalse(os.path.exists(address))
+            finally:
+                for process in spawned:
+                    if process.poll() is None:
+                        process.kill()
+                        process.wait()
+
+    def test_replies_go_to_the_connection_that_asked(self):
+        async def scenario(address):
+            host = NativeHost()
+            host._init_loop_state()
+            host.cache = None
+            host.client = FakeClient()
+            host.pool = session_pool(
+                TokenEchoSession(delay=0.05), TokenEchoSession(delay=0.05)
+            )
+            await host.pool.start()
+            server = await resident.start_server(address, host._serve_connection)
+
+            async def shim(word):
+                reader, writer = await resident.open_connection(address)
+                # Both shims use the same requestId
+                message = {
+                    "action": "analyze_error",
+                    "requestId": "1",
+                    "payload": {"text": f"Plugin {word}", "context": ""},
+                }
+                writer.write(framing.encode_frame(message))
+                writer.write(framing.encode_frame({"action": "ping", "requestId": "2"}))
+                replies = [
+                    await asyncio.wait_for(framing.read_frame(reader), 5)
+                    for _ in range(2)
+                ]
+                writer.close()
+                return replies
+
+            try:
+                return await asyncio.gather(shim("alpha"), shim("beta"))
+            finally:
+                server.close()
+                await host._cancel_tasks()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            first, second = asyncio.run(scenario(os.path.join(tmp, "host.sock")))
+
+        for replies, word in ((first, "alpha"), (second, "beta")):
+            # The ping overtakes the analysis on its own connection
+            self.assertEqual([m["requestId"] for m in replies], ["2", "1"])
+            self.assertEqual(replies[1]["data"]["markdown"], f"Look up {word}")
+
+    def test_second_daemon_exits_if_one_is_running(self):
+        async def scenario(tmp):
+            address = resident.daemon_address(tmp)
+            server = await resident.start_server(address, lambda r, w: w.close())
+            host = NativeHost()
+            host.start_sdk_init = mock.Mock()
+            try:
+                with mock.patch.object(dh_native_host, "USER_DATA_DIR", tmp):
+                    await asyncio.wait_for(host.run_daemon(), 5)
+            finally:
+                server.close()
+            return host
+
+        with tempfile.TemporaryDirectory() as tmp:
+            host = asyncio.run(scenario(tmp))
+        host.start_sdk_init.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
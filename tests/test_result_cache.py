@@ -0,0 +1,70 @@
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+# Ensure host directory is in path
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "host"))
+
+from result_cache import ResultCache, config_fingerprint, make_key
+
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.directory = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_key_depends_on_prompt_and_config(self):
+        base = config_fingerprint({"model": "gpt-5", "skill_directories": ["/a"]})
+        other = config_fingerprint({"model": "claude-sonnet-4.5"})
+        self.assertEqual(make_key("p", base), make_key("p", base))
+        self.assertNotEqual(make_key("p", base), make_key("q", base))
+        self.assertNotEqual(make_key("p", base), make_key("p", other))
+
+    def test_fingerprint_ignores_handlers_and_key_order(self):
+        a = config_fingerprint({"model": "gpt-5", "on_permission_request": print})
+        b = config_fingerprint({"model": "gpt-5"})
+        self.assertEqual(a, b)
+
+    def test_memory_and_disk_hits(self):
+        cache = ResultCache(self.directory)
+        cache.put("k", {"markdown": "answer"})
+        self.assertEqual(cache.get("k"), {"markdown": "answer"})
+
+        # A fresh instance only has the disk tier
+        reloaded = ResultCache(self.directory)
+        self.assertEqual(reloaded.get("k"), {"markdown": "answer"})
+        self.assertIsNone(reloaded.get("missing"))
+
+    def test_expired_entries_are_misses(self):
+        cache = ResultCache(self.directory, ttl_seconds=0.05)
+        cache.put("k", {"markdown": "answer"})
+        time.sleep(0.1)
+        self.assertIsNone(cache.get("k"))
+        self.assertFalse(os.path.exists(os.path.join(self.directory, "k.json")))
+
+    def test_memory_tier_is_lru_bounded(self):
+        cache = ResultCache(self.directory, memory_entries=2)
+        for key in ("a", "b", "c"):
+            cache.put(key, {"markdown": key})
+        self.assertEqual(list(cache.memory), ["b", "c"])
+        # Evicted from memory but still on disk
+        self.assertEqual(cache.get("a"), {"markdown": "a"})
+
+    def test_disk_tier_evicts_oldest_over_size_limit(self):
+        cache = ResultCache(self.directory, max_disk_bytes=250)
+        for index, key in enumerate(("a", "b", "c", "d")):
+            cache.put(key, {"markdown": "x" * 60})
+            os.utime(os.path.join(self.directory, f"{key}.json"), (index, index))
+        files = sorted(os.listdir(self.directory))
+        self.assertNotIn("a.json", files)
+        self.assertIn("d.json", files)
+        self.assertLessEqual(cache.disk_bytes, 250)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+import asyncio
+import os
+import sys
+import unittest
+
+# Ensure host directory is in path
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "host"))
+
+from session_pool import SessionPool, SessionPoolError
+
+
+class FakeSession:
+    def __init__(self, number):
+        self.number = number
+        self.destroyed = False
+        self.aborts = 0
+        self.abort_fails = False
+
+    async def abort(self):
+        self.aborts += 1
+        if self.abort_fails:
+            raise RuntimeError("abort failed")
+
+    async def destroy(self):
+        self.destroyed = True
+
+
+class SessionFactory:
+    def __init__(self, failures=0):
+        self.created = []
+        self.failures = failures
+
+    async def __call__(self):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("create failed")
+        session = FakeSession(len(self.created))
+        self.created.append(session)
+        return session
+
+
+class TestSessionPool(unittest.TestCase):
+    def run_async(self, coro):
+        return asyncio.run(coro)
+
+    def test_warm_up_creates_all_sessions(self):
+        async def scenario():
+            factory = SessionFactory()
+            pool = SessionPool(factory, 3)
+            self.assertTrue(await pool.start())
+            self.assertEqual(pool.available, 3)
+            self.assertEqual(len(factory.created), 3)
+
+        self.run_async(scenario())
+
+    def test_parallel_leases_use_distinct_sessions(self):
+        async def scenario():
+            pool = SessionPool(SessionFactory(), 2)
+            await pool.start()
+
+            async with pool.lease() as first, pool.lease() as second:
+                self.assertIsNot(first, second)
+                self.assertEqual(pool.available, 0)
+            self.assertEqual(pool.available, 2)
+
+        self.run_async(scenario())
+
+    def test_failed_turn_recycles_session(self):
+        async def scenario():
+            factory = SessionFactory()
+            pool = SessionPool(factory, 1)
+            await pool.start()
+
+            with self.assertRaises(asyncio.TimeoutError):
+                async with pool.lease() as session:
+                    raise asyncio.TimeoutError()
+
+            # Replacement is created in the background
+            async with pool.lease(timeout=1) as replacement:
+                self.assertIsNot(replacement, session)
+            await asyncio.sleep(0)
+            self.assertTrue(session.destroyed)
+            self.assertEqual(len(factory.created), 2)
+
+        self.run_async(scenario())
+
+    def test_cancelled_turn_is_aborted_and_reused(self):
+        async def scenario():
+            factory = SessionFactory()
+            pool = SessionPool(factory, 1)
+            await pool.start()
+
+            async def turn():
+                async with pool.lease() as session:
+                    await asyncio.sleep(10)
+
+            for abort_fails in (False, True):
+                task = asyncio.create_task(turn())
+                await asyncio.sleep(0.01)
+                session = factory.created[-1]
+                session.abort_fails = abort_fails
+                session.aborts = 0
+                task.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await task
+                self.assertEqual(session.aborts, 1)
+
+                async with pool.lease(timeout=1) as next_session:
+                    # Aborted turns keep their session; failed aborts recycle it
+                    self.assertIs(next_session is session, not abort_fails)
+            self.assertEqual(len(factory.created), 2)
+
+        self.run_async(scenario())
+
+    def test_partial_warm_up_is_topped_up(self):
+        async def scenario():
+            factory = SessionFactory(failures=1)
+            pool = SessionPool(factory, 2)
+            self.assertTrue(await pool.start())
+            self.assertEqual(pool.available, 1)
+
+            await asyncio.sleep(0.05)  # replacement is created in the background
+            self.assertEqual(pool.available, 2)
+
+        self.run_async(scenario())
+
+    def test_acquire_times_out_when_exhausted(self):
+        async def scenario():
+            pool = SessionPool(SessionFactory(), 1)
+            await pool.start()
+            async with pool.lease():
+                with self.assertRaises(SessionPoolError):
+                    await pool.acquire(timeout=0.05)
+
+        self.run_async(scenario())
+
+    def test_closed_pool_destroys_returned_sessions(self):
+        async def scenario():
+            pool = SessionPool(SessionFactory(), 2)
+            await pool.start()
+            async with pool.lease() as leased:
+                await pool.close()
+            await asyncio.sleep(0)
+            self.assertTrue(leased.destroyed)
+            with self.assertRaises(SessionPoolError):
+                await pool.acquire()
+
+        self.run_async(scenario())
+
+
+if __name__ == "__main__":
+    unittest.main()
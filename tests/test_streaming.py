@@ -0,0 +1,123 @@
+import asyncio
+import os
+import sys
+import types
+import unittest
+
+# Ensure host directory is in path
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "host"))
+
+# Throwaway home for the host's user data; must come before host imports
+from helpers import FakeClient
+
+from dh_native_host import NativeHost
+from session_pool import SessionPool
+from streaming import StreamRelay
+
+
+def event(event_type, **data):
+    return types.SimpleNamespace(type=event_type, data=types.SimpleNamespace(**data))
+
+
+class StreamingSession:
+    """Stand-in session that emits deltas before answering."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.handlers = []
+
+    def on(self, handler):
+        self.handlers.append(handler)
+        return lambda: self.handlers.remove(handler)
+
+    async def send_and_wait(self, options, timeout=None):
+        for handler in list(self.handlers):
+            handler(event("tool.execution_start", tool_name="fetch"))
+        for chunk in self.chunks:
+            await asyncio.sleep(0)
+            for handler in list(self.handlers):
+                handler(event("assistant.message_delta", delta_content=chunk))
+        return event("assistant.message", content="".join(self.chunks))
+
+
+class TestStreamRelay(unittest.TestCase):
+    def test_deltas_are_coalesced(self):
+        frames = []
+        relay = StreamRelay(lambda kind, data: frames.append((kind, data)), 60)
+        for chunk in ("a", "b", "c"):
+            relay(event("assistant.message_delta", delta_content=chunk))
+        relay.flush()
+        # First delta flushes immediately, the rest wait for the interval
+        self.assertEqual(
+            frames, [("partial", {"delta": "a"}), ("partial", {"delta": "bc"})]
+        )
+
+    def test_progress_flushes_pending_text_first(self):
+        frames = []
+        relay = StreamRelay(lambda kind, data: frames.append(kind), 60)
+        relay(event("assistant.message_delta", delta_content="a"))
+        relay(event("assistant.message_delta", delta_content="b"))
+        relay(event("tool.execution_progress", progress_message="50%"))
+        self.assertEqual(frames, ["partial", "partial", "progress"])
+
+    def test_unrelated_events_are_ignored(self):
+        frames = []
+        relay = StreamRelay(lambda kind, data: frames.append(kind))
+        relay(event("session.idle"))
+        relay(event("assistant.usage", model="gpt-5"))
+        relay.flush()
+        self.assertEqual(frames, [])
+
+    def test_transform_never_splits_tokens(self):
+        frames = []
+        values = {"[GUID_1]": "550e8400"}
+        relay = StreamRelay(
+            lambda kind, data: frames.append(data["delta"]),
+            0,
+            transform=lambda text: text.replace("[GUID_1]", values["[GUID_1]"]),
+        )
+        for chunk in ("Open [GU", "ID_1", "] in [", "docs]"):
+            relay(event("assistant.message_delta", delta_content=chunk))
+        relay.flush(final=True)
+        self.assertEqual(frames, ["Open ", "550e8400 in ", "[docs]"])
+
+
+class TestStreamingAnalysis(unittest.TestCase):
+    def run_analysis(self, payload):
+        async def scenario():
+            host = NativeHost()
+            host.client = FakeClient()
+            session = StreamingSession(["Root ", "cause: ", "timeout"])
+            host.pool = SessionPool(lambda: asyncio.sleep(0, session), 1)
+            await host.pool.start()
+            host.cache = None
+
+            sent = []
+            await host.process_message(
+                {"action": "analyze_error", "requestId": "r1", "payload": payload},
+                sent.append,
+            )
+            return sent
+
+        return asyncio.run(scenario())
+
+    def test_stream_opt_in_sends_partials_then_final(self):
+        sent = self.run_analysis({"text": "boom", "stream": True})
+
+        self.assertTrue(all(m["requestId"] == "r1" for m in sent))
+        kinds = [m["type"] for m in sent]
+        self.assertEqual(kinds[0], "progress")
+        self.assertEqual(kinds[-1], "final")
+        streamed = "".join(m["data"]["delta"] for m in sent if m["type"] == "partial")
+        self.assertEqual(streamed, "Root cause: timeout")
+        self.assertEqual(sent[-1]["data"]["markdown"], "Root cause: timeout")
+
+    def test_default_is_single_response(self):
+        sent = self.run_analysis({"text": "boom"})
+        self.assertEqual(len(sent), 1)
+        self.assertNotIn("type", sent[0])
+        self.assertEqual(sent[0]["data"]["markdown"], "Root cause: timeout")
+
+
+if __name__ == "__main__":
+    unittest.main()